@@ -1,34 +1,122 @@
 """Account Management Module - Create, categorize, and manage accounts"""
-from webbrowser import get
-from utils import load_json, save_json, account_exists, get_account_by_name, format_currency, ACCOUNTS_FILE
+from datetime import datetime
+from utils import load_json, save_json, account_exists, get_account_by_name, to_cents, ACCOUNTS_FILE
+from chart import load_chart, save_chart, validate_code, resolve_parent, adjust_rollups
+from versions import commit_version, holds_writer_lock
 
 ACCOUNT_TYPES = ['Asset', 'Liability', 'Revenue', 'Expense', 'Owner\'s Equity']
+DEBIT_NORMAL_TYPES = ['Asset', 'Expense']
+
+def balance_change(account_type, debit_amount, credit_amount):
+    """
+    Net change in an account's balance from debit and credit totals
+    
+    Args:
+        account_type: Account type
+        debit_amount: Total debits in cents
+        credit_amount: Total credits in cents
+    
+    Returns:
+        Signed change in cents (debits increase Assets/Expenses, credits increase the rest)
+    """
+    if account_type in DEBIT_NORMAL_TYPES:
+        return debit_amount - credit_amount
+    return credit_amount - debit_amount
 
 def load_accounts():
     """Load all accounts from storage"""
     return load_json(ACCOUNTS_FILE, default={})
 
-def save_accounts(accounts_data):
-    """Save accounts to storage"""
-    return save_json(ACCOUNTS_FILE, accounts_data)
+def save_accounts(accounts_data, commit=True):
+    """
+    Save accounts to storage, publish their balances to the shared snapshot and commit a read
+    version (see versions.py). Writers save the chart and append their postings first, so the
+    version holds them together. A rebuild passes commit=False until it is complete.
+    """
+    from snapshot import publish_balances
+    return (save_json(ACCOUNTS_FILE, accounts_data) and publish_balances(accounts_data)
+            and (not commit or commit_version(accounts_data, load_chart())))
 
-def create_account(name, account_type, initial_balance=0.0):
-    """Create a new account"""
+@holds_writer_lock
+def create_account(name, account_type, initial_balance=0, opened=None, code=None, parent=None, open_items=False):
+    """
+    Create a new account
+    
+    Args:
+        name: Account name
+        account_type: One of ACCOUNT_TYPES
+        initial_balance: Opening balance in major units
+        opened: Opening date (YYYY-MM-DD, default: today)
+        code: Optional numeric account code (e.g. 1110)
+        parent: Code of the group the account belongs to (default: the root group of its type)
+        open_items: Track open items (invoices, bills) for aging; Asset and Liability accounts only
+    
+    Returns:
+        Tuple (success: bool, message: str)
+    """
     if not name or not name.strip():
         return False, "Account name cannot be empty"
     if account_type not in ACCOUNT_TYPES:
         return False, f"Invalid account type. Must be one of: {', '.join(ACCOUNT_TYPES)}"
+    if open_items and account_type not in ('Asset', 'Liability'):
+        return False, "Open items can only be tracked on Asset and Liability accounts"
+    try:
+        initial_cents = to_cents(initial_balance)
+    except ValueError as e:
+        return False, str(e)
+    if opened is None:
+        opened = datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(opened, "%Y-%m-%d")
+    except ValueError:
+        return False, "Invalid opening date. Use YYYY-MM-DD"
+    if initial_cents:
+        from archive import closed_through
+        cutoff = closed_through()
+        if cutoff and opened <= cutoff:
+            return False, f"The ledger is closed through {cutoff}; open the account with a later date"
     accounts_data = load_accounts()
     if account_exists(name, accounts_data):
         return False, f"Account '{name}' already exists"
+    chart = load_chart()
+    if code:
+        error = validate_code(code, chart, accounts_data)
+        if error:
+            return False, error
+    parent, error = resolve_parent(account_type, parent, chart)
+    if error:
+        return False, error
     accounts_data[name] = {
         "type": account_type,
-        "balance": float(initial_balance)
+        "balance": initial_cents,
+        "opening_balance": initial_cents,
+        "opened": opened,
+        "parent": parent
     }
-    if save_accounts(accounts_data):
-        return True, f"Account '{name}' created successfully"
-    else:
+    if code:
+        accounts_data[name]["code"] = code
+    if open_items:
+        accounts_data[name]["open_items"] = True
+    adjust_rollups(parent, initial_cents, chart)
+    if not save_chart(chart):
+        return False, "Failed to save chart of accounts"
+    if not save_accounts(accounts_data):
         return False, "Failed to save account"
+    if initial_cents:
+        # The opening balance goes into the ledger too, so the running balance trail starts from it
+        from ledger import post_opening_balance
+        success, message = post_opening_balance(name, initial_cents, opened)
+        if not success:
+            return False, message
+        # The opening posting was appended after the accounts were saved; this version includes it
+        if not commit_version():
+            return False, "Failed to commit read version"
+    if open_items:
+        from openitems import rebuild_open_items
+        success, _ = rebuild_open_items(name, accounts_data)
+        if not success:
+            return False, "Failed to save open items"
+    return True, f"Account '{name}' created successfully"
 
 def get_accounts_by_type(account_type=None):
     """
@@ -58,25 +146,26 @@ def get_account_balance(account_name):
         account_name: Name of account
     
     Returns:
-        Balance (float) or None if account doesn't exist
+        Balance in cents (int) or None if account doesn't exist
     """
     accounts_data = load_accounts()
     actual_name , account_data = get_account_by_name(account_name, accounts_data)
     if account_data:
-        return account_data.get("balance", 0.0)
+        return account_data.get("balance", 0)
     return None
 
+@holds_writer_lock
 def update_account_balance(account_name,amount,entry_type):
     """
     Update account balance based on transaction
     
     Args:
         account_name: Name of account
-        amount: Transaction amount
+        amount: Transaction amount in cents
         entry_type: "Debit" or "Credit"
     
     Returns:
-        Tuple (success: bool, new_balance: float or None)
+        Tuple (success: bool, new_balance: int cents or None)
     """
     accounts = load_accounts()
     actual_name , account_data = get_account_by_name(account_name,accounts)
@@ -84,26 +173,22 @@ def update_account_balance(account_name,amount,entry_type):
         return False,None
     
     account_type = account_data.get("type")
-    current_balance = account_data.get("balance", 0.0)
+    current_balance = account_data.get("balance", 0)
     
     # Calculate new balance based on accounting rules
-    if account_type in ["Asset", "Expense"]:
-        if entry_type == "Debit":
-            new_balance = current_balance + amount
-        else:  # Credit
-            new_balance = current_balance - amount
-    else:  # Liability, Revenue, Owner's Equity
-        if entry_type == "Credit":
-            new_balance = current_balance + amount
-        else:  # Debit
-            new_balance = current_balance - amount
+    if entry_type == "Debit":
+        new_balance = current_balance + balance_change(account_type, amount, 0)
+    else:  # Credit
+        new_balance = current_balance + balance_change(account_type, 0, amount)
     
     accounts[actual_name]["balance"] = new_balance
     
-    if save_accounts(accounts):
-        return True, new_balance
-    else:
-        return False, None   
+    # Every group above the account moves by the same amount, so rollups stay current without re-summing
+    if not adjust_rollups(account_data.get("parent"), new_balance - current_balance):
+        return False, None
+    if not save_accounts(accounts):
+        return False, None
+    return True, new_balance   
 
 
 
@@ -0,0 +1,199 @@
+"""
+Analytics Module - Per-account activity statistics and top-N posting queries, each answered in a
+single streaming pass over the postings with running aggregates and bounded heaps
+"""
+import heapq
+from utils import LEDGER_DIR, format_currency, get_account_by_name
+from accounts import load_accounts
+from ledger import iter_postings, iter_account_ledger
+from storage import load_manifest, read_shard
+
+ACTIVITY_ENTRY_TYPES = ("Debit", "Credit")  # Opening and carried-forward postings are not activity
+ACTIVITY_MEASURES = ("postings", "volume", "max", "mean")
+
+def _in_range(date, start_date, end_date):
+    return (not start_date or date >= start_date) and (not end_date or date <= end_date)
+
+def _merge_stats(stats, name, totals):
+    """Merge one summary's activity totals of an account into the combined statistics"""
+    if not totals.get("postings"):
+        return
+    combined = stats.get(name)
+    if combined is None:
+        stats[name] = {"postings": totals["postings"], "debit": totals["debit"], "credit": totals["credit"],
+                       "min": totals["min"], "max": totals["max"]}
+        return
+    combined["postings"] += totals["postings"]
+    combined["debit"] += totals["debit"]
+    combined["credit"] += totals["credit"]
+    combined["min"] = min(combined["min"], totals["min"])
+    combined["max"] = max(combined["max"], totals["max"])
+
+def _fold_record(stats, record):
+    """Fold one posting record into the running statistics of its account"""
+    if record["entry_type"] not in ACTIVITY_ENTRY_TYPES:
+        return
+    amount = record["amount"]
+    side = "debit" if record["entry_type"] == "Debit" else "credit"
+    _merge_stats(stats, record["account"], {"postings": 1, "debit": 0, "credit": 0, side: amount,
+                                            "min": amount, "max": amount})
+
+def account_stats(start_date=None, end_date=None, include_archived=True):
+    """
+    Activity statistics of every account: number of debit and credit postings, their totals and
+    the smallest, largest and mean posting size.
+    The statistics are kept in the shard summaries as postings are written, so without a date
+    range (and for every shard wholly inside it) only the manifests are read; shards cut by the
+    range are streamed once.
+
+    Args:
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+        include_archived: Count the postings of closed (archived) months too
+
+    Returns:
+        Dictionary {account: {"postings", "debit", "credit", "volume", "min", "max", "mean"}} (cents)
+    """
+    stats = {}
+    for key, shard in sorted(load_manifest(LEDGER_DIR)["shards"].items()):
+        if not shard.get("count") or not (_in_range(shard["last_date"], start_date, None)
+                                          and _in_range(shard["first_date"], None, end_date)):
+            continue
+        if _in_range(shard["first_date"], start_date, end_date) and _in_range(shard["last_date"], start_date, end_date):
+            for name, totals in shard.get("summary", {}).items():
+                _merge_stats(stats, name, totals)
+            continue
+        for record in read_shard(LEDGER_DIR, key):
+            if _in_range(record.get("date", ""), start_date, end_date):
+                _fold_record(stats, record)
+
+    if include_archived:
+        from archive import load_archive_manifest, read_archived_month
+        archive_manifest = load_archive_manifest()
+        months = sorted(archive_manifest["months"])
+        closed = archive_manifest["closed_through"]
+        if months and (not start_date or start_date <= closed):
+            if _in_range(f"{months[0]}-01", start_date, None) and _in_range(closed, None, end_date):
+                for name, totals in archive_manifest["accounts"].items():
+                    _merge_stats(stats, name, totals)
+            else:
+                for key in months:
+                    if (start_date and key < start_date[:7]) or (end_date and key > end_date[:7]):
+                        continue
+                    for record in read_archived_month(key):
+                        if _in_range(record["date"], start_date, end_date):
+                            _fold_record(stats, record)
+
+    for combined in stats.values():
+        combined["volume"] = combined["debit"] + combined["credit"]
+        combined["mean"] = round(combined["volume"] / combined["postings"])
+    return stats
+
+def get_account_stats(account_name, start_date=None, end_date=None, include_archived=True):
+    """
+    Activity statistics of one account (see account_stats)
+
+    Returns:
+        Tuple (account name, statistics or None if it has no postings in the range),
+        or (None, None) if the account doesn't exist
+    """
+    actual_name, account_data = get_account_by_name(account_name, load_accounts())
+    if not account_data:
+        return None, None
+    return actual_name, account_stats(start_date, end_date, include_archived).get(actual_name)
+
+def top_accounts(n=10, by="postings", start_date=None, end_date=None, account_type=None, include_archived=True):
+    """
+    The most active accounts
+
+    Args:
+        n: Number of accounts to return
+        by: Measure to rank by, one of ACTIVITY_MEASURES
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+        account_type: Only accounts of this type
+        include_archived: Count the postings of closed months too
+
+    Returns:
+        List of (account, statistics) tuples, highest first
+    """
+    stats = account_stats(start_date, end_date, include_archived)
+    if account_type:
+        accounts_data = load_accounts()
+        stats = {name: totals for name, totals in stats.items()
+                 if accounts_data.get(name, {}).get("type") == account_type}
+    return heapq.nlargest(n, stats.items(), key=lambda item: item[1][by])
+
+def _iter_activity(start_date, end_date, account_name, include_archived, accounts_data):
+    """Stream the postings a top-N query looks at: archived months first, then the hot ledger"""
+    if include_archived:
+        from archive import closed_through, iter_archived_postings
+        closed = closed_through()
+        if closed and (not start_date or start_date <= closed):
+            for posting in iter_archived_postings(account_name, accounts_data):
+                if _in_range(posting.date, start_date, end_date):
+                    yield posting
+    if account_name:
+        yield from iter_account_ledger(account_name, start_date=start_date, end_date=end_date)
+    else:
+        yield from iter_postings(start_date, end_date)
+
+def top_postings(n=10, start_date=None, end_date=None, account_type=None, account=None, entry_type=None,
+                 smallest=False, include_archived=True):
+    """
+    The largest (or smallest) postings, found in one pass that keeps only the best n in a heap,
+    so memory does not grow with the size of the ledger
+
+    Args:
+        n: Number of postings to return
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+        account_type: Only postings to accounts of this type (e.g. 'Expense')
+        account: Only postings to this account
+        entry_type: Only 'Debit' or 'Credit' postings (default: both)
+        smallest: Return the smallest postings instead
+        include_archived: Look at the postings of closed months too
+
+    Returns:
+        List of Postings, largest (or smallest) first and earliest first among equal amounts,
+        or None if the account doesn't exist
+    """
+    accounts_data = load_accounts()
+    if account:
+        account, account_data = get_account_by_name(account, accounts_data)
+        if not account_data:
+            return None
+    entry_types = (entry_type,) if entry_type else ACTIVITY_ENTRY_TYPES
+    sign = -1 if smallest else 1
+
+    heap = []
+    for order, posting in enumerate(_iter_activity(start_date, end_date, account, include_archived, accounts_data)):
+        if posting.entry_type not in entry_types:
+            continue
+        if account_type and accounts_data.get(posting.account, {}).get("type") != account_type:
+            continue
+        # Earlier postings rank higher among equal amounts; the order also keeps Postings from being compared
+        item = (sign * posting.amount, -order, posting)
+        if len(heap) < n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return [posting for _, _, posting in sorted(heap, reverse=True)]
+
+def format_top_postings_text(postings, title="TOP POSTINGS"):
+    """Format the result of top_postings as text"""
+    lines = [title, "-" * 80]
+    for posting in postings:
+        lines.append(f"{posting.date} | {posting.je_id:<16} | {posting.account:<25} | {posting.entry_type:<6} | "
+                     f"{format_currency(posting.amount):>14}")
+    return "\n".join(lines)
+
+def format_account_stats_text(rows, title="ACCOUNT ACTIVITY"):
+    """Format (account, statistics) tuples as text"""
+    lines = [title, f"{'Account':<25} {'Postings':>8} {'Volume':>16} {'Min':>14} {'Max':>14} {'Mean':>14}",
+             "-" * 96]
+    for name, totals in rows:
+        lines.append(f"{name:<25} {totals['postings']:>8} {format_currency(totals['volume']):>16} "
+                     f"{format_currency(totals['min']):>14} {format_currency(totals['max']):>14} "
+                     f"{format_currency(totals['mean']):>14}")
+    return "\n".join(lines)
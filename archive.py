@@ -0,0 +1,333 @@
+"""
+Archive Module - Compact closed months of the ledger into compressed, array-backed archive files
+and carry their closing balances forward into the hot ledger
+"""
+import calendar
+import hashlib
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from utils import load_json, save_json_atomic, LEDGER_DIR, LEDGER_ARCHIVE_DIR
+from accounts import load_accounts, DEBIT_NORMAL_TYPES
+from ledger import (
+    summarize_posting_record, fold_posting_stats, LEDGER_INDEX_FIELD, OPENING_ENTRY_TYPE, CARRIED_FORWARD_JE_ID
+)
+from records import Posting
+from storage import load_manifest, read_shard, rewrite_shard, shard_key, MANIFEST_NAME
+from versions import commit_version, holds_writer_lock
+
+ARCHIVE_MAGIC = b"SLARC1\n"
+ARCHIVE_SUFFIX = ".slarc"
+ARCHIVE_ENTRY_TYPES = ["Debit", "Credit", OPENING_ENTRY_TYPE]
+COMPRESSION_LEVEL = 9
+
+_LENGTH = struct.Struct("<I")
+# Columns kept per posting; date is stored as the day of the shard's month, and the running
+# balance, hash and write sequence number are not stored at all (they are re-derived on reading)
+_COLUMNS = [("account", "I"), ("je_id", "I"), ("entry_type", "B"), ("day", "B"), ("currency", "H"),
+            ("amount", "q"), ("foreign_amount", "q")]
+
+def load_archive_manifest():
+    """
+    Load the archive manifest
+
+    Returns:
+        Dictionary {"closed_through": date or None,
+                    "months": {key: {"count", "size", "raw_size", "digest", "head", "last_seq"}},
+                    "accounts": {account: {"debit", "credit", "opening", "postings", "min", "max"}},
+                    "carried": {account: {currency or "": [base cents, foreign cents]}}}
+        "head" is the hot shard's chain head when the month was archived ("last_seq" the highest write
+        sequence number archived so far), "accounts" holds the
+        totals of all archived postings and "carried" the closing balances at closed_through.
+    """
+    manifest = load_json(LEDGER_ARCHIVE_DIR / MANIFEST_NAME, default={})
+    manifest.setdefault("closed_through", None)
+    manifest.setdefault("months", {})
+    manifest.setdefault("accounts", {})
+    manifest.setdefault("carried", {})
+    return manifest
+
+def save_archive_manifest(manifest):
+    """Save the archive manifest"""
+    return save_json_atomic(LEDGER_ARCHIVE_DIR / MANIFEST_NAME, manifest)
+
+def closed_through():
+    """Last date of the closed (archived) periods, or None if nothing is closed"""
+    return load_archive_manifest()["closed_through"]
+
+def archive_path(key):
+    """Path of the archive file of a month"""
+    return LEDGER_ARCHIVE_DIR / f"{key}{ARCHIVE_SUFFIX}"
+
+def encode_month(records):
+    """
+    Encode the postings of one month as a compressed archive
+
+    Returns:
+        Tuple (archive bytes, uncompressed size)
+    """
+    tables = {"accounts": {}, "je_ids": {}, "currencies": {"": 0}}
+    columns = {name: array(typecode) for name, typecode in _COLUMNS}
+    for record in records:
+        columns["account"].append(tables["accounts"].setdefault(record["account"], len(tables["accounts"])))
+        columns["je_id"].append(tables["je_ids"].setdefault(record["je_id"], len(tables["je_ids"])))
+        columns["entry_type"].append(ARCHIVE_ENTRY_TYPES.index(record["entry_type"]))
+        columns["day"].append(int(record["date"][8:10]))
+        currency = record.get("currency") or ""
+        columns["currency"].append(tables["currencies"].setdefault(currency, len(tables["currencies"])))
+        columns["amount"].append(record["amount"])
+        columns["foreign_amount"].append(record.get("foreign_amount") or 0)
+
+    header = json.dumps({
+        "count": len(records),
+        "byteorder": sys.byteorder,
+        "accounts": list(tables["accounts"]),
+        "je_ids": list(tables["je_ids"]),
+        "currencies": list(tables["currencies"])
+    }, ensure_ascii=False).encode('utf-8')
+    payload = b"".join([_LENGTH.pack(len(header)), header] +
+                       [columns[name].tobytes() for name, _ in _COLUMNS])
+    return ARCHIVE_MAGIC + zlib.compress(payload, COMPRESSION_LEVEL), len(payload)
+
+def decode_month(key, data):
+    """
+    Decode an archive back into posting records (without running balances)
+
+    Returns:
+        List of {"account", "date", "je_id", "entry_type", "amount"[, "currency", "foreign_amount"]}
+    """
+    if not data.startswith(ARCHIVE_MAGIC):
+        raise ValueError(f"{archive_path(key)} is not a ledger archive")
+    payload = zlib.decompress(data[len(ARCHIVE_MAGIC):])
+    (header_length,) = _LENGTH.unpack_from(payload)
+    position = _LENGTH.size + header_length
+    header = json.loads(payload[_LENGTH.size:position])
+    columns = {}
+    for name, typecode in _COLUMNS:
+        values = array(typecode)
+        size = header["count"] * values.itemsize
+        values.frombytes(payload[position:position + size])
+        if header["byteorder"] != sys.byteorder:
+            values.byteswap()
+        columns[name] = values
+        position += size
+
+    records = []
+    for index in range(header["count"]):
+        record = {
+            "account": header["accounts"][columns["account"][index]],
+            "date": f"{key}-{columns['day'][index]:02d}",
+            "je_id": header["je_ids"][columns["je_id"][index]],
+            "entry_type": ARCHIVE_ENTRY_TYPES[columns["entry_type"][index]],
+            "amount": columns["amount"][index]
+        }
+        currency = header["currencies"][columns["currency"][index]]
+        if currency:
+            record["currency"] = currency
+            record["foreign_amount"] = columns["foreign_amount"][index]
+        records.append(record)
+    return records
+
+def read_archived_month(key):
+    """Read the posting records of an archived month"""
+    with open(archive_path(key), 'rb') as f:
+        return decode_month(key, f.read())
+
+def _sign(record, account_type):
+    """+1 if a posting raises the account's balance, -1 if it lowers it (opening postings are already signed)"""
+    if record["entry_type"] not in ("Debit", "Credit"):
+        return 1
+    return 1 if (record["entry_type"] == "Debit") == (account_type in DEBIT_NORMAL_TYPES) else -1
+
+def iter_archived_postings(account_name=None, accounts_data=None):
+    """
+    Yield archived postings oldest first, with their running balances re-derived
+
+    Args:
+        account_name: Exact account name to yield only its postings (default: all accounts)
+        accounts_data: Dictionary of accounts (default: loaded)
+
+    Yields:
+        Postings
+    """
+    if accounts_data is None:
+        accounts_data = load_accounts()
+    balances = {}
+    for key in sorted(load_archive_manifest()["months"]):
+        for record in read_archived_month(key):
+            name = record["account"]
+            if account_name and name != account_name:
+                continue
+            account_type = accounts_data.get(name, {}).get("type")
+            balances[name] = balances.get(name, 0) + _sign(record, account_type) * record["amount"]
+            yield Posting(name, record["date"], record["je_id"], record["entry_type"], record["amount"],
+                          balances[name], currency=record.get("currency"),
+                          foreign_amount=record.get("foreign_amount"))
+
+def carried_balance(account_name, manifest=None):
+    """Closing balance of an account at closed_through, in cents"""
+    manifest = manifest or load_archive_manifest()
+    return sum(base for base, _ in manifest["carried"].get(account_name, {}).values())
+
+def carried_forward_postings(names=None, manifest=None):
+    """
+    Opening postings that carry closing balances at closed_through into the hot ledger:
+    one for the base currency part of each balance and one per foreign currency held
+
+    Args:
+        names: Account names to build them for (default: every account with a closing balance)
+        manifest: Archive manifest (default: loaded)
+
+    Returns:
+        List of Postings dated closed_through
+    """
+    manifest = manifest or load_archive_manifest()
+    date = manifest["closed_through"]
+    postings = []
+    for name in sorted(manifest["carried"] if names is None else names):
+        parts = manifest["carried"].get(name, {})
+        running = 0
+        for currency, (base, foreign) in sorted(parts.items()):
+            if not base and not foreign:
+                continue
+            running += base
+            postings.append(Posting(name, date, CARRIED_FORWARD_JE_ID, OPENING_ENTRY_TYPE, base, running,
+                                    currency=currency or None, foreign_amount=foreign if currency else None))
+    return postings
+
+def _fold_closing(carried, record, account_type):
+    """Fold one archived posting into the closing balances per account and currency"""
+    sign = _sign(record, account_type)
+    part = carried.setdefault(record["account"], {}).setdefault(record.get("currency") or "", [0, 0])
+    part[0] += sign * record["amount"]
+    if record.get("currency"):
+        part[1] += sign * record["foreign_amount"]
+
+def _write_archive(key, records):
+    """Write one month's archive file beside the old one and rename it into place"""
+    data, raw_size = encode_month(records)
+    path = archive_path(key)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    tmp_path.replace(path)
+    return {"count": len(records), "size": len(data), "raw_size": raw_size,
+            "digest": hashlib.sha256(data).hexdigest()}
+
+def _trim_pending(closed, ledger_shards):
+    """Whether hot ledger shards of closed months still hold postings other than carried-forward ones"""
+    return any(record["je_id"] != CARRIED_FORWARD_JE_ID
+               for key in sorted(ledger_shards) if key <= shard_key(closed)
+               for record in read_shard(LEDGER_DIR, key))
+
+@holds_writer_lock
+def compact_ledger(through):
+    """
+    Close every month up to and including a month: archive its postings and replace them in
+    the hot ledger with one carried-forward opening posting per account (and foreign currency).
+    Journal entries dated in a closed month can no longer be recorded.
+
+    Args:
+        through: Last month to close (YYYY-MM); it must be before the current month.
+                 The last closed month can be given again to finish a run that stopped while
+                 trimming the hot ledger.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    try:
+        year, month = (int(part) for part in through.split("-"))
+        datetime(year, month, 1)
+    except ValueError:
+        return False, "Invalid month format. Use YYYY-MM"
+    through = f"{year:04d}-{month:02d}"
+    if through >= datetime.now().strftime("%Y-%m"):
+        return False, "Only months before the current one can be closed"
+    manifest = load_archive_manifest()
+    ledger_shards = load_manifest(LEDGER_DIR)["shards"]
+    closed = manifest["closed_through"]
+    if closed and shard_key(closed) >= through and not (
+            shard_key(closed) == through and _trim_pending(closed, ledger_shards)):
+        return False, f"Ledger is already closed through {closed}"
+
+    accounts_data = load_accounts()
+    types = {name: data.get("type") for name, data in accounts_data.items()}
+    keys = sorted(key for key in ledger_shards if key <= through)
+
+    LEDGER_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    archived = 0
+    last_seq = 0
+    for key in keys:
+        if manifest["months"].get(key, {}).get("head") == ledger_shards[key].get("head"):
+            # Archived by an earlier run that stopped before trimming the hot ledger
+            last_seq = max(last_seq, manifest["months"][key].get("last_seq", 0))
+            continue
+        records = list(read_shard(LEDGER_DIR, key))
+        last_seq = max([last_seq] + [record.get("seq", 0) for record in records])
+        # Carried-forward postings are re-derived from the archive, so they are not archived again
+        records = [record for record in records if record["je_id"] != CARRIED_FORWARD_JE_ID]
+        if not records:
+            continue
+        new_records = records
+        if key in manifest["months"]:
+            # Postings written to an already archived month are added to its archive
+            records = read_archived_month(key) + new_records
+        for record in new_records:
+            totals = manifest["accounts"].setdefault(record["account"], {"debit": 0, "credit": 0, "opening": 0})
+            bucket = {"Debit": "debit", "Credit": "credit"}.get(record["entry_type"], "opening")
+            totals[bucket] += record["amount"]
+            if bucket != "opening":
+                fold_posting_stats(totals, record["amount"])
+            _fold_closing(manifest["carried"], record, types.get(record["account"]))
+        try:
+            manifest["months"][key] = _write_archive(key, records)
+        except IOError as e:
+            return False, f"Failed to write archive for {key}: {e}"
+        manifest["months"][key]["head"] = ledger_shards[key].get("head")
+        manifest["months"][key]["last_seq"] = last_seq
+        archived += len(new_records)
+
+    last_day = calendar.monthrange(year, month)[1]
+    manifest["closed_through"] = f"{through}-{last_day:02d}"
+    if not save_archive_manifest(manifest):
+        return False, "Failed to save archive manifest"
+
+    # Trim the hot ledger: closed months go, the last one keeps only the carried-forward postings
+    for key in keys:
+        if key != through and not rewrite_shard(LEDGER_DIR, key, [], index_field=LEDGER_INDEX_FIELD,
+                                                summarize=summarize_posting_record):
+            return False, f"Failed to remove ledger shard {key}; run the compaction through {through} again to finish it"
+    # Carried-forward postings take the place of the archived ones in write order, so that
+    # postings written after them still hold the latest running balance
+    carried = [dict(posting.to_dict(), seq=last_seq) for posting in carried_forward_postings(manifest=manifest)]
+    if not rewrite_shard(LEDGER_DIR, through, carried, index_field=LEDGER_INDEX_FIELD,
+                         summarize=summarize_posting_record):
+        return False, (f"Failed to write carried-forward postings to {through}; run the compaction again "
+                       "to finish it")
+    # Versions pinned before the trim now expire; readers re-pin this one
+    if not commit_version():
+        return False, "Failed to commit read version"
+    return True, (f"Closed through {manifest['closed_through']}: archived {archived} postings from "
+                  f"{len(keys)} months, carried forward {len(carried)} balances")
+
+def verify_archive():
+    """
+    Check every archive file against the digest recorded when it was written
+
+    Returns:
+        List of problem descriptions (empty if all archives are intact)
+    """
+    problems = []
+    for key, stats in sorted(load_archive_manifest()["months"].items()):
+        path = archive_path(key)
+        if not path.exists():
+            problems.append(f"archive {key} is missing")
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != stats["digest"]:
+            problems.append(f"archive {key} does not match its recorded digest")
+    return problems
@@ -0,0 +1,227 @@
+"""
+Chart of Accounts Module - Account codes, group hierarchy and cached subtree balances
+"""
+from utils import load_json, save_json_atomic, get_account_by_name, CHART_FILE
+from versions import commit_version, holds_writer_lock
+
+# Top-level group of each account type; every other group and account hangs below one of these
+ROOT_GROUPS = {
+    "Asset": ("1000", "Assets"),
+    "Liability": ("2000", "Liabilities"),
+    "Owner's Equity": ("3000", "Owner's Equity"),
+    "Revenue": ("4000", "Revenue"),
+    "Expense": ("5000", "Expenses"),
+}
+
+def load_chart():
+    """
+    Load the chart of accounts, seeding the root group of every account type
+
+    Returns:
+        Dictionary {"groups": {code: {"name": str, "type": str, "parent": code or None,
+                                      "balance": int cents}}}
+        "balance" is the cached total of every account below the group (in the group type's normal sign).
+    """
+    chart = load_json(CHART_FILE, default={})
+    groups = chart.setdefault("groups", {})
+    for account_type, (code, name) in ROOT_GROUPS.items():
+        groups.setdefault(code, {"name": name, "type": account_type, "parent": None, "balance": 0})
+    return chart
+
+def save_chart(chart):
+    """Save the chart of accounts"""
+    return save_json_atomic(CHART_FILE, chart)
+
+def code_in_use(code, chart, accounts_data):
+    """Check whether a code is already taken by a group or an account"""
+    if code in chart["groups"]:
+        return True
+    return any(account_data.get("code") == code for account_data in accounts_data.values())
+
+def validate_code(code, chart, accounts_data):
+    """
+    Validate a new account or group code
+
+    Returns:
+        Error message, or None if the code is valid
+    """
+    if not code or not code.isdigit():
+        return "Code must be numeric (e.g. 1110)"
+    if code_in_use(code, chart, accounts_data):
+        return f"Code {code} is already in use"
+    return None
+
+def resolve_parent(account_type, parent, chart):
+    """
+    Find the group an account of a type is placed under
+
+    Args:
+        account_type: Account type
+        parent: Group code, or None for the root group of the type
+        chart: Chart of accounts
+
+    Returns:
+        Tuple (group code or None, error message or None)
+    """
+    if not parent:
+        return ROOT_GROUPS[account_type][0], None
+    group = chart["groups"].get(parent)
+    if not group:
+        return None, f"Group {parent} does not exist"
+    if group["type"] != account_type:
+        return None, f"Group {parent} ({group['name']}) holds {group['type']} accounts, not {account_type}"
+    return parent, None
+
+@holds_writer_lock
+def create_group(code, name, parent):
+    """
+    Create an account group below an existing group
+
+    Args:
+        code: Numeric group code
+        name: Group name
+        parent: Code of the parent group (its type is inherited)
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    from accounts import load_accounts
+
+    if not name or not name.strip():
+        return False, "Group name cannot be empty"
+    chart = load_chart()
+    error = validate_code(code, chart, load_accounts())
+    if error:
+        return False, error
+    parent_group = chart["groups"].get(parent)
+    if not parent_group:
+        return False, f"Group {parent} does not exist"
+    chart["groups"][code] = {"name": name.strip(), "type": parent_group["type"], "parent": parent, "balance": 0}
+    if not save_chart(chart) or not commit_version(chart=chart):
+        return False, "Failed to save chart of accounts"
+    return True, f"Group {code} {name.strip()} created under {parent} {parent_group['name']}"
+
+def group_path(code, chart):
+    """
+    Codes of a group and all its ancestors, nearest first (O(depth))
+
+    Returns:
+        List of group codes
+    """
+    path = []
+    while code and code in chart["groups"]:
+        path.append(code)
+        code = chart["groups"][code]["parent"]
+    return path
+
+def adjust_rollups(parent, delta, chart=None):
+    """
+    Add an account's balance change to the cached balance of every group above it
+
+    Args:
+        parent: Code of the account's group
+        delta: Balance change in cents
+        chart: Already loaded chart (saved by the caller) or None to load and save here
+
+    Returns:
+        True if saved, False otherwise
+    """
+    if not delta or not parent:
+        return True
+    own_chart = chart is None
+    if own_chart:
+        chart = load_chart()
+    for code in group_path(parent, chart):
+        chart["groups"][code]["balance"] += delta
+    return save_chart(chart) if own_chart else True
+
+def compute_rollups(accounts_data, chart):
+    """
+    Recompute every group balance from the account balances
+
+    Returns:
+        Dictionary {group code: balance in cents}
+    """
+    totals = {code: 0 for code in chart["groups"]}
+    for account_data in accounts_data.values():
+        for code in group_path(account_data.get("parent"), chart):
+            totals[code] += account_data.get("balance", 0)
+    return totals
+
+@holds_writer_lock
+def rebuild_rollups(accounts_data=None):
+    """
+    Reset the cached group balances from the account balances (after a rebuild or repair)
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    from accounts import load_accounts
+
+    if accounts_data is None:
+        accounts_data = load_accounts()
+    chart = load_chart()
+    for code, total in compute_rollups(accounts_data, chart).items():
+        chart["groups"][code]["balance"] = total
+    if not save_chart(chart):
+        return False, "Failed to save chart of accounts"
+    return True, f"Rolled up {len(accounts_data)} accounts into {len(chart['groups'])} groups"
+
+def check_rollups(accounts_data):
+    """
+    Find groups whose cached balance differs from the sum of the accounts below them
+
+    Returns:
+        Dictionary {group code: {"name", "cached", "expected"}}
+    """
+    chart = load_chart()
+    drifting = {}
+    for code, expected in compute_rollups(accounts_data, chart).items():
+        group = chart["groups"][code]
+        if group["balance"] != expected:
+            drifting[code] = {"name": group["name"], "cached": group["balance"], "expected": expected}
+    return drifting
+
+def get_rollup(code):
+    """
+    Balance of a group and everything below it, read from the cache
+
+    Returns:
+        Tuple (group name, balance in cents) or None if the group doesn't exist
+    """
+    group = load_chart()["groups"].get(code)
+    if not group:
+        return None
+    return group["name"], group["balance"]
+
+def rollup_path(account_name, accounts_data):
+    """
+    Balances of every group above an account, nearest first (O(depth))
+
+    Returns:
+        List of (code, name, balance in cents) tuples, empty if the account is not in the chart
+    """
+    _, account_data = get_account_by_name(account_name, accounts_data)
+    if not account_data:
+        return []
+    chart = load_chart()
+    return [(code, chart["groups"][code]["name"], chart["groups"][code]["balance"])
+            for code in group_path(account_data.get("parent"), chart)]
+
+def group_depths(chart):
+    """
+    Groups in chart order (each group followed by its subgroups, by code) with their depth
+
+    Returns:
+        List of (code, depth) tuples; root groups have depth 0
+    """
+    children = {}
+    for code, group in chart["groups"].items():
+        children.setdefault(group["parent"], []).append(code)
+    ordered = []
+    stack = [(code, 0) for code in sorted(children.get(None, []), reverse=True)]
+    while stack:
+        code, depth = stack.pop()
+        ordered.append((code, depth))
+        stack.extend((child, depth + 1) for child in sorted(children.get(code, []), reverse=True))
+    return ordered
@@ -0,0 +1,533 @@
+"""
+Command Line Module - Non-interactive subcommands for scripts, cron jobs and pipelines.
+Subsystems are imported inside each command so a call only loads what it uses.
+"""
+import argparse
+import json
+import os
+import sys
+
+STARTUP_TARGET_MS = 150  # Median cold start of a light command (e.g. 'account list') must stay under this
+ENTITY_ENV_VAR = "SMARTLEDGER_ENTITY"  # Same as utils.ENTITY_ENV_VAR, which is read when utils is imported
+
+# Report name -> (generator, text formatter) in the report module (consolidate for 'consolidated')
+REPORTS = {
+    "trial-balance": ("generate_trial_balance", "format_trial_balance_text"),
+    "income-statement": ("generate_income_statement", "format_income_statement_text"),
+    "balance-sheet": ("generate_balance_sheet", "format_balance_sheet_text"),
+    "cash-flow": ("generate_cash_flow", "format_cash_flow_text"),
+    "ratios": ("generate_ratio_analysis", None),
+    "chart-rollup": ("generate_chart_rollup", "format_chart_rollup_text"),
+    "fx-revaluation": ("generate_fx_revaluation", "format_fx_revaluation_text"),
+    "consolidated": ("generate_consolidated_report", "format_consolidated_text"),
+    "aging": ("generate_aging_report", "format_aging_text"),
+}
+
+def _print_json(data):
+    print(json.dumps(data, indent=2, ensure_ascii=False))
+
+def _finish(success, message, data=None, output_format="text", text=None):
+    """Print a command's result and return its exit code (messages go to stderr in JSON mode)"""
+    if output_format == "json":
+        if data is not None:
+            _print_json(data)
+        if message:
+            print(message, file=sys.stderr)
+    else:
+        if text:
+            print(text)
+        if message:
+            print(message)
+    return 0 if success else 1
+
+def _migrate():
+    """Bring the data files up to date before a command touches them"""
+    from migrate import migrate_data
+    success, message = migrate_data()
+    if not success:
+        print(f"Data migration failed: {message}", file=sys.stderr)
+    return success
+
+def _parse_lines(values):
+    """Parse ACCOUNT=AMOUNT[:CURRENCY][@REF] arguments into journal line dictionaries"""
+    lines = []
+    for value in values or []:
+        account, sep, amount = value.rpartition("=")
+        if not sep or not account:
+            raise ValueError(f"Expected ACCOUNT=AMOUNT[:CURRENCY][@REF], got '{value}'")
+        amount, _, ref = amount.partition("@")
+        amount, _, currency = amount.partition(":")
+        line = {"account": account.strip(), "amount": amount.strip()}
+        if currency:
+            line["currency"] = currency.strip()
+        if ref:
+            line["ref"] = ref.strip()
+        lines.append(line)
+    return lines
+
+def cmd_account_create(args):
+    from accounts import create_account
+    success, message = create_account(args.name, args.type, args.balance, args.opened, args.code, args.parent,
+                                      args.open_items)
+    return _finish(success, message)
+
+def cmd_account_track(args):
+    from openitems import enable_open_items
+    success, message = enable_open_items(args.name)
+    return _finish(success, message)
+
+def cmd_account_list(args):
+    from accounts import get_accounts_by_type
+    from utils import format_currency
+    accounts_data = get_accounts_by_type(args.type)
+    if args.format == "json":
+        return _finish(True, "", accounts_data, "json")
+    for name, account_data in sorted(accounts_data.items()):
+        print(f"{account_data.get('code', ''):<8} {name:<30} {account_data.get('type', ''):<16} "
+              f"{format_currency(account_data.get('balance', 0)):>18}")
+    return 0
+
+def cmd_account_balance(args):
+    from snapshot import read_balance, read_totals
+    from utils import format_currency
+    if args.name is None:
+        totals = read_totals()
+        if totals is None:
+            return _finish(False, "No balance snapshot published")
+        if args.format == "json":
+            return _finish(True, "", totals, "json")
+        return _finish(True, "", text="\n".join(f"{account_type:<16} {format_currency(total):>18}"
+                                                 for account_type, total in totals.items()))
+    balance = read_balance(args.name)
+    if balance is None:
+        return _finish(False, f"Account '{args.name}' not found in the balance snapshot")
+    if args.format == "json":
+        return _finish(True, "", {"account": args.name, "balance": balance}, "json")
+    return _finish(True, "", text=format_currency(balance))
+
+def cmd_account_group(args):
+    from chart import create_group
+    success, message = create_group(args.code, args.name, args.parent)
+    return _finish(success, message)
+
+def cmd_journal_add(args):
+    from journal import create_journal_entry, get_journal_entry
+    try:
+        debits = _parse_lines(args.debit)
+        credits = _parse_lines(args.credit)
+    except ValueError as e:
+        return _finish(False, str(e))
+    if args.date is None:
+        from datetime import datetime
+        args.date = datetime.now().strftime("%Y-%m-%d")
+    if args.idempotency_key:
+        # A retried call with the same key succeeds without recording or posting anything again
+        from dedup import find_idempotency_key
+        existing = find_idempotency_key(args.idempotency_key)
+        if existing:
+            message = f"Already recorded as '{existing}'"
+            return _finish(True, message, {"je_id": existing, "message": message}, args.format)
+    success, je_id, message = create_journal_entry(args.date, args.narration, debits, credits,
+                                                   args.on_duplicate, args.idempotency_key)
+    if not success or args.no_post:
+        return _finish(success, message, {"je_id": je_id, "message": message}, args.format)
+    from ledger import post_journal_entry_to_ledger
+    success, ledger_message = post_journal_entry_to_ledger(je_id, get_journal_entry(je_id))
+    return _finish(success, f"{message}. Ledger: {ledger_message}",
+                   {"je_id": je_id, "message": message, "ledger": ledger_message}, args.format)
+
+def cmd_journal_import(args):
+    from journal import import_journal_entries
+    try:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (IOError, ValueError) as e:
+        return _finish(False, f"Cannot read {args.file}: {e}")
+    success, results, message = import_journal_entries(entries, args.on_duplicate, not args.no_post)
+    text = "\n".join([f"Skipped entry {item['index']}: {item['message']}" for item in results["skipped"]] +
+                     [f"Failed entry {item['index']}: {item['message']}" for item in results["failed"]])
+    return _finish(success, message, results, args.format, text)
+
+def cmd_journal_duplicates(args):
+    from dedup import list_duplicates
+    groups = list_duplicates()
+    if args.format == "json":
+        return _finish(True, "", groups, "json")
+    for je_ids in groups:
+        print(", ".join(je_ids))
+    return _finish(True, f"{len(groups)} groups of entries with the same date, accounts and amounts")
+
+def cmd_journal_search(args):
+    from search import search_journal
+    from journal import get_journal_entries_by_ids
+    entries = get_journal_entries_by_ids(search_journal(args.query, limit=args.limit))
+    if args.format == "json":
+        return _finish(True, "", [entry.to_dict() for entry in entries], "json")
+    from utils import format_currency
+    for entry in entries:
+        total = sum(line.amount for line in entry.debits)
+        print(f"{entry.je_id} | {entry.date} | {format_currency(total):>12} | {entry.narration}")
+    return 0
+
+def cmd_ledger_show(args):
+    if args.archived:
+        from archive import iter_archived_postings
+        from accounts import load_accounts
+        from utils import get_account_by_name
+        accounts_data = load_accounts()
+        actual_name, account_data = get_account_by_name(args.account, accounts_data)
+        postings = list(iter_archived_postings(actual_name, accounts_data)) if account_data else None
+    else:
+        from ledger import get_account_ledger
+        postings = get_account_ledger(args.account, offset=args.offset, limit=args.limit,
+                                      start_date=args.start, end_date=args.end, reverse=args.reverse)
+    if postings is None:
+        return _finish(False, f"Account '{args.account}' not found")
+    if args.format == "json":
+        return _finish(True, "", [posting.to_dict() for posting in postings], "json")
+    from utils import format_currency
+    for posting in postings:
+        print(f"{posting.date} | {posting.je_id} | {posting.entry_type:<7} | "
+              f"{format_currency(posting.amount):>14} | {format_currency(posting.running_balance):>14}")
+    return 0
+
+def cmd_report(args):
+    if args.report == "all":
+        from report import generate_all_reports, format_all_reports_text
+        success, data, message = generate_all_reports(args.as_of, args.workers)
+        if args.format == "json":
+            return _finish(success, message, data, "json")
+        return _finish(success, message, text=format_all_reports_text(data))
+    generator_name, formatter_name = REPORTS[args.report]
+    if args.report == "consolidated":
+        import consolidate as module
+    else:
+        import report as module
+    kwargs = {}
+    if args.report in ("fx-revaluation", "aging") and args.as_of:
+        kwargs["as_of"] = args.as_of
+    if args.report == "chart-rollup" and args.depth is not None:
+        kwargs["max_depth"] = args.depth
+    success, data, message = getattr(module, generator_name)(**kwargs)
+    if args.format == "json" or not data:
+        return _finish(success, message, data, args.format)
+    if formatter_name:
+        text = getattr(module, formatter_name)(data)
+    else:
+        text = "\n".join(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}"
+                         for key, value in data.items())
+    return _finish(success, message, data, args.format, text)
+
+def cmd_watch(args):
+    from watch import watch_reports
+    success, message = watch_reports(args.interval, args.cycles)
+    return _finish(success, message)
+
+def _print_events(batch):
+    """Print a batch of events as JSON lines"""
+    for event in batch:
+        print(json.dumps(event, ensure_ascii=False))
+
+def cmd_events_tail(args):
+    from events import tail_events
+    success, message = tail_events(_print_events, args.consumer, 0 if args.from_start else None,
+                                   args.batch_size, args.follow)
+    # Events go to stdout as JSON lines, so the summary goes to stderr
+    print(message, file=sys.stderr)
+    return 0 if success else 1
+
+def cmd_whatif(args):
+    from whatif import new_overlay, apply_entry, whatif_reports, format_whatif_text
+    if args.entries:
+        try:
+            with open(args.entries, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (IOError, ValueError) as e:
+            return _finish(False, f"Cannot read {args.entries}: {e}")
+    elif args.debit and args.credit:
+        try:
+            entries = [{"date": args.date, "narration": args.narration or "What-if entry",
+                        "debits": _parse_lines(args.debit), "credits": _parse_lines(args.credit)}]
+        except ValueError as e:
+            return _finish(False, str(e))
+    else:
+        return _finish(False, "Give --debit and --credit lines, or --entries FILE")
+    overlay = new_overlay()
+    from datetime import datetime
+    for entry in entries:
+        success, _, message = apply_entry(overlay, entry.get("date") or datetime.now().strftime("%Y-%m-%d"),
+                                          entry.get("narration", ""), entry.get("debits", []),
+                                          entry.get("credits", []))
+        if not success:
+            return _finish(False, message)
+    success, data, message = whatif_reports(overlay, args.depth)
+    text = format_whatif_text(data) if args.format == "text" else None
+    return _finish(success, message, data, args.format, text)
+
+def cmd_analytics_top(args):
+    from analytics import top_postings, format_top_postings_text
+    postings = top_postings(args.n, args.start, args.end, args.type, args.account, args.side, args.smallest,
+                            not args.hot_only)
+    if postings is None:
+        return _finish(False, f"Account '{args.account}' not found")
+    if args.format == "json":
+        return _finish(True, "", [posting.to_dict() for posting in postings], "json")
+    title = f"{'SMALLEST' if args.smallest else 'LARGEST'} {len(postings)} POSTINGS"
+    return _finish(True, "", text=format_top_postings_text(postings, title))
+
+def cmd_analytics_accounts(args):
+    from analytics import top_accounts, format_account_stats_text
+    rows = top_accounts(args.n, args.by, args.start, args.end, args.type, not args.hot_only)
+    if args.format == "json":
+        return _finish(True, "", [dict(totals, account=name) for name, totals in rows], "json")
+    return _finish(True, "", text=format_account_stats_text(rows, f"MOST ACTIVE ACCOUNTS BY {args.by.upper()}"))
+
+def cmd_analytics_stats(args):
+    from analytics import get_account_stats, format_account_stats_text
+    name, totals = get_account_stats(args.account, args.start, args.end, not args.hot_only)
+    if name is None:
+        return _finish(False, f"Account '{args.account}' not found")
+    if totals is None:
+        return _finish(True, f"No postings to '{name}' in this period")
+    if args.format == "json":
+        return _finish(True, "", dict(totals, account=name), "json")
+    return _finish(True, "", text=format_account_stats_text([(name, totals)]))
+
+def cmd_fx_set(args):
+    from fx import set_fx_rate
+    success, message = set_fx_rate(args.currency, args.date, args.rate)
+    return _finish(success, message)
+
+def cmd_entity_create(args):
+    from consolidate import create_entity
+    success, message = create_entity(args.name)
+    return _finish(success, message)
+
+def cmd_entity_list(args):
+    from consolidate import list_entities
+    for name in list_entities():
+        print(name)
+    return 0
+
+def cmd_export(args):
+    from export import export_data
+    success, message = export_data(args.store, args.format, args.output, args.start, args.end,
+                                   args.account, args.chunk_size)
+    return _finish(success, message)
+
+def cmd_compact(args):
+    from archive import compact_ledger
+    success, message = compact_ledger(args.through)
+    return _finish(success, message)
+
+def cmd_rebuild(args):
+    from ledger import rebuild_ledger
+    success, message = rebuild_ledger(streaming=args.streaming, run_size=args.run_size)
+    return _finish(success, message)
+
+def cmd_verify(args):
+    from integrity import verify_integrity
+    success, message = verify_integrity(full=args.full)
+    return _finish(success, message)
+
+def cmd_reconcile(args):
+    from reconcile import reconcile_accounts, format_reconciliation_text
+    success, data, message = reconcile_accounts(repair=args.repair)
+    text = format_reconciliation_text(data) if data.get("drifting") or data.get("rollup_drift") else None
+    return _finish(success, message, data, args.format, text)
+
+def cmd_startup_time(args):
+    """Measure the cold start of a light command in fresh interpreters and compare it to the target"""
+    import subprocess
+    import time
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    command = [sys.executable, main_path, "account", "list"]
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    within = median <= args.target_ms
+    message = (f"Cold start (median of {args.runs}): {median:.1f} ms, fastest {timings[0]:.1f} ms, "
+               f"target {args.target_ms} ms - {'OK' if within else 'TOO SLOW'}")
+    return _finish(within, message)
+
+def build_parser():
+    """Build the argument parser with all subcommands"""
+    parser = argparse.ArgumentParser(prog="smartledger", description="SmartLedger accounting from the command line")
+    parser.add_argument("--entity", help="Work in the books of this entity (default: SMARTLEDGER_ENTITY or data/)")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    def add(subparsers, name, handler, help_text, formats=False, migrate=True):
+        command = subparsers.add_parser(name, help=help_text)
+        command.set_defaults(handler=handler, migrate=migrate)
+        if formats:
+            command.add_argument("--format", choices=["text", "json"], default="text")
+        return command
+
+    account = commands.add_parser("account", help="Create and list accounts").add_subparsers(metavar="action")
+    account.required = True
+    command = add(account, "create", cmd_account_create, "Create an account")
+    command.add_argument("name")
+    command.add_argument("--type", required=True, help="Asset, Liability, Revenue, Expense or \"Owner's Equity\"")
+    command.add_argument("--balance", default="0", help="Opening balance")
+    command.add_argument("--opened", help="Opening date (YYYY-MM-DD, default: today)")
+    command.add_argument("--code", help="Account code (e.g. 1110)")
+    command.add_argument("--parent", help="Parent group code")
+    command.add_argument("--open-items", action="store_true", help="Track open items for aging (Asset/Liability)")
+    command = add(account, "track-open-items", cmd_account_track, "Start tracking open items of an account")
+    command.add_argument("name")
+    command = add(account, "list", cmd_account_list, "List accounts and balances", formats=True)
+    command.add_argument("--type", help="Only accounts of this type")
+    command = add(account, "balance", cmd_account_balance, "Read balances from the shared snapshot", formats=True)
+    command.add_argument("name", nargs="?", help="Account name (default: totals by account type)")
+    command = add(account, "group", cmd_account_group, "Create an account group")
+    command.add_argument("code")
+    command.add_argument("name")
+    command.add_argument("--parent", required=True, help="Parent group code (e.g. 1000)")
+
+    journal = commands.add_parser("journal", help="Record and search journal entries").add_subparsers(metavar="action")
+    journal.required = True
+    command = add(journal, "add", cmd_journal_add, "Record a journal entry and post it to the ledger", formats=True)
+    command.add_argument("--date", help="Entry date (YYYY-MM-DD, default: today)")
+    command.add_argument("--narration", required=True)
+    command.add_argument("--debit", action="append", required=True, metavar="ACCOUNT=AMOUNT[:CUR][@REF]")
+    command.add_argument("--credit", action="append", required=True, metavar="ACCOUNT=AMOUNT[:CUR][@REF]")
+    command.add_argument("--no-post", action="store_true", help="Only record the entry, don't post it")
+    command.add_argument("--on-duplicate", choices=["warn", "reject", "allow"], default="warn",
+                         help="What to do with an entry matching a stored one's date, accounts and amounts")
+    command.add_argument("--idempotency-key", help="Record the entry at most once for this key (for automated feeds)")
+    command = add(journal, "import", cmd_journal_import, "Record and post entries from a JSON file", formats=True)
+    command.add_argument("file", help="JSON list of {date, narration, debits, credits[, idempotency_key]}")
+    command.add_argument("--on-duplicate", choices=["warn", "reject", "allow"], default="reject",
+                         help="What to do with entries matching stored ones (default: skip them)")
+    command.add_argument("--no-post", action="store_true", help="Only record the entries, don't post them")
+    add(journal, "duplicates", cmd_journal_duplicates, "List stored entries with the same date, accounts and amounts",
+        formats=True)
+    command = add(journal, "search", cmd_journal_search, "Search journal entries", formats=True)
+    command.add_argument("query")
+    command.add_argument("--limit", type=int, default=50)
+
+    ledger = commands.add_parser("ledger", help="Read account ledgers").add_subparsers(metavar="action")
+    ledger.required = True
+    command = add(ledger, "show", cmd_ledger_show, "Show the postings of an account", formats=True)
+    command.add_argument("account")
+    command.add_argument("--from", dest="start", help="First date (YYYY-MM-DD)")
+    command.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD)")
+    command.add_argument("--offset", type=int, default=0)
+    command.add_argument("--limit", type=int)
+    command.add_argument("--reverse", action="store_true", help="Newest first")
+    command.add_argument("--archived", action="store_true", help="Show the archived postings of closed months instead (other filters are ignored)")
+
+    command = add(commands, "report", cmd_report, "Generate a report", formats=True)
+    command.add_argument("report", choices=sorted(REPORTS) + ["all"],
+                         help="Report to generate ('all' writes every report at once, with timings)")
+    command.add_argument("--as-of", help="Date for fx-revaluation and aging (YYYY-MM-DD)")
+    command.add_argument("--depth", type=int, help="Deepest group level for chart-rollup")
+    command.add_argument("--workers", type=int, default=4, help="Threads writing report files for 'all'")
+
+    command = add(commands, "watch", cmd_watch, "Keep report files up to date as entries are posted")
+    command.add_argument("--interval", type=float, default=2.0, help="Seconds between checks")
+    command.add_argument("--cycles", type=int, help="Stop after this many checks (default: run until Ctrl+C)")
+
+    command = add(commands, "whatif", cmd_whatif, "Preview reports with proposed entries, without saving them",
+                  formats=True)
+    command.add_argument("--date", help="Entry date (YYYY-MM-DD, default: today)")
+    command.add_argument("--narration")
+    command.add_argument("--debit", action="append", metavar="ACCOUNT=AMOUNT[:CUR][@REF]")
+    command.add_argument("--credit", action="append", metavar="ACCOUNT=AMOUNT[:CUR][@REF]")
+    command.add_argument("--entries", help="JSON file with a list of {date, narration, debits, credits}")
+    command.add_argument("--depth", type=int, help="Deepest group level for the chart rollup")
+
+    analytics = commands.add_parser("analytics", help="Top postings and account activity").add_subparsers(metavar="action")
+    analytics.required = True
+
+    def add_range(command):
+        command.add_argument("--from", dest="start", help="First date (YYYY-MM-DD)")
+        command.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD)")
+        command.add_argument("--hot-only", action="store_true", help="Leave out closed (archived) months")
+
+    command = add(analytics, "top", cmd_analytics_top, "Largest (or smallest) postings", formats=True)
+    command.add_argument("-n", type=int, default=10, help="Number of postings")
+    command.add_argument("--type", help="Only accounts of this type (e.g. Expense)")
+    command.add_argument("--account", help="Only this account")
+    command.add_argument("--side", choices=["Debit", "Credit"], help="Only debit or credit postings")
+    command.add_argument("--smallest", action="store_true", help="Smallest postings instead")
+    add_range(command)
+    command = add(analytics, "accounts", cmd_analytics_accounts, "Most active accounts", formats=True)
+    command.add_argument("-n", type=int, default=10, help="Number of accounts")
+    command.add_argument("--by", choices=["postings", "volume", "max", "mean"], default="postings")
+    command.add_argument("--type", help="Only accounts of this type")
+    add_range(command)
+    command = add(analytics, "stats", cmd_analytics_stats, "Posting count and sizes of one account", formats=True)
+    command.add_argument("account")
+    add_range(command)
+
+    events = commands.add_parser("events", help="Posting event stream").add_subparsers(metavar="action")
+    events.required = True
+    command = add(events, "tail", cmd_events_tail, "Print posting events as JSON lines")
+    command.add_argument("--consumer", help="Resume from (and save) this consumer's cursor")
+    command.add_argument("--from-start", action="store_true", help="Read every stored event")
+    command.add_argument("--batch-size", type=int, default=100)
+    command.add_argument("--follow", action="store_true", help="Keep waiting for new events")
+
+    fx = commands.add_parser("fx", help="Maintain exchange rates").add_subparsers(metavar="action")
+    fx.required = True
+    command = add(fx, "set", cmd_fx_set, "Set the rate of a currency from a date on")
+    command.add_argument("currency")
+    command.add_argument("date")
+    command.add_argument("rate", help="Base currency units per unit")
+
+    entity = commands.add_parser("entity", help="Manage entities").add_subparsers(metavar="action")
+    entity.required = True
+    command = add(entity, "create", cmd_entity_create, "Create an entity data root", migrate=False)
+    command.add_argument("name")
+    add(entity, "list", cmd_entity_list, "List entities", migrate=False)
+
+    command = add(commands, "export", cmd_export, "Stream the journal or ledger to a CSV or columnar file")
+    command.add_argument("store", choices=["journal", "ledger"])
+    command.add_argument("--format", choices=["csv", "columnar"], default="csv")
+    command.add_argument("--output", help="Output file (default: data/reports/<store>.csv or .slcol)")
+    command.add_argument("--from", dest="start", help="First date (YYYY-MM-DD)")
+    command.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD)")
+    command.add_argument("--account", help="Only this account's lines or postings")
+    command.add_argument("--chunk-size", type=int, default=10000, help="Rows held in memory at once")
+
+    command = add(commands, "compact", cmd_compact, "Close and archive ledger months, carrying balances forward")
+    command.add_argument("through", help="Last month to close (YYYY-MM)")
+
+    command = add(commands, "rebuild", cmd_rebuild, "Rebuild the ledger and balances from the journal")
+    command.add_argument("--streaming", action="store_true",
+                         help="Stream entries in date order, keeping memory bounded by the number of accounts")
+    command.add_argument("--run-size", type=int, default=50000, help="Entries sorted in memory at once when streaming")
+
+    command = add(commands, "verify", cmd_verify, "Verify journal and ledger integrity")
+    command.add_argument("--full", action="store_true", help="Re-verify the whole history")
+    command = add(commands, "reconcile", cmd_reconcile, "Reconcile account balances", formats=True)
+    command.add_argument("--repair", action="store_true", help="Repair drifting accounts")
+
+    command = add(commands, "startup-time", cmd_startup_time, "Measure cold start time", migrate=False)
+    command.add_argument("--runs", type=int, default=10)
+    command.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS)
+    return parser
+
+def run(argv):
+    """
+    Run one command
+
+    Args:
+        argv: Command line arguments (without the program name)
+
+    Returns:
+        Exit code
+    """
+    args = build_parser().parse_args(argv)
+    # The entity must be chosen before any module reads the data root
+    if args.entity:
+        os.environ[ENTITY_ENV_VAR] = args.entity
+    if args.migrate and not _migrate():
+        return 1
+    return args.handler(args)
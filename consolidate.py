@@ -0,0 +1,307 @@
+"""
+Consolidation Module - Entity data roots and consolidated group reporting
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from utils import (
+    load_json, save_json_atomic, format_currency, get_account_by_name, entity_data_dir,
+    ACCOUNTS_FILE, BASE_DATA_DIR, ENTITIES_DIR, ENTITY_ENV_VAR
+)
+from report import build_trial_balance, build_balance_sheet, save_report, GENERATED_PREFIX
+
+CONSOLIDATION_FILE = BASE_DATA_DIR / "consolidation.json"
+GROUP_REPORTS_DIR = BASE_DATA_DIR / "reports"
+BALANCE_SHEET_SECTIONS = ["assets", "liabilities", "equity"]
+
+_ENTITY_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+def list_entities():
+    """
+    List the entities that have their own data root
+
+    Returns:
+        Sorted list of entity names
+    """
+    if not ENTITIES_DIR.exists():
+        return []
+    return sorted(path.name for path in ENTITIES_DIR.iterdir() if path.is_dir())
+
+def create_entity(name):
+    """
+    Create an empty data root for a new entity
+
+    Args:
+        name: Entity name (letters, digits, '-' and '_')
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if not name or not _ENTITY_NAME_PATTERN.fullmatch(name):
+        return False, "Entity name may only contain letters, digits, '-' and '_'"
+    path = entity_data_dir(name)
+    if path.exists():
+        return False, f"Entity '{name}' already exists"
+    path.mkdir(parents=True)
+    return True, f"Entity '{name}' created. Run SmartLedger with {ENTITY_ENV_VAR}={name} to work in its books"
+
+def load_entity_accounts(entity):
+    """Load the accounts of an entity without switching the process to its data root"""
+    return load_json(entity_data_dir(entity) / ACCOUNTS_FILE.name, default={})
+
+def load_consolidation_rules():
+    """
+    Load the consolidation settings of the group
+
+    Returns:
+        Dictionary {"entities": [entity names] (optional, default: every entity),
+                    "eliminations": [{"name": str, "accounts": [{"entity": str, "account": str}]}]}
+        The accounts of an elimination rule hold intercompany balances that cancel out on consolidation.
+    """
+    rules = load_json(CONSOLIDATION_FILE, default={})
+    rules.setdefault("eliminations", [])
+    return rules
+
+def save_consolidation_rules(rules):
+    """Save the consolidation settings of the group"""
+    return save_json_atomic(CONSOLIDATION_FILE, rules)
+
+def add_elimination_rule(name, accounts):
+    """
+    Add an intercompany elimination rule
+
+    Args:
+        name: Rule name (e.g. "Loan Acme to Beta")
+        accounts: List of {"entity": str, "account": str} whose balances offset each other
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if not name or not name.strip():
+        return False, "Rule name cannot be empty"
+    if len(accounts) < 2:
+        return False, "An elimination rule needs at least two accounts"
+
+    entities = set(list_entities())
+    resolved = []
+    for item in accounts:
+        entity = item.get("entity")
+        if entity not in entities:
+            return False, f"Entity '{entity}' does not exist"
+        actual_name, account_data = get_account_by_name(item.get("account", ""), load_entity_accounts(entity))
+        if not account_data:
+            return False, f"Account '{item.get('account')}' not found in entity '{entity}'"
+        resolved.append({"entity": entity, "account": actual_name})
+
+    rules = load_consolidation_rules()
+    rules["eliminations"].append({"name": name.strip(), "accounts": resolved})
+    if not save_consolidation_rules(rules):
+        return False, "Failed to save consolidation rules"
+    return True, f"Elimination rule '{name.strip()}' added"
+
+def entity_statements(entity):
+    """
+    Compute the trial balance and balance sheet of one entity.
+    Runs in a worker process, so it only reads the entity's own data root.
+
+    Returns:
+        Dictionary {"entity", "trial_balance", "balance_sheet"}
+    """
+    accounts_data = load_entity_accounts(entity)
+    return {
+        "entity": entity,
+        "trial_balance": build_trial_balance(accounts_data),
+        "balance_sheet": build_balance_sheet(accounts_data)
+    }
+
+def _apply_eliminations(statements, eliminations):
+    """
+    Work out which entity accounts are eliminated and whether each rule nets to zero
+
+    Returns:
+        Tuple (set of (entity, account) pairs, list of rule results {"name", "eliminated", "difference"})
+    """
+    # Net debit balance of every account, from the entity trial balances
+    net_balances = {}
+    for statement in statements:
+        for row in statement["trial_balance"]["trial_balance"]:
+            net_balances[(statement["entity"], row["account"])] = row["debit"] - row["credit"]
+
+    eliminated = set()
+    results = []
+    for rule in eliminations:
+        pairs = [(item["entity"], item["account"]) for item in rule["accounts"]
+                 if (item["entity"], item["account"]) in net_balances]
+        eliminated.update(pairs)
+        debits = sum(net_balances[pair] for pair in pairs if net_balances[pair] > 0)
+        difference = sum(net_balances[pair] for pair in pairs)
+        results.append({"name": rule["name"], "eliminated": debits, "difference": difference})
+    return eliminated, results
+
+def merge_statements(statements, eliminations):
+    """
+    Merge entity statements into consolidated ones, removing intercompany balances.
+    Accounts with the same name in different entities are combined.
+
+    Args:
+        statements: List of entity_statements() results
+        eliminations: Elimination rules (see load_consolidation_rules)
+
+    Returns:
+        Report data dictionary
+    """
+    eliminated, rule_results = _apply_eliminations(statements, eliminations)
+
+    trial_rows = {}
+    sections = {section: {} for section in BALANCE_SHEET_SECTIONS}
+    entity_totals = []
+    for statement in statements:
+        entity = statement["entity"]
+        for row in statement["trial_balance"]["trial_balance"]:
+            if (entity, row["account"]) in eliminated:
+                continue
+            merged = trial_rows.setdefault(row["account"], {"account": row["account"], "type": row["type"], "net": 0})
+            merged["net"] += row["debit"] - row["credit"]
+
+        balance_sheet = statement["balance_sheet"]
+        for section in BALANCE_SHEET_SECTIONS:
+            for row in balance_sheet[section]:
+                if (entity, row["account"]) in eliminated:
+                    continue
+                sections[section][row["account"]] = sections[section].get(row["account"], 0) + row["amount"]
+        entity_totals.append({
+            "entity": entity,
+            "total_assets": balance_sheet["total_assets"],
+            "total_liabilities": balance_sheet["total_liabilities"],
+            "total_equity": balance_sheet["total_equity"],
+            "is_balanced": balance_sheet["is_balanced"]
+        })
+
+    trial_balance = []
+    for merged in sorted(trial_rows.values(), key=lambda x: x["account"]):
+        net = merged["net"]
+        trial_balance.append({
+            "account": merged["account"],
+            "type": merged["type"],
+            "debit": net if net > 0 else 0,
+            "credit": -net if net < 0 else 0
+        })
+    total_debits = sum(row["debit"] for row in trial_balance)
+    total_credits = sum(row["credit"] for row in trial_balance)
+
+    balance_sheet = {}
+    for section in BALANCE_SHEET_SECTIONS:
+        balance_sheet[section] = [{"account": account, "amount": amount}
+                                  for account, amount in sorted(sections[section].items())]
+        balance_sheet[f"total_{section}"] = sum(sections[section].values())
+
+    return {
+        "entities": entity_totals,
+        "eliminations": rule_results,
+        "trial_balance": trial_balance,
+        "total_debits": total_debits,
+        "total_credits": total_credits,
+        "trial_balance_balanced": total_debits == total_credits,
+        "balance_sheet": balance_sheet,
+        "balance_sheet_balanced": (balance_sheet["total_assets"] ==
+                                   balance_sheet["total_liabilities"] + balance_sheet["total_equity"])
+    }
+
+def generate_consolidated_report(entities=None, max_workers=None):
+    """
+    Generate the consolidated trial balance and balance sheet of the group.
+    Entity statements are computed in parallel in a process pool, then merged with
+    intercompany eliminations.
+
+    Args:
+        entities: Entity names to consolidate (default: configured entities, else every entity)
+        max_workers: Pool size (default: one process per entity, up to the number of CPUs)
+
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    rules = load_consolidation_rules()
+    if entities is None:
+        entities = rules.get("entities") or list_entities()
+    if not entities:
+        return False, {}, "No entities to consolidate"
+    missing = sorted(set(entities) - set(list_entities()))
+    if missing:
+        return False, {}, f"Unknown entities: {', '.join(missing)}"
+
+    if max_workers is None:
+        max_workers = min(len(entities), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        statements = list(pool.map(entity_statements, entities))
+
+    report_data = merge_statements(statements, rules["eliminations"])
+
+    # Save to file
+    GROUP_REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    report_file = GROUP_REPORTS_DIR / "consolidated.txt"
+    report_text = format_consolidated_text(report_data)
+
+    try:
+        save_report(report_file, report_text)
+    except IOError as e:
+        return False, report_data, f"Failed to save report: {e}"
+
+    unbalanced = [rule["name"] for rule in report_data["eliminations"] if rule["difference"]]
+    if unbalanced:
+        return True, report_data, (f"Consolidated {len(entities)} entities; intercompany balances do not "
+                                   f"net to zero for: {', '.join(unbalanced)}")
+    return True, report_data, f"Consolidated {len(entities)} entities successfully"
+
+def format_consolidated_text(report_data):
+    """Format consolidated report as text"""
+    lines = []
+    # Header
+    lines.append("=" * 80)
+    lines.append("CONSOLIDATED GROUP REPORT")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append("=" * 80)
+
+    lines.append("\nENTITIES")
+    lines.append(f"{'Entity':<25} {'Assets':>17} {'Liabilities':>17} {'Equity':>17}")
+    lines.append("-" * 80)
+    for entity in report_data["entities"]:
+        mark = "" if entity["is_balanced"] else "  (not balanced)"
+        lines.append(f"{entity['entity']:<25} {format_currency(entity['total_assets']):>17} "
+                     f"{format_currency(entity['total_liabilities']):>17} "
+                     f"{format_currency(entity['total_equity']):>17}{mark}")
+
+    if report_data["eliminations"]:
+        lines.append("\nINTERCOMPANY ELIMINATIONS")
+        lines.append("-" * 80)
+        for rule in report_data["eliminations"]:
+            note = "" if not rule["difference"] else f"  difference {format_currency(rule['difference'])}"
+            lines.append(f"  {rule['name']:<50} {format_currency(rule['eliminated']):>20}{note}")
+
+    lines.append("\nCONSOLIDATED TRIAL BALANCE")
+    lines.append(f"{'Account':<40} {'Type':<20} {'Debit':>15} {'Credit':>15}")
+    lines.append("-" * 80)
+    for row in report_data["trial_balance"]:
+        debit_str = format_currency(row["debit"]) if row["debit"] > 0 else ""
+        credit_str = format_currency(row["credit"]) if row["credit"] > 0 else ""
+        lines.append(f"{row['account']:<40} {row['type']:<20} {debit_str:>15} {credit_str:>15}")
+    lines.append("-" * 80)
+    lines.append(f"{'TOTAL':<40} {'':<20} {format_currency(report_data['total_debits']):>15} "
+                 f"{format_currency(report_data['total_credits']):>15}")
+
+    balance_sheet = report_data["balance_sheet"]
+    lines.append("\nCONSOLIDATED BALANCE SHEET")
+    for section in BALANCE_SHEET_SECTIONS:
+        lines.append(f"\n{section.upper()}")
+        lines.append("-" * 80)
+        for row in balance_sheet[section]:
+            lines.append(f"  {row['account']:<50} {format_currency(row['amount']):>20}")
+        lines.append(f"  {'Total ' + section.title():<50} {format_currency(balance_sheet['total_' + section]):>20}")
+    lines.append("=" * 80)
+
+    if report_data["trial_balance_balanced"] and report_data["balance_sheet_balanced"]:
+        lines.append("✓ Consolidated statements are balanced")
+    else:
+        lines.append("✗ Consolidated statements are NOT balanced")
+
+    return "\n".join(lines)
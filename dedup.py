@@ -0,0 +1,181 @@
+"""
+Duplicate Detection Module - Content-hash index of journal entries and idempotency keys.
+Each entry is fingerprinted from its date and normalized lines (account, amount, currency and
+reference). The fingerprint is appended to one of the bucket files, chosen by its leading hex
+digits. Buckets are append-only JSON lines, so indexing an entry writes one line. The number of
+leading digits grows with the journal (see index_prefix_length), which keeps every bucket near
+BUCKET_TARGET_ENTRIES lines; a check reads one bucket of about that size.
+"""
+import hashlib
+import json
+import math
+from utils import load_json, save_json_atomic, ensure_dir_real, DEDUP_DIR, JOURNAL_DIR
+from storage import iter_records
+
+INDEX_FORMAT = "jsonl-buckets"  # Recorded in schema.json by the migration that builds the index
+META_FILE = DEDUP_DIR / "meta.json"
+BUCKET_SUFFIX = ".jsonl"
+MIN_PREFIX_LENGTH = 2         # Hex digits of a hash naming its bucket (at least 256 buckets)
+BUCKET_TARGET_ENTRIES = 256   # Lines a bucket is sized for when the index is (re)built
+REHASH_GROWTH = 4             # Rebuild with one more digit once buckets average this many times the target
+
+def entry_fingerprint(record):
+    """
+    Content hash of a journal entry: its date and its debit and credit lines with account
+    names compared case-insensitively and line order ignored. The narration is left out,
+    since a retried bank-feed line often comes back with a different description.
+
+    Args:
+        record: Journal entry dictionary (JSON layout)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    lines = {}
+    for side in ("debits", "credits"):
+        lines[side] = sorted([line["account"].strip().lower(), line["amount"], line.get("currency") or "",
+                              line.get("foreign_amount") or 0, line.get("ref") or ""]
+                             for line in record.get(side, []))
+    canonical = json.dumps([record["date"], lines["debits"], lines["credits"]], separators=(",", ":"),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def key_hash(idempotency_key):
+    """Hash of an idempotency key as stored in the index"""
+    return hashlib.sha256(f"key:{idempotency_key}".encode('utf-8')).hexdigest()
+
+def index_prefix_length(count):
+    """Hex digits naming buckets for an index of count items, so buckets hold about BUCKET_TARGET_ENTRIES"""
+    if count <= BUCKET_TARGET_ENTRIES * 16 ** MIN_PREFIX_LENGTH:
+        return MIN_PREFIX_LENGTH
+    return math.ceil(math.log(count / BUCKET_TARGET_ENTRIES, 16))
+
+def load_index_meta():
+    """
+    Load the index layout
+
+    Returns:
+        Dictionary {"prefix_length": int, "items": int (fingerprints and keys indexed)}
+    """
+    meta = load_json(META_FILE, default={})
+    meta.setdefault("prefix_length", MIN_PREFIX_LENGTH)
+    meta.setdefault("items", 0)
+    return meta
+
+def _bucket_path(digest, prefix_length):
+    return DEDUP_DIR / f"{digest[:prefix_length]}{BUCKET_SUFFIX}"
+
+def _read_bucket(path):
+    """Yield the items of a bucket file: {"fingerprint" or "key": hash, "je_id": str}"""
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Partially written line
+            yield json.loads(line)
+
+def _find(field, digest):
+    """Journal Entry IDs indexed under a fingerprint or key hash, in recording order"""
+    path = _bucket_path(digest, load_index_meta()["prefix_length"])
+    return [item["je_id"] for item in _read_bucket(path) if item.get(field) == digest]
+
+def find_duplicates(record):
+    """
+    Journal entries already stored with the same content as an entry
+
+    Args:
+        record: Journal entry dictionary (JSON layout)
+
+    Returns:
+        List of Journal Entry IDs (empty if the entry is new)
+    """
+    return [je_id for je_id in _find("fingerprint", entry_fingerprint(record)) if je_id != record.get("je_id")]
+
+def find_idempotency_key(idempotency_key):
+    """
+    Journal entry recorded with an idempotency key
+
+    Returns:
+        Journal Entry ID, or None if the key was never used
+    """
+    je_ids = _find("key", key_hash(idempotency_key))
+    return je_ids[-1] if je_ids else None
+
+def _entry_items(record):
+    """Index items of a stored journal entry: its fingerprint and its idempotency key, if any"""
+    items = [{"fingerprint": entry_fingerprint(record), "je_id": record["je_id"]}]
+    if record.get("idempotency_key"):
+        items.append({"key": key_hash(record["idempotency_key"]), "je_id": record["je_id"]})
+    return items
+
+def _append_items(items, prefix_length):
+    """Append index items to their buckets"""
+    by_path = {}
+    for item in items:
+        by_path.setdefault(_bucket_path(item.get("fingerprint") or item["key"], prefix_length), []).append(item)
+    for path, path_items in by_path.items():
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(item, ensure_ascii=False) + "\n" for item in path_items))
+
+def index_entry(record):
+    """
+    Add a newly stored journal entry (and its idempotency key, if any) to the index.
+    Once the buckets have grown REHASH_GROWTH times past their target, the index is rebuilt
+    with one more prefix digit.
+
+    Args:
+        record: Journal entry dictionary (JSON layout)
+
+    Returns:
+        True if saved, False otherwise
+    """
+    ensure_dir_real()
+    meta = load_index_meta()
+    items = _entry_items(record)
+    try:
+        _append_items(items, meta["prefix_length"])
+    except IOError as e:
+        print(f"Error saving duplicate index: {e}")
+        return False
+    meta["items"] += len(items)
+    if meta["items"] > BUCKET_TARGET_ENTRIES * REHASH_GROWTH * 16 ** meta["prefix_length"]:
+        return rebuild_duplicate_index()[0]
+    return save_json_atomic(META_FILE, meta)
+
+def rebuild_duplicate_index():
+    """
+    Rebuild the whole index from the journal shards, sizing its buckets for the journal
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    ensure_dir_real()
+    items = [item for record in iter_records(JOURNAL_DIR) for item in _entry_items(record)]
+    prefix_length = index_prefix_length(len(items))
+    for path in list(DEDUP_DIR.glob(f"*{BUCKET_SUFFIX}")) + list(DEDUP_DIR.glob("??.json")):
+        path.unlink()
+    try:
+        _append_items(items, prefix_length)
+    except IOError as e:
+        return False, f"Failed to save duplicate index: {e}"
+    if not save_json_atomic(META_FILE, {"prefix_length": prefix_length, "items": len(items)}):
+        return False, "Failed to save duplicate index"
+    entries = sum(1 for item in items if "fingerprint" in item)
+    return True, f"Fingerprinted {entries} journal entries into {16 ** prefix_length} buckets"
+
+def list_duplicates():
+    """
+    Groups of stored journal entries with the same content
+
+    Returns:
+        List of lists of Journal Entry IDs, each in recording order
+    """
+    groups = []
+    for path in sorted(DEDUP_DIR.glob(f"*{BUCKET_SUFFIX}")):
+        by_fingerprint = {}
+        for item in _read_bucket(path):
+            if "fingerprint" in item:
+                by_fingerprint.setdefault(item["fingerprint"], []).append(item["je_id"])
+        groups.extend(je_ids for je_ids in by_fingerprint.values() if len(je_ids) > 1)
+    return sorted(groups)
@@ -0,0 +1,317 @@
+"""
+Event Stream Module - Posting events for downstream systems (dashboards, caches, BI loaders).
+
+Recording and posting an entry publish events: "entry_created", "entry_posted", one
+"balance_changed" per account it moved, and "ledger_rebuilt" after a rebuild. Each event is first
+appended to a durable, hash-chained log of month shards under data/events/, which hands it a
+sequence number ("seq"), and then offered to the asyncio subscribers of this process.
+
+A subscriber gets events in batches from a bounded queue. The publisher never waits: when a
+queue is full, the subscriber stops taking live events and catches up from the log instead, so
+a slow consumer loses nothing and holds up no posting. Consumers in other processes read the log
+the same way. A named consumer commits its position to a cursor file, and resumes from it after
+a restart without rescanning the journal.
+"""
+import asyncio
+import threading
+from datetime import datetime
+from utils import load_json, save_json_atomic, ensure_dir_real, EVENTS_DIR
+from storage import append_records, load_manifest, read_shard, shard_key
+
+EVENT_TYPES = ["entry_created", "entry_posted", "balance_changed", "ledger_rebuilt"]
+CURSORS_DIR = EVENTS_DIR / "cursors"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_PENDING = 1000  # Live events queued per subscriber before it falls back to the log
+DEFAULT_LINGER = 0.05       # Seconds a batch waits for more events once it has one
+DEFAULT_POLL_INTERVAL = 1.0  # Seconds between checks of the log for events from other processes
+
+def summarize_event_record(summary, record):
+    """Fold one stored event into its shard summary: the first and last seq in the shard"""
+    summary.setdefault("first_seq", record["seq"])
+    summary["last_seq"] = record["seq"]
+
+def make_event(event_type, **fields):
+    """
+    Build an event of one of EVENT_TYPES, stamped with the time it is published
+
+    Returns:
+        Event dictionary {"type", "time", "date", ...fields}
+    """
+    now = datetime.now()
+    return dict(fields, type=event_type, time=now.isoformat(timespec="seconds"), date=now.strftime("%Y-%m-%d"))
+
+def last_event_seq():
+    """Sequence number of the latest stored event (0 if none)"""
+    return load_manifest(EVENTS_DIR).get("seq", 0)
+
+def read_events(after_seq=0, limit=None):
+    """
+    Read stored events in publishing order, skipping whole shards that end at or before a position
+
+    Args:
+        after_seq: Only events with a greater seq
+        limit: Maximum number of events (default: all)
+
+    Returns:
+        List of event dictionaries
+    """
+    events = []
+    for key, stats in sorted(load_manifest(EVENTS_DIR)["shards"].items()):
+        if stats.get("summary", {}).get("last_seq", 0) <= after_seq:
+            continue
+        for record in read_shard(EVENTS_DIR, key):
+            if record["seq"] <= after_seq:
+                continue
+            events.append(record)
+            if limit is not None and len(events) >= limit:
+                return events
+    return events
+
+def load_cursor(name):
+    """
+    Position a named consumer has committed
+
+    Returns:
+        Last processed seq, or None if the consumer never committed one
+    """
+    return load_json(CURSORS_DIR / f"{name}.json", default={}).get("seq")
+
+def save_cursor(name, seq):
+    """Commit a named consumer's position (the seq of the last event it processed)"""
+    ensure_dir_real()
+    CURSORS_DIR.mkdir(exist_ok=True)
+    return save_json_atomic(CURSORS_DIR / f"{name}.json",
+                            {"seq": seq, "updated": datetime.now().isoformat(timespec="seconds")})
+
+class Subscription:
+    """
+    One asyncio consumer of the event stream. Create it with subscribe() from a running event loop,
+    then take batches with next_batch() or iterate over it.
+    """
+
+    def __init__(self, loop, name, after_seq, batch_size, max_pending, linger, poll_interval):
+        self.name = name
+        self.batch_size = batch_size
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.position = after_seq  # seq of the last event handed out
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._lagging = True  # Start from the log, which holds everything up to now
+        self.closed = False
+
+    def _offer(self, events):
+        """Queue published events (called in the loop's thread)"""
+        if self._lagging or self.closed:
+            return
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Back-pressure: stop taking live events; they are read back from the log
+                self._lagging = True
+                return
+
+    async def _catch_up(self):
+        """Read the next batch from the log, dropping queued events (the log has them too)"""
+        self._lagging = False
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        batch = await self._loop.run_in_executor(None, read_events, self.position, self.batch_size)
+        if len(batch) == self.batch_size:
+            self._lagging = True  # More may be waiting in the log
+        return batch
+
+    def _take(self, event, batch):
+        if event["seq"] > self.position:
+            batch.append(event)
+            self.position = event["seq"]
+
+    async def next_batch(self, timeout=None):
+        """
+        Wait for the next batch of events
+
+        Args:
+            timeout: Seconds to wait for a first event (default: until one arrives)
+
+        Returns:
+            List of up to batch_size events in seq order (empty on timeout)
+        """
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while not self.closed:
+            if self._lagging:
+                batch = await self._catch_up()
+                if batch:
+                    self.position = batch[-1]["seq"]
+                    return batch
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - self._loop.time())
+                if wait <= 0:
+                    return []
+            try:
+                event = await asyncio.wait_for(self._queue.get(), wait)
+            except asyncio.TimeoutError:
+                # Nothing published here; other processes may have written to the log
+                if await self._loop.run_in_executor(None, last_event_seq) > self.position:
+                    self._lagging = True
+                continue
+            batch = []
+            self._take(event, batch)
+            linger_until = self._loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = linger_until - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        event = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                self._take(event, batch)
+            if batch:
+                return batch
+        return []
+
+    def commit(self, seq=None):
+        """
+        Save the consumer's cursor (named subscriptions only)
+
+        Args:
+            seq: Position to save (default: the last event handed out)
+
+        Returns:
+            True if saved, False otherwise
+        """
+        if not self.name:
+            return False
+        return save_cursor(self.name, self.position if seq is None else seq)
+
+    def close(self):
+        """Stop receiving events"""
+        self.closed = True
+        BUS.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        batch = await self.next_batch()
+        if not batch:
+            raise StopAsyncIteration
+        return batch
+
+class EventBus:
+    """In-process fan-out of published events to asyncio subscriptions"""
+
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, name=None, after_seq=None, batch_size=DEFAULT_BATCH_SIZE, max_pending=DEFAULT_MAX_PENDING,
+                  linger=DEFAULT_LINGER, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Subscribe to the event stream (call from a running event loop)
+
+        Args:
+            name: Consumer name, for a durable cursor (default: an anonymous consumer)
+            after_seq: Start after this seq (default: the consumer's cursor, or only new events)
+            batch_size: Most events per batch
+            max_pending: Live events queued before the subscription falls back to the log
+            linger: Seconds a batch waits for more events once it has one
+            poll_interval: Seconds between checks of the log for events from other processes
+
+        Returns:
+            Subscription
+        """
+        if after_seq is None:
+            after_seq = load_cursor(name) if name else None
+        if after_seq is None:
+            after_seq = last_event_seq()
+        subscription = Subscription(asyncio.get_running_loop(), name, after_seq, batch_size, max_pending,
+                                    linger, poll_interval)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, events):
+        """Offer stored events to every subscription, from any thread, without waiting"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._offer, events)
+            except RuntimeError:
+                # Its event loop is closed
+                self.unsubscribe(subscription)
+
+BUS = EventBus()
+
+def subscribe(**options):
+    """Subscribe to the process-wide event bus (see EventBus.subscribe)"""
+    return BUS.subscribe(**options)
+
+def publish_events(events):
+    """
+    Store events in the log, then offer them to this process's subscribers
+
+    Args:
+        events: Event dictionaries from make_event
+
+    Returns:
+        True if stored, False otherwise
+    """
+    if not events:
+        return True
+    if not append_records(EVENTS_DIR, shard_key(events[0]["date"]), events, summarize=summarize_event_record):
+        return False
+    BUS.publish(events)
+    return True
+
+def tail_events(handler, name=None, after_seq=None, batch_size=DEFAULT_BATCH_SIZE, follow=False):
+    """
+    Run one consumer in its own event loop: hand each batch to handler(batch), then commit
+    the consumer's cursor (so a batch the handler fails on is read again next time)
+
+    Args:
+        handler: Function taking a list of events
+        name: Consumer name for the durable cursor
+        after_seq: Start after this seq (default: the cursor, or only new events)
+        batch_size: Most events per batch
+        follow: Keep waiting for new events until interrupted (default: stop when caught up)
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    progress = {"events": 0, "position": None}
+
+    async def consume():
+        subscription = subscribe(name=name, after_seq=after_seq, batch_size=batch_size)
+        progress["position"] = subscription.position
+        try:
+            while True:
+                batch = await subscription.next_batch(timeout=None if follow else 0)
+                if not batch:
+                    return
+                handler(batch)
+                progress["events"] += len(batch)
+                progress["position"] = subscription.position
+                if name and not subscription.commit():
+                    raise IOError(f"Failed to save the cursor of '{name}'")
+        finally:
+            subscription.close()
+
+    try:
+        asyncio.run(consume())
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        return False, str(e)
+    return True, f"Read {progress['events']} events (position {progress['position']})"
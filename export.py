@@ -0,0 +1,244 @@
+"""
+Export Module - Stream journal entries and ledger postings to CSV or columnar binary files in fixed-size chunks
+"""
+import csv
+import json
+import struct
+import sys
+from array import array
+from utils import JOURNAL_DIR, LEDGER_DIR, REPORTS_DIR, ensure_dir_real, get_account_by_name
+from accounts import load_accounts
+from storage import load_manifest, list_shards, read_shard, read_positions, read_at_positions
+
+EXPORT_CHUNK_SIZE = 10000  # Rows held in memory at once, whatever the size of the store
+EXPORT_FORMATS = ["csv", "columnar"]
+COLUMNAR_MAGIC = b"SLCOL1\n"
+COLUMNAR_SUFFIX = ".slcol"
+
+# Column layouts; 'int' columns are signed 64-bit, 'str' columns UTF-8
+JOURNAL_COLUMNS = [
+    ("je_id", "str"), ("date", "str"), ("narration", "str"), ("side", "str"), ("account", "str"),
+    ("amount_cents", "int"), ("currency", "str"), ("foreign_amount_cents", "int"),
+]
+LEDGER_COLUMNS = [
+    ("account", "str"), ("date", "str"), ("je_id", "str"), ("entry_type", "str"),
+    ("amount_cents", "int"), ("running_balance_cents", "int"), ("currency", "str"),
+    ("foreign_amount_cents", "int"),
+]
+
+_INT_TYPECODE = "q"
+_LENGTH_TYPECODE = "I"
+_COUNT = struct.Struct("<I")
+
+def _in_range(date, start_date, end_date):
+    return not ((start_date and date < start_date) or (end_date and date > end_date))
+
+def iter_journal_rows(start_date=None, end_date=None, account=None):
+    """
+    Yield one row per journal line, reading one shard line at a time.
+    With an account, shards whose summary doesn't mention it are skipped unread.
+
+    Yields:
+        Tuples in JOURNAL_COLUMNS order
+    """
+    wanted = account.lower() if account else None
+    shards = load_manifest(JOURNAL_DIR)["shards"]
+    for key in list_shards(JOURNAL_DIR, start_date, end_date):
+        if wanted and not any(name.lower() == wanted for name in shards[key].get("summary", {})):
+            continue
+        for record in read_shard(JOURNAL_DIR, key):
+            if not _in_range(record.get("date", ""), start_date, end_date):
+                continue
+            for side, lines in (("Debit", record.get("debits", [])), ("Credit", record.get("credits", []))):
+                for line in lines:
+                    if wanted and line["account"].lower() != wanted:
+                        continue
+                    yield (record["je_id"], record["date"], record.get("narration", ""), side, line["account"],
+                           line["amount"], line.get("currency") or "", line.get("foreign_amount") or 0)
+
+def _ledger_row(record):
+    return (record["account"], record["date"], record["je_id"], record["entry_type"], record["amount"],
+            record["running_balance"], record.get("currency") or "", record.get("foreign_amount") or 0)
+
+def iter_ledger_rows(start_date=None, end_date=None, account=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one row per ledger posting. With an account, only its postings are read, through the
+    position index, one chunk of offsets at a time.
+
+    Args:
+        account: Exact account name as stored in the ledger
+
+    Yields:
+        Tuples in LEDGER_COLUMNS order
+    """
+    if not account:
+        for key in list_shards(LEDGER_DIR, start_date, end_date):
+            for record in read_shard(LEDGER_DIR, key):
+                if _in_range(record.get("date", ""), start_date, end_date):
+                    yield _ledger_row(record)
+        return
+
+    for key, stats in sorted(load_manifest(LEDGER_DIR)["shards"].items()):
+        count = stats.get("values", {}).get(account, {}).get("count", 0)
+        if not count or not (_in_range(stats["first_date"], None, end_date)
+                             and _in_range(stats["last_date"], start_date, None)):
+            continue
+        for start in range(0, count, chunk_size):
+            offsets = read_positions(LEDGER_DIR, key, account, start, start + chunk_size)
+            for record in read_at_positions(LEDGER_DIR, key, offsets):
+                if _in_range(record.get("date", ""), start_date, end_date):
+                    yield _ledger_row(record)
+
+def iter_chunks(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Group a row stream into lists of at most chunk_size rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def write_csv(path, columns, chunks):
+    """
+    Write row chunks to a CSV file with a header row
+
+    Returns:
+        Number of rows written
+    """
+    total = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for chunk in chunks:
+            writer.writerows(chunk)
+            total += len(chunk)
+    return total
+
+def _encode_chunk(columns, chunk):
+    """Encode one chunk column by column: packed int64 arrays, or string lengths followed by UTF-8 bytes"""
+    parts = [_COUNT.pack(len(chunk))]
+    for index, (_, column_type) in enumerate(columns):
+        if column_type == "int":
+            values = array(_INT_TYPECODE, (row[index] for row in chunk))
+            parts.append(values.tobytes())
+        else:
+            encoded = [row[index].encode('utf-8') for row in chunk]
+            parts.append(array(_LENGTH_TYPECODE, map(len, encoded)).tobytes())
+            parts.append(b"".join(encoded))
+    return b"".join(parts)
+
+def write_columnar(path, columns, chunks, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write row chunks to a columnar binary file.
+    Layout: magic line, 4-byte schema length and JSON schema header, then per chunk a 4-byte row
+    count followed by each column's values (int columns as packed int64, str columns as packed
+    uint32 byte lengths followed by the concatenated UTF-8 bytes). Arrays use the byte order
+    named in the schema.
+
+    Returns:
+        Number of rows written
+    """
+    schema = {
+        "columns": [{"name": name, "type": column_type} for name, column_type in columns],
+        "chunk_size": chunk_size,
+        "byteorder": sys.byteorder,
+        "int_typecode": _INT_TYPECODE,
+        "length_typecode": _LENGTH_TYPECODE
+    }
+    header = json.dumps(schema).encode('utf-8')
+    total = 0
+    with open(path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        f.write(_COUNT.pack(len(header)))
+        f.write(header)
+        for chunk in chunks:
+            f.write(_encode_chunk(columns, chunk))
+            total += len(chunk)
+    return total
+
+def read_columnar(path):
+    """
+    Read a columnar export back, one chunk at a time
+
+    Yields:
+        Tuple (schema, {column name: list of values}) per chunk
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a SmartLedger columnar export")
+        (header_length,) = _COUNT.unpack(f.read(_COUNT.size))
+        schema = json.loads(f.read(header_length))
+        swap = schema["byteorder"] != sys.byteorder
+        while True:
+            count_bytes = f.read(_COUNT.size)
+            if not count_bytes:
+                return
+            (rows,) = _COUNT.unpack(count_bytes)
+            chunk = {}
+            for column in schema["columns"]:
+                if column["type"] == "int":
+                    values = array(schema["int_typecode"])
+                    values.frombytes(f.read(rows * values.itemsize))
+                    if swap:
+                        values.byteswap()
+                    chunk[column["name"]] = values.tolist()
+                else:
+                    lengths = array(schema["length_typecode"])
+                    lengths.frombytes(f.read(rows * lengths.itemsize))
+                    if swap:
+                        lengths.byteswap()
+                    data = f.read(sum(lengths))
+                    strings, position = [], 0
+                    for length in lengths:
+                        strings.append(data[position:position + length].decode('utf-8'))
+                        position += length
+                    chunk[column["name"]] = strings
+            yield schema, chunk
+
+def export_data(store, output_format="csv", path=None, start_date=None, end_date=None, account=None,
+                chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Export the journal or the ledger, streaming it in fixed-size chunks
+
+    Args:
+        store: 'journal' (one row per line) or 'ledger' (one row per posting)
+        output_format: 'csv' or 'columnar'
+        path: Output file (default: data/reports/<store>.csv or .slcol)
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+        account: Optional account name to export only its lines/postings
+        chunk_size: Rows per chunk
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if store not in ("journal", "ledger"):
+        return False, "Store must be 'journal' or 'ledger'"
+    if output_format not in EXPORT_FORMATS:
+        return False, f"Format must be one of: {', '.join(EXPORT_FORMATS)}"
+    if chunk_size <= 0:
+        return False, "Chunk size must be positive"
+    if account:
+        actual_name, account_data = get_account_by_name(account, load_accounts())
+        if not account_data:
+            return False, f"Account '{account}' not found"
+        account = actual_name
+
+    if store == "journal":
+        columns, rows = JOURNAL_COLUMNS, iter_journal_rows(start_date, end_date, account)
+    else:
+        columns, rows = LEDGER_COLUMNS, iter_ledger_rows(start_date, end_date, account, chunk_size)
+
+    ensure_dir_real()
+    if path is None:
+        path = REPORTS_DIR / f"{store}{'.csv' if output_format == 'csv' else COLUMNAR_SUFFIX}"
+    try:
+        if output_format == "csv":
+            total = write_csv(path, columns, iter_chunks(rows, chunk_size))
+        else:
+            total = write_columnar(path, columns, iter_chunks(rows, chunk_size), chunk_size)
+    except IOError as e:
+        return False, f"Failed to write {path}: {e}"
+    return True, f"Exported {total} {store} rows to {path}"
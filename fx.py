@@ -0,0 +1,176 @@
+"""
+Foreign Exchange Module - FX rate table, cached as-of rate lookups and batch conversion to the base currency
+"""
+import re
+from bisect import bisect_right
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP, ROUND_FLOOR
+from functools import lru_cache
+from utils import load_json, save_json_atomic, FX_RATES_FILE, BASE_CURRENCY
+from accounts import DEBIT_NORMAL_TYPES
+
+RATE_CACHE_SIZE = 4096  # (currency, date) lookups kept in memory
+
+_CURRENCY_PATTERN = re.compile(r"[A-Z]{3}")
+
+_rate_table = None        # {currency: ([dates ascending], [Decimal rates])}
+_rate_table_mtime = None  # modification time of the rate file the table was built from
+
+def load_fx_rates():
+    """
+    Load the FX rate table
+
+    Returns:
+        Dictionary {currency: {date (YYYY-MM-DD): rate}}, where a rate is the number of
+        base currency units one unit of the currency was worth from that date on (decimal string)
+    """
+    return load_json(FX_RATES_FILE, default={})
+
+def _rates():
+    """Sorted in-memory rate table, rebuilt only when the rate file changes"""
+    global _rate_table, _rate_table_mtime
+    mtime = FX_RATES_FILE.stat().st_mtime if FX_RATES_FILE.exists() else None
+    if _rate_table is None or mtime != _rate_table_mtime:
+        _rate_table = {}
+        for currency, by_date in load_fx_rates().items():
+            dates = sorted(by_date)
+            _rate_table[currency] = (dates, [Decimal(by_date[date]) for date in dates])
+        _rate_table_mtime = mtime
+        _cached_rate.cache_clear()
+    return _rate_table
+
+def set_fx_rate(currency, date, rate):
+    """
+    Record the rate of a currency from a date on
+
+    Args:
+        currency: ISO currency code (e.g. EUR)
+        date: Date the rate applies from (YYYY-MM-DD)
+        rate: Base currency units per unit of the currency
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    currency = (currency or "").strip().upper()
+    if not _CURRENCY_PATTERN.fullmatch(currency):
+        return False, "Currency must be a 3-letter code (e.g. EUR)"
+    if currency == BASE_CURRENCY:
+        return False, f"{BASE_CURRENCY} is the base currency"
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        return False, "Invalid date format. Use YYYY-MM-DD"
+    try:
+        value = Decimal(str(rate))
+    except InvalidOperation:
+        return False, f"Invalid rate: {rate}"
+    if not value.is_finite() or value <= 0:
+        return False, "Rate must be positive"
+
+    rates = load_fx_rates()
+    rates.setdefault(currency, {})[date] = str(value)
+    if not save_json_atomic(FX_RATES_FILE, rates):
+        return False, "Failed to save FX rates"
+    _rates()
+    return True, f"{currency} rate from {date}: {value} {BASE_CURRENCY}"
+
+@lru_cache(maxsize=RATE_CACHE_SIZE)
+def _cached_rate(currency, date):
+    """Latest rate of a currency on or before a date, from the in-memory table"""
+    table = _rate_table.get(currency)
+    if not table:
+        return None
+    dates, values = table
+    position = bisect_right(dates, date)
+    return values[position - 1] if position else None
+
+def rate_as_of(currency, date):
+    """
+    Get the rate of a currency in effect on a date
+
+    Args:
+        currency: Currency code
+        date: Date (YYYY-MM-DD)
+
+    Returns:
+        Decimal base units per unit, or None if the table has no rate on or before the date
+    """
+    if not currency or currency == BASE_CURRENCY:
+        return Decimal(1)
+    _rates()
+    return _cached_rate(currency, date)
+
+def convert_cents(foreign_cents, rate):
+    """Convert cents of a currency to base currency cents at a rate (half-up rounding)"""
+    return int((Decimal(foreign_cents) * rate).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def allocate_cents(values):
+    """
+    Round exact base currency amounts to whole cents so that together they round like their
+    total (half-up): each is rounded down, and the cents left over go to the amounts with the
+    largest remainders (the earliest first among equal remainders)
+
+    Args:
+        values: List of Decimal amounts in cents
+
+    Returns:
+        List of integer cents, in the same order
+    """
+    target = int(sum(values, Decimal(0)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    cents = [int(value.quantize(Decimal("1"), rounding=ROUND_FLOOR)) for value in values]
+    by_remainder = sorted(range(len(values)), key=lambda i: (-(values[i] - cents[i]), i))
+    for i in by_remainder[:target - sum(cents)]:
+        cents[i] += 1
+    return cents
+
+def revalue_postings(postings, accounts_data, as_of):
+    """
+    Revalue foreign currency balances of Asset and Liability accounts at the rates of one date.
+    The postings are folded into per-account, per-currency totals in one pass, then each
+    currency's closing rate is looked up once.
+
+    Args:
+        postings: Iterable of Postings (those without a currency are skipped)
+        accounts_data: Dictionary of accounts
+        as_of: Revaluation date (YYYY-MM-DD)
+
+    Returns:
+        Tuple (list of {"account", "currency", "foreign_balance", "carrying", "rate", "revalued",
+                        "gain_loss"} rows, set of currencies without a rate)
+    """
+    monetary = {name: data.get("type") for name, data in accounts_data.items()
+                if data.get("type") in ("Asset", "Liability")}
+    totals = {}
+    for posting in postings:
+        account_type = monetary.get(posting.account)
+        if not posting.currency or account_type is None:
+            continue
+        if posting.entry_type in ("Debit", "Credit"):
+            sign = 1 if (posting.entry_type == "Debit") == (account_type in DEBIT_NORMAL_TYPES) else -1
+        else:
+            sign = 1  # Opening and carried-forward postings are signed in the account's normal direction
+        balances = totals.setdefault((posting.account, posting.currency), [0, 0])
+        balances[0] += sign * posting.foreign_amount
+        balances[1] += sign * posting.amount
+
+    rows = []
+    missing = set()
+    rates = {currency: rate_as_of(currency, as_of) for _, currency in totals}
+    for (account, currency), (foreign_balance, carrying) in sorted(totals.items()):
+        rate = rates[currency]
+        if rate is None:
+            missing.add(currency)
+            continue
+        revalued = convert_cents(foreign_balance, rate)
+        difference = revalued - carrying
+        rows.append({
+            "account": account,
+            "currency": currency,
+            "foreign_balance": foreign_balance,
+            "carrying": carrying,
+            "rate": str(rate),
+            "revalued": revalued,
+            # A larger asset is a gain, a larger liability is a loss
+            "gain_loss": difference if monetary[account] in DEBIT_NORMAL_TYPES else -difference
+        })
+    return rows, missing
@@ -0,0 +1,160 @@
+"""
+Integrity Verification Module - Incrementally verify the hash-chained journal and ledger
+"""
+import json
+from utils import load_json, save_json_atomic, JOURNAL_DIR, LEDGER_DIR, CHECKPOINT_FILE
+from storage import load_manifest, shard_path, chain_seed, record_hash, rolling_digest
+from ledger import LEDGER_INDEX_FIELD
+from archive import verify_archive
+
+# (name, directory, indexed field, record id field) for each hash-chained store
+CHAINED_STORES = [
+    ("journal", JOURNAL_DIR, None, "je_id"),
+    ("ledger", LEDGER_DIR, LEDGER_INDEX_FIELD, "je_id"),
+]
+
+def load_checkpoint():
+    """Load the last verified position of every shard"""
+    return load_json(CHECKPOINT_FILE, default={})
+
+def save_checkpoint(checkpoint):
+    """Save the last verified position of every shard"""
+    return save_json_atomic(CHECKPOINT_FILE, checkpoint)
+
+def _read_line_at(path, offset):
+    """Read the raw line starting at a byte offset"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.readline()
+
+def verify_shard(directory, key, stats, checkpoint, index_field=None, id_field="je_id"):
+    """
+    Verify one shard from its checkpoint to the end
+
+    Args:
+        directory: Shard directory
+        key: Month key (YYYY-MM)
+        stats: Manifest entry of the shard
+        checkpoint: Last verified position {"offset", "count", "hash", "last_offset", "digests", "generation"} or None
+        index_field: Field whose per-value rolling digests are checked (e.g. 'account')
+        id_field: Field used to name the record in problem reports
+
+    Returns:
+        Tuple (problem: str or None, new_checkpoint: dict, verified_count: int)
+    """
+    path = shard_path(directory, key)
+    if not path.exists():
+        return f"shard {key} is missing", checkpoint, 0
+
+    # A shard rewritten by SmartLedger itself (repair, rebuild) is verified again from the start
+    if checkpoint and checkpoint.get("generation", 0) != stats.get("generation", 0):
+        checkpoint = None
+
+    if checkpoint:
+        offset = checkpoint["offset"]
+        count = checkpoint["count"]
+        head = checkpoint["hash"]
+        last_offset = checkpoint.get("last_offset")
+        digests = dict(checkpoint.get("digests", {}))
+        if path.stat().st_size < offset:
+            return f"shard {key} was truncated below the verified position (record {count})", checkpoint, 0
+        # A history rewrite that re-chains later records must change the last verified hash
+        if last_offset is not None:
+            try:
+                anchor = json.loads(_read_line_at(path, last_offset))
+            except json.JSONDecodeError:
+                anchor = {}
+            if anchor.get("hash") != head:
+                return (f"shard {key} history before record {count + 1} was rewritten "
+                        f"(last verified hash no longer matches)"), checkpoint, 0
+    else:
+        offset, count, head, last_offset, digests = 0, 0, chain_seed(key), None, {}
+
+    verified = 0
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            line_number = count + 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return f"shard {key} record {line_number} is unreadable", checkpoint, verified
+            stored_hash = record.get("hash")
+            expected_hash = record_hash(head, record)
+            if stored_hash != expected_hash:
+                return (f"shard {key} record {line_number} ({record.get(id_field, '?')}) "
+                        f"does not match its hash chain - corrupted or tampered"), checkpoint, verified
+            if index_field:
+                value = record.get(index_field)
+                digests[value] = rolling_digest(digests.get(value, ""), stored_hash)
+            head = stored_hash
+            last_offset = offset
+            offset += len(line)
+            count += 1
+            verified += 1
+
+    if count != stats.get("count", 0) or head != stats.get("head", chain_seed(key)):
+        return (f"shard {key} ends at record {count} but the manifest expects "
+                f"{stats.get('count', 0)} - records were removed or added outside SmartLedger"), checkpoint, verified
+    if index_field:
+        for value, value_stats in stats.get("values", {}).items():
+            if digests.get(value, "") != value_stats.get("digest", ""):
+                return f"shard {key} rolling digest for '{value}' does not match", checkpoint, verified
+
+    new_checkpoint = {
+        "offset": offset,
+        "count": count,
+        "hash": head,
+        "last_offset": last_offset,
+        "digests": digests,
+        "generation": stats.get("generation", 0)
+    }
+    return None, new_checkpoint, verified
+
+def verify_integrity(full=False):
+    """
+    Verify the journal and ledger hash chains, starting from the last verified checkpoint.
+    Only records written since the checkpoint are re-hashed; the first bad record is reported.
+
+    Args:
+        full: Ignore checkpoints and re-verify the whole history
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    checkpoint = {} if full else load_checkpoint()
+    problems = []
+    verified_counts = {}
+
+    for name, directory, index_field, id_field in CHAINED_STORES:
+        manifest = load_manifest(directory)
+        store = checkpoint.setdefault(name, {})
+        # A whole-store rewrite (e.g. rebuild_ledger) starts a new generation of shards
+        if store.get("generation", 0) != manifest.get("generation", 0):
+            store.clear()
+        store["generation"] = manifest.get("generation", 0)
+        store_checkpoint = store.setdefault("shards", {})
+        verified_counts[name] = 0
+        for key, stats in sorted(manifest["shards"].items()):
+            problem, new_checkpoint, verified = verify_shard(
+                directory, key, stats, store_checkpoint.get(key), index_field, id_field
+            )
+            verified_counts[name] += verified
+            if problem:
+                problems.append(f"{name} {problem}")
+                continue
+            store_checkpoint[key] = new_checkpoint
+        # Shards that disappeared from the manifest are reported, not silently forgotten
+        for key in sorted(set(store_checkpoint) - set(manifest["shards"])):
+            problems.append(f"{name} shard {key} was verified before but is no longer in the manifest")
+
+    # Archived months are checked whole against the digests recorded when they were written
+    problems.extend(f"ledger {problem}" for problem in verify_archive())
+
+    save_checkpoint(checkpoint)
+
+    summary = (f"Checked {verified_counts['journal']} new journal entries and "
+               f"{verified_counts['ledger']} new ledger postings")
+    if problems:
+        return False, f"{summary}. Integrity problems found:\n  " + "\n  ".join(problems)
+    return True, f"{summary}. No integrity problems found"
@@ -2,18 +2,64 @@
 Journal Entry Recording Module - Record debit-credit transactions
 """
 from datetime import datetime
+from decimal import Decimal
 from utils import (
-    load_json, save_json, JOURNAL_FILE,
-    validate_amount, validate_balanced_entry, account_exists
+    JOURNAL_DIR, BASE_CURRENCY,
+    validate_amount, validate_balanced_entry, account_exists,
+    to_cents, format_currency
 )
 from accounts import load_accounts
+from fx import rate_as_of, allocate_cents
+from records import JournalEntry, JournalLine
+from storage import iter_records, append_records, write_shards, shard_key, read_shard
+from search import index_journal_record, rebuild_search_index
+from dedup import find_duplicates, find_idempotency_key, index_entry, rebuild_duplicate_index
+from versions import commit_version, holds_writer_lock
 
-def load_journal_entries():
-     """Load journal data from storage"""
-     return load_json(JOURNAL_FILE,default={})
+# What create_journal_entry does with an entry whose date, lines and amounts match a stored one
+DUPLICATE_WARN = "warn"      # Record it and say so
+DUPLICATE_REJECT = "reject"  # Refuse it
+DUPLICATE_ALLOW = "allow"    # Record it without checking
+DUPLICATE_POLICIES = [DUPLICATE_WARN, DUPLICATE_REJECT, DUPLICATE_ALLOW]
+
+def summarize_journal_record(summary, record):
+     """Fold one stored entry into its shard summary: per-account debit and credit totals"""
+     for side, field in (("debits", "debit"), ("credits", "credit")):
+          for line in record.get(side, []):
+               totals = summary.setdefault(line["account"], {"debit": 0, "credit": 0})
+               totals[field] += line["amount"]
+
+def iter_journal_entries(start_date=None, end_date=None):
+     """Yield JournalEntry records, reading only the month shards that overlap the date range"""
+     for record in iter_records(JOURNAL_DIR, start_date, end_date):
+          yield JournalEntry.from_dict(record)
+
+def load_journal_entries(start_date=None, end_date=None):
+     """Load journal data from storage as {je_id: JournalEntry}, optionally limited to a date range"""
+     return {entry.je_id: entry for entry in iter_journal_entries(start_date, end_date)}
+@holds_writer_lock
 def save_journal_entries(entries_data):
-     """Save journal data to storage"""
-     return save_json(JOURNAL_FILE,entries_data)
+     """Replace all stored journal shards with {je_id: JournalEntry}"""
+     if not write_shards(JOURNAL_DIR,[entry.to_dict() for entry in entries_data.values()],
+                         summarize=summarize_journal_record):
+          return False
+     success, message = rebuild_search_index()
+     return success and rebuild_duplicate_index()[0] and commit_version()
+@holds_writer_lock
+def append_journal_entry(entry):
+     """Append one JournalEntry to the shard of its month and add it to the search and duplicate indexes"""
+     record = entry.to_dict()
+     if not append_records(JOURNAL_DIR,shard_key(entry.date),[record],
+                           summarize=summarize_journal_record):
+          return False
+     if not index_journal_record(record):
+          print(f"Warning: '{entry.je_id}' was saved but not indexed for search; rebuild the search index")
+     if not index_entry(record):
+          print(f"Warning: '{entry.je_id}' was saved but not indexed for duplicate detection")
+     # Snapshot readers see the entry from the next read version on
+     if not commit_version():
+          print(f"Warning: '{entry.je_id}' was saved but no read version was committed")
+     return True
 
 def generate_je_id(date=None):
     """
@@ -33,8 +79,9 @@ def generate_je_id(date=None):
     
     date_str = date.strftime("%Y%m%d")
 
-    # Load all journal entries
-    entries = load_journal_entries()
+    # Load only the journal shard for this month
+    day = date.strftime("%Y-%m-%d")
+    entries = load_journal_entries(day, day)
 
     # Start with sequence 1
     sequence = 1
@@ -49,24 +96,30 @@ def generate_je_id(date=None):
         
         # If it exists, try next sequence number
         sequence += 1
-def create_journal_entry(date, narration, debits, credits):
+def build_journal_entry(date, narration, debits, credits, je_id=None, accounts_data=None):
     """
-    Create a new journal entry with validation
+    Validate a proposed journal entry and build it, without saving anything
     
     Args:
         date: Transaction date (YYYY-MM-DD)
         narration: Description of transaction
-        debits: List of dicts with 'account' and 'amount'
-        credits: List of dicts with 'account' and 'amount'
+        debits: List of dicts with 'account', 'amount' (major units) and optional 'currency' and 'ref'
+        credits: List of dicts with 'account', 'amount' (major units) and optional 'currency' and 'ref'
+        je_id: Journal Entry ID to give the entry (default: None)
+        accounts_data: Dictionary of accounts to check the lines against (default: loaded)
     
     Returns:
-        Tuple (success: bool, je_id: str or None, message: str)
+        Tuple (success: bool, entry: JournalEntry or None, message: str)
 
     """
     try:
         datetime.strptime(date,"%Y-%m-%d")
     except ValueError:
         return False, None, "Invalid date format. Use YYYY-MM-DD"
+    from archive import closed_through
+    cutoff = closed_through()
+    if cutoff and date <= cutoff:
+        return False, None, f"The ledger is closed through {cutoff}; entries must be dated after it"
 
     if not narration or not narration.strip():
         return False, None ,"Narration can not be Empty"
@@ -81,8 +134,10 @@ def create_journal_entry(date, narration, debits, credits):
     for entry in credits:
         if not validate_amount(entry.get('amount')):
             return False, None, f"Invalid credit amount: {entry.get('amount')}"
+
     # Validate accounts exist
-    accounts_data = load_accounts()
+    if accounts_data is None:
+        accounts_data = load_accounts()
     
     for entry in debits:
         account_name = entry.get('account')
@@ -93,28 +148,136 @@ def create_journal_entry(date, narration, debits, credits):
         account_name = entry.get('account')
         if not account_exists(account_name, accounts_data):
             return False, None, f"Credit account '{account_name}' does not exist"
-    
+
+    # Store amounts as integer cents from here on, converting foreign currency lines at the entry date's rate
+    lines = {}
+    currency_totals = {}  # currency -> [debit cents, credit cents] in that currency
+    for side, entries in (("debits", debits), ("credits", credits)):
+        lines[side] = []
+        exact = []
+        for entry in entries:
+            cents = to_cents(entry.get('amount'))
+            ref = (entry.get('ref') or "").strip() or None
+            currency = (entry.get('currency') or BASE_CURRENCY).strip().upper()
+            currency_totals.setdefault(currency, [0, 0])[side == "credits"] += cents
+            rate = rate_as_of(currency, date)
+            if rate is None:
+                return False, None, f"No {currency} exchange rate on or before {date}"
+            exact.append(Decimal(cents) * rate)
+            if currency == BASE_CURRENCY:
+                lines[side].append(JournalLine(entry.get('account'), cents, ref=ref))
+            else:
+                lines[side].append(JournalLine(entry.get('account'), 0, currency, cents, ref))
+        # Rounding each line on its own could unbalance an entry that balances in its own currency,
+        # so each side is rounded as a whole and its leftover cents go to the largest remainders
+        for line, base_cents in zip(lines[side], allocate_cents(exact)):
+            line.amount = base_cents
+    debits, credits = lines["debits"], lines["credits"]
+
+    unbalanced = {currency: totals for currency, totals in currency_totals.items() if totals[0] != totals[1]}
+    if len(currency_totals) == 1 and unbalanced:
+        # Single currency entry: report the amounts the user entered
+        currency, (total_debits, total_credits) = next(iter(unbalanced.items()))
+        return False, None, (f"Unbalanced entry: Debits ({format_currency(total_debits, currency)}) != "
+                             f"Credits ({format_currency(total_credits, currency)})")
+    # Entries that balance in every currency balance in base currency by construction;
+    # mixed currency entries must balance after conversion
     is_valid,total_debits,total_credits=validate_balanced_entry(debits,credits)
     if not is_valid:
-        return False,None,f"Unbalanced entry: Debits (${total_debits:.2f}) != Credits (${total_credits:.2f})"
-    
-    je_id=generate_je_id(date)
-
-    entry_data = {
-     "date": date,
-     "narration": narration,
-     "debits": debits,
-     "credits": credits
-      }
-        # Step 9: Load entries, add new entry, save
-    entries = load_journal_entries()
-    entries[je_id] = entry_data
-
-    if save_journal_entries(entries):
-        return True, je_id, f"Journal entry '{je_id}' created successfully"
+        return False,None,f"Unbalanced entry: Debits ({format_currency(total_debits)}) != Credits ({format_currency(total_credits)})"
+    
+    return True, JournalEntry(je_id, date, narration, debits, credits), "Journal entry is valid"
+
+@holds_writer_lock
+def create_journal_entry(date, narration, debits, credits, on_duplicate=DUPLICATE_WARN, idempotency_key=None):
+    """
+    Create a new journal entry with validation
+    
+    Args:
+        date: Transaction date (YYYY-MM-DD)
+        narration: Description of transaction
+        debits: List of dicts with 'account', 'amount' (major units) and optional 'currency' and 'ref'
+        credits: List of dicts with 'account', 'amount' (major units) and optional 'currency' and 'ref'
+        on_duplicate: One of DUPLICATE_POLICIES, for an entry with the same date, lines and amounts as a stored one
+        idempotency_key: Optional key from an automated feed; an entry is created at most once per key
+    
+    Returns:
+        Tuple (success: bool, je_id: str or None, message: str)
+        When the entry is refused as a duplicate, or its idempotency key was already used, je_id is
+        the stored entry it duplicates.
+
+    """
+    if idempotency_key:
+        existing = find_idempotency_key(idempotency_key)
+        if existing:
+            return False, existing, f"Idempotency key '{idempotency_key}' was already used for '{existing}'"
+
+    success, entry_data, message = build_journal_entry(date, narration, debits, credits)
+    if not success:
+        return False, None, message
+    entry_data.idempotency_key = idempotency_key
+
+    duplicates = [] if on_duplicate == DUPLICATE_ALLOW else find_duplicates(entry_data.to_dict())
+    if duplicates and on_duplicate == DUPLICATE_REJECT:
+        return False, duplicates[0], f"Duplicate of '{duplicates[0]}': same date, accounts and amounts"
+
+    entry_data.je_id = generate_je_id(date)
+        # Step 9: Append the entry to its month shard
+    if append_journal_entry(entry_data):
+        # Imported here: asyncio is too slow to load on every command
+        from events import make_event, publish_events
+        event = make_event("entry_created", je_id=entry_data.je_id, entry_date=entry_data.date,
+                           narration=entry_data.narration,
+                           amount=sum(line.amount for line in entry_data.debits),
+                           accounts=sorted({line.account for line in entry_data.debits + entry_data.credits}))
+        if not publish_events([event]):
+            print(f"Warning: '{entry_data.je_id}' was saved but its event was not published")
+        message = f"Journal entry '{entry_data.je_id}' created successfully"
+        if duplicates:
+            message += f" (possible duplicate of {', '.join(duplicates)})"
+        return True, entry_data.je_id, message
     else:
         return False, None, "Failed to save journal entry"
 
+def import_journal_entries(entries, on_duplicate=DUPLICATE_REJECT, post=True):
+    """
+    Record a batch of journal entries, e.g. from a bank feed, and post them to the ledger.
+    Entries whose idempotency key was already used are skipped, so a retried import is harmless.
+    
+    Args:
+        entries: List of dicts with 'date', 'narration', 'debits', 'credits' and optional 'idempotency_key'
+        on_duplicate: One of DUPLICATE_POLICIES (default: reject, i.e. skip duplicates)
+        post: Post each created entry to the ledger
+    
+    Returns:
+        Tuple (success: bool, results: dict, message: str); results holds the 'created' IDs,
+        the 'skipped' entries ({"index", "je_id", "message"}) and the 'failed' ones ({"index", "message"})
+    """
+    from ledger import post_journal_entry_to_ledger
+
+    results = {"created": [], "skipped": [], "failed": []}
+    for index, entry in enumerate(entries):
+        idempotency_key = entry.get("idempotency_key")
+        success, je_id, message = create_journal_entry(entry.get("date", ""), entry.get("narration", ""),
+                                                       entry.get("debits", []), entry.get("credits", []),
+                                                       on_duplicate, idempotency_key)
+        if not success:
+            if je_id is not None:
+                results["skipped"].append({"index": index, "je_id": je_id, "message": message})
+            else:
+                results["failed"].append({"index": index, "message": message})
+            continue
+        results["created"].append(je_id)
+        if post:
+            entry_data = get_journal_entry(je_id)
+            posted, ledger_message = post_journal_entry_to_ledger(je_id, entry_data)
+            if not posted:
+                results["failed"].append({"index": index, "message": f"{je_id}: {ledger_message}"})
+
+    message = (f"Imported {len(results['created'])} of {len(entries)} entries; skipped "
+               f"{len(results['skipped'])} duplicates, {len(results['failed'])} failed")
+    return not results["failed"], results, message
+
 def get_journal_entries(date_filter=None):
     """
     Get journal entries, optionally filtered by date
@@ -123,15 +286,33 @@ def get_journal_entries(date_filter=None):
         date_filter: Optional date filter (YYYY-MM-DD)
     
     Returns:
-        Dictionary of journal entries
+        Dictionary of {je_id: JournalEntry}
     """
-    entries = load_journal_entries()
-    
     if date_filter:
-        return {je_id: data for je_id, data in entries.items() 
-                if data.get("date") == date_filter}
+        return load_journal_entries(date_filter, date_filter)
+    
+    return load_journal_entries()
+
+def get_journal_entries_by_ids(je_ids):
+    """
+    Load several journal entries, reading each month shard at most once
     
-    return entries
+    Args:
+        je_ids: Iterable of Journal Entry IDs (JE-YYYYMMDD-XXX)
+    
+    Returns:
+        List of JournalEntry in the order of je_ids (missing IDs are skipped)
+    """
+    je_ids = list(je_ids)
+    wanted = set(je_ids)
+    # The month shard of an ID is YYYY-MM from its JE-YYYYMMDD-XXX date part
+    months = {f"{je_id[3:7]}-{je_id[7:9]}" for je_id in wanted}
+    found = {}
+    for key in sorted(months):
+        for record in read_shard(JOURNAL_DIR, key):
+            if record.get("je_id") in wanted:
+                found[record["je_id"]] = JournalEntry.from_dict(record)
+    return [found[je_id] for je_id in je_ids if je_id in found]
 
 def get_journal_entry(je_id):
     """
@@ -141,8 +322,15 @@ def get_journal_entry(je_id):
         je_id: Journal Entry ID
     
     Returns:
-        Entry data or None
+        JournalEntry or None
     """
-    entries = load_journal_entries()
-    return entries.get(je_id)
+    # IDs look like JE-YYYYMMDD-XXX, so the date tells us which shard to read
+    try:
+        day = datetime.strptime(je_id.split("-")[1], "%Y%m%d").strftime("%Y-%m-%d")
+    except (IndexError, ValueError):
+        day = None
+    for entry in iter_journal_entries(day, day):
+        if entry.je_id == je_id:
+            return entry
+    return None
     
\ No newline at end of file
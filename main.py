@@ -1,73 +1,98 @@
+"""
+SmartLedger entry point - interactive menu, or subcommands when arguments are given (see cli.py).
+Modules are imported inside the functions that use them, so startup only loads what a command needs.
+"""
+import sys
 from datetime import datetime
 
-from accounts import create_account, load_accounts
-from journal import create_journal_entry, get_journal_entries
-from ledger import get_account_ledger, post_journal_entry_to_ledger
-from report import (
-    generate_trial_balance,
-    generate_income_statement,
-    generate_balance_sheet,
-    generate_cash_flow,
-    generate_ratio_analysis
-)
-
 def main():
+    from migrate import migrate_data
+    from utils import ENTITY
+
+    success, message = migrate_data()
+    if not success:
+        print(f"Data migration failed: {message}")
+        return
     while True:
         print("\nSMARTLEDGER MAIN MENU ================================")
+        if ENTITY:
+            print(f"Entity: {ENTITY}")
         print("1. Create Account")
-        print("2. Record Journal Entry")
-        print("3. View Ledger for Account")
-        print("4. Generate Reports")
-        print("5. Exit")
-        choice = input("Enter your choice (1-5): ").strip()
+        print("2. Create Account Group")
+        print("3. Record Journal Entry")
+        print("4. View Ledger for Account")
+        print("5. Generate Reports")
+        print("6. Search Journal")
+        print("7. Data Maintenance")
+        print("8. Exit")
+        choice = input("Enter your choice (1-8): ").strip()
         if choice == "1":
             create_account_cli()
         elif choice == "2":
-            record_journal_entry_cli()
+            create_group_cli()
         elif choice == "3":
-            view_ledger_cli()
+            record_journal_entry_cli()
         elif choice == "4":
-            generate_reports_cli()
+            view_ledger_cli()
         elif choice == "5":
+            generate_reports_cli()
+        elif choice == "6":
+            search_journal_cli()
+        elif choice == "7":
+            maintenance_cli()
+        elif choice == "8":
             print("Goodbye!")
             break
         else:
-            print("Invalid choice. Please enter 1-5.")
+            print("Invalid choice. Please enter 1-8.")
 
 def create_account_cli():
+    from accounts import create_account
+
     print("\n--- Create New Account ---")
     name = input("Account name: ").strip()
     account_type = input("Account type (Asset, Liability, Revenue, Expense, Owner's Equity): ").strip()
     initial_balance = input("Initial balance (leave blank for 0): ").strip()
+    code = input("Account code (e.g. 1110, blank for none): ").strip() or None
+    open_items = False
+    if account_type in ("Asset", "Liability"):
+        open_items = input("Track open items (invoices/bills) for aging? (y/N): ").strip().lower() == "y"
+    parent = input("Parent group code (blank for the top-level group of the type): ").strip() or None
     
     if not name:
         print("Account name is required.")
         return
     
+    if not initial_balance:
+        initial_balance = "0"
     try:
-        initial_balance = float(initial_balance) if initial_balance else 0.0
+        float(initial_balance)
     except ValueError:
-        print("Invalid balance. Using 0.0")
-        initial_balance = 0.0
+        print("Invalid balance. Using 0.00")
+        initial_balance = "0"
     
-    success, message = create_account(name, account_type, initial_balance)
+    success, message = create_account(name, account_type, initial_balance, code=code, parent=parent,
+                                      open_items=open_items)
     print(message)     
 
-def record_journal_entry_cli():
-    print("\n--- Record Journal Entry ---")
-    date = input("Date (YYYY-MM-DD): ").strip()
-    narration = input("Narration: ").strip()
+def create_group_cli():
+    from chart import create_group
 
-    if not date:
-        date = datetime.now().strftime("%Y-%m-%d")
-        print(f"Using today's date: {date}")
+    print("\n--- Create Account Group ---")
+    code = input("Group code (e.g. 1100): ").strip()
+    name = input("Group name: ").strip()
+    parent = input("Parent group code (1000 Assets, 2000 Liabilities, 3000 Owner's Equity, 4000 Revenue, 5000 Expenses or a subgroup): ").strip()
+    success, message = create_group(code, name, parent)
+    print(message)
 
-    debits = []
-    credits = []
+def prompt_lines(side):
+    """Ask for the debit or credit lines of a journal entry until a blank account is entered"""
+    from utils import BASE_CURRENCY
 
-    print("\nEnter debit lines (blank account to stop):")
+    lines = []
+    print(f"\nEnter {side.lower()} lines (blank account to stop):")
     while True:
-        account = input("  Debit account: ").strip()
+        account = input(f"  {side} account: ").strip()
         if not account:
             break
         amount = input("  Amount: ").strip()
@@ -76,75 +101,259 @@ def record_journal_entry_cli():
         except ValueError:
             print("  Invalid amount, try again.")
             continue
-        debits.append({"account": account, "amount": amount})
+        currency = input(f"  Currency (blank for {BASE_CURRENCY}): ").strip().upper() or BASE_CURRENCY
+        ref = input("  Reference, e.g. invoice number (blank for none): ").strip()
+        lines.append({"account": account, "amount": amount, "currency": currency, "ref": ref})
+    return lines
 
-    print("\nEnter credit lines (blank account to stop):")
-    while True:
-        account = input("  Credit account: ").strip()
-        if not account:
-            break
-        amount = input("  Amount: ").strip()
-        try:
-            amount = float(amount)
-        except ValueError:
-            print("  Invalid amount, try again.")
-            continue
-        credits.append({"account": account, "amount": amount})
+def record_journal_entry_cli():
+    from journal import create_journal_entry, build_journal_entry, get_journal_entry, DUPLICATE_ALLOW, DUPLICATE_WARN
+    from dedup import find_duplicates
+    from ledger import post_journal_entry_to_ledger
+
+    print("\n--- Record Journal Entry ---")
+    date = input("Date (YYYY-MM-DD): ").strip()
+    narration = input("Narration: ").strip()
+
+    if not date:
+        date = datetime.now().strftime("%Y-%m-%d")
+        print(f"Using today's date: {date}")
 
-    success, je_id, message = create_journal_entry(date, narration, debits, credits)
+    debits = prompt_lines("Debit")
+    credits = prompt_lines("Credit")
+
+    success, entry, message = build_journal_entry(date, narration, debits, credits)
+    duplicates = find_duplicates(entry.to_dict()) if success else []
+    if duplicates:
+        answer = input(f"Same date, accounts and amounts as {', '.join(duplicates)}. Record anyway? (y/N): ")
+        if answer.strip().lower() != "y":
+            print("Entry not recorded.")
+            return
+    success, je_id, message = create_journal_entry(date, narration, debits, credits,
+                                                   DUPLICATE_ALLOW if duplicates else DUPLICATE_WARN)
     print(message)
 
     if success:
-        journal_entries = get_journal_entries()
-        entry = journal_entries.get(je_id)
+        entry = get_journal_entry(je_id)
         ledger_success, ledger_message = post_journal_entry_to_ledger(je_id, entry)
         print("Ledger:", ledger_message if ledger_success else f"Ledger error: {ledger_message}")
 
+LEDGER_PAGE_SIZE = 20
+
 def view_ledger_cli():
+    from accounts import load_accounts
+    from chart import rollup_path
+    from ledger import iter_account_ledger
+    from utils import format_currency, get_account_by_name
+
     print("\n--- Account Ledger ---")
     account_name = input("Account name: ").strip()
     if not account_name:
         print("Account name is required.")
         return
 
-    ledger_entries = get_account_ledger(account_name)
-    if ledger_entries is None:
+    actual_name, account_data = get_account_by_name(account_name, load_accounts())
+    if not account_data:
         print(f"Account '{account_name}' not found.")
         return
 
-    if not ledger_entries:
-        print(f"No transactions for '{account_name}'.")
-        return
+    start_date = input("From date (YYYY-MM-DD, blank for all): ").strip() or None
+    end_date = input("To date (YYYY-MM-DD, blank for all): ").strip() or None
+    reverse = input("Newest first? (y/N): ").strip().lower() == "y"
+
+    # Postings are read lazily from the position index, one page at a time
+    ledger_entries = iter_account_ledger(actual_name, start_date=start_date, end_date=end_date, reverse=reverse)
 
-    print(f"\nLedger for {account_name}:")
+    print(f"\nLedger for {actual_name}:")
+    for code, group_name, balance in rollup_path(actual_name, load_accounts()):
+        print(f"  in {code} {group_name}: {format_currency(balance)}")
     print("-" * 60)
+    shown = 0
     for entry in ledger_entries:
-        date = entry.get("date", "")
-        je_id = entry.get("je_id", "")
-        entry_type = entry.get("entry_type", "")
-        amount = entry.get("amount", 0)
-        running = entry.get("running_balance", 0)
-        print(f"{date} | {je_id} | {entry_type:<6} | Amount: {amount:.2f} | Balance: {running:.2f}")
+        foreign = f" ({format_currency(entry.foreign_amount, entry.currency)})" if entry.currency else ""
+        print(f"{entry.date} | {entry.je_id} | {entry.entry_type:<6} | Amount: {format_currency(entry.amount)}{foreign} | Balance: {format_currency(entry.running_balance)}")
+        shown += 1
+        if shown % LEDGER_PAGE_SIZE == 0:
+            if input("-- Enter for more, q to quit -- ").strip().lower() == "q":
+                return
+
+    if not shown:
+        print(f"No transactions for '{actual_name}'.")
+
+SEARCH_RESULT_LIMIT = 50
+
+def search_journal_cli():
+    from journal import get_journal_entries_by_ids
+    from search import search_journal
+    from utils import format_currency
+
+    print("\n--- Search Journal ---")
+    print("Words are ANDed; end a word with * for prefix search; use account:, amount: or narration: to pick a field")
+    query = input("Search: ").strip()
+    if not query:
+        print("Search text is required.")
+        return
+
+    je_ids = search_journal(query, limit=SEARCH_RESULT_LIMIT)
+    if not je_ids:
+        print("No matching journal entries.")
+        return
+
+    for entry in get_journal_entries_by_ids(je_ids):
+        total = sum(line.amount for line in entry.debits)
+        accounts = ", ".join(line.account for line in entry.debits + entry.credits)
+        print(f"{entry.je_id} | {entry.date} | {format_currency(total):>12} | {entry.narration} ({accounts})")
+    if len(je_ids) == SEARCH_RESULT_LIMIT:
+        print(f"Showing the first {SEARCH_RESULT_LIMIT} matches; refine the search to see more.")
+
+def maintenance_cli():
+    print("\n--- Data Maintenance ---")
+    print("1. Verify Data Integrity")
+    print("2. Reconcile Account Balances")
+    print("3. Create Entity")
+    print("4. Add Intercompany Elimination Rule")
+    print("5. Set FX Rate")
+    print("6. Export Journal or Ledger")
+    print("7. Track Open Items for an Account")
+    print("8. Close and Archive Ledger Months")
+    print("9. Rebuild Ledger from Journal")
+    print("10. Back to Main Menu")
+    maintenance_choice = input("Choose an option (1-10): ").strip()
+    if maintenance_choice == "1":
+        verify_integrity_cli()
+    elif maintenance_choice == "2":
+        reconcile_cli()
+    elif maintenance_choice == "3":
+        from consolidate import create_entity
+        name = input("Entity name: ").strip()
+        success, message = create_entity(name)
+        print(message)
+    elif maintenance_choice == "4":
+        elimination_rule_cli()
+    elif maintenance_choice == "5":
+        from fx import set_fx_rate
+        from utils import BASE_CURRENCY
+        currency = input("Currency code (e.g. EUR): ").strip()
+        date = input("Effective from (YYYY-MM-DD): ").strip()
+        rate = input(f"{BASE_CURRENCY} per unit: ").strip()
+        success, message = set_fx_rate(currency, date, rate)
+        print(message)
+    elif maintenance_choice == "6":
+        export_cli()
+    elif maintenance_choice == "7":
+        from openitems import enable_open_items
+        success, message = enable_open_items(input("Account name: ").strip())
+        print(message)
+    elif maintenance_choice == "8":
+        from archive import compact_ledger
+        through = input("Close and archive every month through (YYYY-MM): ").strip()
+        confirm = input(f"Entries dated through {through} can no longer be recorded. Continue? (y/N): ")
+        if confirm.strip().lower() == "y":
+            success, message = compact_ledger(through)
+            print(message)
+    elif maintenance_choice == "9":
+        from ledger import rebuild_ledger
+        streaming = input("Stream entries to keep memory low (for very large journals)? (y/N): ").strip().lower() == "y"
+        print("Rebuilding ledger...")
+        success, message = rebuild_ledger(streaming=streaming)
+        print(message)
+    elif maintenance_choice != "10":
+        print("Invalid choice.")
+
+def export_cli():
+    from export import export_data
+
+    print("\n--- Export Journal or Ledger ---")
+    store = input("Export journal or ledger? ").strip().lower()
+    output_format = input("Format (csv/columnar, blank for csv): ").strip().lower() or "csv"
+    start_date = input("From date (YYYY-MM-DD, blank for all): ").strip() or None
+    end_date = input("To date (YYYY-MM-DD, blank for all): ").strip() or None
+    account = input("Account (blank for all): ").strip() or None
+    success, message = export_data(store, output_format, start_date=start_date, end_date=end_date, account=account)
+    print(message)
+
+def elimination_rule_cli():
+    from consolidate import add_elimination_rule
+
+    print("\n--- Add Intercompany Elimination Rule ---")
+    name = input("Rule name: ").strip()
+    accounts = []
+    print("Enter the intercompany accounts that offset each other (blank entity to stop):")
+    while True:
+        entity = input("  Entity: ").strip()
+        if not entity:
+            break
+        account = input("  Account: ").strip()
+        accounts.append({"entity": entity, "account": account})
+    success, message = add_elimination_rule(name, accounts)
+    print(message)
+
+def reconcile_cli():
+    from reconcile import reconcile_accounts, format_reconciliation_text
+
+    print("\n--- Reconcile Account Balances ---")
+    success, data, message = reconcile_accounts()
+    print(message)
+    if not data["drifting"] and not data["rollup_drift"]:
+        return
+    print(format_reconciliation_text(data))
+    if input("Repair the drifting accounts? (y/N): ").strip().lower() == "y":
+        success, data, message = reconcile_accounts(repair=True)
+        print(message)
+
+def verify_integrity_cli():
+    from integrity import verify_integrity
+
+    print("\n--- Verify Data Integrity ---")
+    full = input("Re-verify full history instead of new entries only? (y/N): ").strip().lower() == "y"
+    success, message = verify_integrity(full=full)
+    print(message)
 
 def generate_reports_cli():
+    import report
+    from consolidate import generate_consolidated_report
+
     print("\n--- Generate Reports ---")
     print("1. Trial Balance")
     print("2. Income Statement")
     print("3. Balance Sheet")
     print("4. Cash Flow Statement")
     print("5. Ratio Analysis")
-    print("6. Back to Main Menu")
-    report_choice = input("Choose a report (1-6): ").strip()
+    print("6. Chart of Accounts Rollup")
+    print("7. Consolidated Group Report")
+    print("8. FX Revaluation")
+    print("9. Aged Receivables and Payables")
+    print("10. What-If: Preview Proposed Entries")
+    print("11. Top Postings and Account Activity")
+    print("12. All Reports (Month-End Pack)")
+    print("13. Back to Main Menu")
+    report_choice = input("Choose a report (1-13): ").strip()
 
     report_map = {
-        "1": ("Trial Balance", generate_trial_balance),
-        "2": ("Income Statement", generate_income_statement),
-        "3": ("Balance Sheet", generate_balance_sheet),
-        "4": ("Cash Flow Statement", generate_cash_flow),
-        "5": ("Ratio Analysis", generate_ratio_analysis),
+        "1": ("Trial Balance", report.generate_trial_balance),
+        "2": ("Income Statement", report.generate_income_statement),
+        "3": ("Balance Sheet", report.generate_balance_sheet),
+        "4": ("Cash Flow Statement", report.generate_cash_flow),
+        "5": ("Ratio Analysis", report.generate_ratio_analysis),
+        "6": ("Chart of Accounts Rollup", report.generate_chart_rollup),
+        "7": ("Consolidated Group Report", generate_consolidated_report),
+        "8": ("FX Revaluation", report.generate_fx_revaluation),
+        "9": ("Aging Report", report.generate_aging_report),
     }
 
-    if report_choice == "6":
+    if report_choice == "10":
+        whatif_cli()
+        return
+    if report_choice == "11":
+        analytics_cli()
+        return
+    if report_choice == "12":
+        print("\nGenerating all reports...")
+        success, data, message = report.generate_all_reports()
+        print(report.format_all_reports_text(data))
+        print(message)
+        return
+    if report_choice == "13":
         return
 
     if report_choice not in report_map:
@@ -158,31 +367,91 @@ def generate_reports_cli():
     if success and data:
         display_report_summary(report_name, data)
         
+def whatif_cli():
+    from whatif import new_overlay, apply_entry, whatif_reports, format_whatif_text
+
+    print("\n--- What-If: Preview Proposed Entries (nothing is saved) ---")
+    overlay = new_overlay()
+    while True:
+        date = input("\nDate (YYYY-MM-DD, blank for today): ").strip() or datetime.now().strftime("%Y-%m-%d")
+        narration = input("Narration: ").strip()
+        success, je_id, message = apply_entry(overlay, date, narration, prompt_lines("Debit"), prompt_lines("Credit"))
+        print(message)
+        if input("Add another proposed entry? (y/N): ").strip().lower() != "y":
+            break
+    if not overlay["entries"]:
+        return
+    success, data, message = whatif_reports(overlay)
+    print(format_whatif_text(data))
+    print(message)
+
+def analytics_cli():
+    from analytics import top_postings, top_accounts, format_top_postings_text, format_account_stats_text
+    from accounts import ACCOUNT_TYPES
+
+    print("\n--- Top Postings and Account Activity ---")
+    start_date = input("From date (YYYY-MM-DD, blank for all): ").strip() or None
+    end_date = input("To date (YYYY-MM-DD, blank for all): ").strip() or None
+    account_type = input(f"Account type ({', '.join(ACCOUNT_TYPES)}; blank for all): ").strip() or None
+    try:
+        n = int(input("How many (default 10): ").strip() or 10)
+    except ValueError:
+        print("Invalid number.")
+        return
+    print(format_top_postings_text(top_postings(n, start_date, end_date, account_type), f"LARGEST {n} POSTINGS"))
+    print()
+    print(format_account_stats_text(top_accounts(n, "postings", start_date, end_date, account_type),
+                                    f"MOST ACTIVE {n} ACCOUNTS"))
+
 def display_report_summary(report_name, data):
+    from utils import format_currency
+
     if report_name == "Trial Balance":
-        print(f"Total Debits: {data['total_debits']:.2f}")
-        print(f"Total Credits: {data['total_credits']:.2f}")
+        print(f"Total Debits: {format_currency(data['total_debits'])}")
+        print(f"Total Credits: {format_currency(data['total_credits'])}")
         print("Balanced" if data["is_balanced"] else "Not balanced")
     elif report_name == "Income Statement":
-        print(f"Revenue: {data['total_revenue']:.2f}")
-        print(f"Expenses: {data['total_expenses']:.2f}")
-        print(f"Net Income: {data['net_income']:.2f}")
+        print(f"Revenue: {format_currency(data['total_revenue'])}")
+        print(f"Expenses: {format_currency(data['total_expenses'])}")
+        print(f"Net Income: {format_currency(data['net_income'])}")
     elif report_name == "Balance Sheet":
-        print(f"Assets: {data['total_assets']:.2f}")
-        print(f"Liabilities: {data['total_liabilities']:.2f}")
-        print(f"Equity: {data['total_equity']:.2f}")
+        print(f"Assets: {format_currency(data['total_assets'])}")
+        print(f"Liabilities: {format_currency(data['total_liabilities'])}")
+        print(f"Equity: {format_currency(data['total_equity'])}")
         print("Balanced" if data["is_balanced"] else "Not balanced")
     elif report_name == "Cash Flow Statement":
-        print(f"Operating: {data['operating_cash']:.2f}")
-        print(f"Investing: {data['investing_cash']:.2f}")
-        print(f"Financing: {data['financing_cash']:.2f}")
-        print(f"Net Cash Flow: {data['net_cash_flow']:.2f}")
+        print(f"Operating: {format_currency(data['operating_cash'])}")
+        print(f"Investing: {format_currency(data['investing_cash'])}")
+        print(f"Financing: {format_currency(data['financing_cash'])}")
+        print(f"Net Cash Flow: {format_currency(data['net_cash_flow'])}")
     elif report_name == "Ratio Analysis":
         print(f"Profit Margin: {data['profit_margin']:.2f}%")
         print(f"Debt Ratio: {data['debt_ratio']:.2f}%")
         print(f"ROA: {data['roa']:.2f}%")
-        print(f"ROE: {data['roe']:.2f}%")            
+        print(f"ROE: {data['roe']:.2f}%")
+    elif report_name == "Chart of Accounts Rollup":
+        for group in data["groups"]:
+            print(f"{group['code']:<8} {'  ' * group['depth'] + group['name']:<40} {format_currency(group['balance']):>18}")
+    elif report_name == "Consolidated Group Report":
+        balance_sheet = data["balance_sheet"]
+        print(f"Entities: {', '.join(entity['entity'] for entity in data['entities'])}")
+        print(f"Assets: {format_currency(balance_sheet['total_assets'])}")
+        print(f"Liabilities: {format_currency(balance_sheet['total_liabilities'])}")
+        print(f"Equity: {format_currency(balance_sheet['total_equity'])}")
+        print("Balanced" if data["balance_sheet_balanced"] else "Not balanced")
+    elif report_name == "FX Revaluation":
+        for row in data["balances"]:
+            print(f"{row['account']:<25} {format_currency(row['foreign_balance'], row['currency']):>18} "
+                  f"-> {format_currency(row['revalued']):>15} ({format_currency(row['gain_loss'])})")
+        print(f"Unrealized Gain/Loss: {format_currency(data['total_gain_loss'])}")
+    elif report_name == "Aging Report":
+        for row in data["receivables"] + data["payables"]:
+            buckets = ", ".join(f"{label}: {format_currency(row['buckets'][label])}" for label in data["buckets"])
+            print(f"{row['account']:<25} {buckets} | Total: {format_currency(row['total'])}")            
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        from cli import run
+        sys.exit(run(sys.argv[1:]))
     main()
\ No newline at end of file
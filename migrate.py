@@ -0,0 +1,410 @@
+"""
+Data Migration Module - Upgrade stored data files to the current format
+"""
+import datetime as dt
+from utils import (
+    load_json, save_json, save_json_atomic, to_cents,
+    ACCOUNTS_FILE, JOURNAL_FILE, LEDGER_FILE, SCHEMA_FILE, BALANCE_SNAPSHOT_FILE,
+    JOURNAL_DIR, LEDGER_DIR
+)
+from storage import write_shards, iter_records
+from versions import HEAD_FILE, commit_version, holds_writer_lock
+
+AMOUNT_UNIT = "cents"
+STORAGE_LAYOUT = "monthly-shards"
+LEDGER_INDEX = "account"  # ledger.LEDGER_INDEX_FIELD, checked without importing the ledger module
+DUPLICATE_INDEX = "jsonl-buckets"  # dedup.INDEX_FORMAT
+
+def load_schema():
+    """Load the data format description (empty for legacy float files)"""
+    return load_json(SCHEMA_FILE, default={})
+
+def save_schema(schema):
+    """Save the data format description"""
+    return save_json_atomic(SCHEMA_FILE, schema)
+
+def _migrate_value(value, stats):
+    """Convert one legacy float amount to cents and count any rounding"""
+    # The old code always wrote floats, so ints are already cents from an interrupted run
+    if not isinstance(value, float):
+        return value
+    cents = to_cents(value)
+    if cents != value * 100:
+        stats["rounded"] += 1
+    stats["converted"] += 1
+    return cents
+
+def migrate_amounts_to_cents():
+    """
+    Convert legacy float amounts in accounts, journal and ledger files to integer cents.
+    Safe to call repeatedly - does nothing once the schema records cents.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("amount_unit") == AMOUNT_UNIT:
+        return True, "Amounts already stored in cents"
+
+    stats = {"converted": 0, "rounded": 0}
+
+    accounts_data = load_json(ACCOUNTS_FILE, default={})
+    for account_data in accounts_data.values():
+        account_data["balance"] = _migrate_value(account_data.get("balance", 0), stats)
+
+    journal_entries = load_json(JOURNAL_FILE, default={})
+    for entry in journal_entries.values():
+        for line in entry.get("debits", []) + entry.get("credits", []):
+            line["amount"] = _migrate_value(line.get("amount", 0), stats)
+
+    ledger_data = load_json(LEDGER_FILE, default={})
+    for postings in ledger_data.values():
+        for posting in postings:
+            posting["amount"] = _migrate_value(posting.get("amount", 0), stats)
+            posting["running_balance"] = _migrate_value(posting.get("running_balance", 0), stats)
+
+    # Write data first and the schema marker last, so an interrupted run is simply retried
+    for filepath, data in ((ACCOUNTS_FILE, accounts_data), (JOURNAL_FILE, journal_entries), (LEDGER_FILE, ledger_data)):
+        if filepath.exists() and not save_json(filepath, data):
+            return False, "Failed to save migrated data"
+
+    schema["amount_unit"] = AMOUNT_UNIT
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+
+    message = f"Converted {stats['converted']} amounts to cents"
+    if stats["rounded"]:
+        message += f" ({stats['rounded']} had sub-cent float drift and were rounded)"
+    return True, message
+
+def migrate_to_shards():
+    """
+    Split the monolithic journal and ledger files into month shards.
+    The legacy files are left in place untouched as a backup.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("storage") == STORAGE_LAYOUT:
+        return True, "Data already sharded by month"
+
+    journal_records = [dict(entry, je_id=je_id) for je_id, entry in load_json(JOURNAL_FILE, default={}).items()]
+    ledger_records = [dict(posting, account=account)
+                      for account, postings in load_json(LEDGER_FILE, default={}).items()
+                      for posting in postings]
+
+    if not (write_shards(JOURNAL_DIR, journal_records) and write_shards(LEDGER_DIR, ledger_records)):
+        return False, "Failed to write month shards"
+
+    schema["storage"] = STORAGE_LAYOUT
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Sharded {len(journal_records)} journal entries and {len(ledger_records)} postings by month"
+
+def _rewrite_stores():
+    """
+    Rewrite every journal and ledger shard with the current indexing, hash chaining and summaries
+
+    Returns:
+        Tuple (success: bool, journal record count, ledger record count)
+    """
+    from journal import summarize_journal_record
+    from ledger import LEDGER_INDEX_FIELD, summarize_posting_record
+
+    journal_records = list(iter_records(JOURNAL_DIR))
+    ledger_records = list(iter_records(LEDGER_DIR))
+    success = (write_shards(JOURNAL_DIR, journal_records, summarize=summarize_journal_record)
+               and write_shards(LEDGER_DIR, ledger_records, index_field=LEDGER_INDEX_FIELD,
+                                summarize=summarize_posting_record))
+    return success, len(journal_records), len(ledger_records)
+
+def migrate_ledger_index():
+    """
+    Build the per-account position index for existing ledger shards
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("ledger_index") == LEDGER_INDEX:
+        return True, "Ledger index up to date"
+
+    from ledger import LEDGER_INDEX_FIELD
+
+    success, _, ledger_count = _rewrite_stores()
+    if not success:
+        return False, "Failed to index ledger shards"
+
+    schema["ledger_index"] = LEDGER_INDEX_FIELD
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Indexed {ledger_count} postings by account"
+
+def migrate_hash_chain():
+    """
+    Add chained hashes and per-account rolling digests to existing journal and ledger shards
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("hash_chain"):
+        return True, "Hash chain up to date"
+
+    success, journal_count, ledger_count = _rewrite_stores()
+    if not success:
+        return False, "Failed to chain journal and ledger shards"
+
+    schema["hash_chain"] = "sha256"
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Chained {journal_count} journal entries and {ledger_count} postings"
+
+def migrate_account_summaries():
+    """
+    Add per-account summaries to the shard manifests and record opening balances.
+    Older versions kept the initial balance only in accounts.json, so an account with no
+    journal activity gets its current balance as opening balance (and an opening posting);
+    accounts with activity start from zero and any drift is left for reconciliation to report.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("account_summaries"):
+        return True, "Account summaries up to date"
+
+    from accounts import load_accounts, save_accounts
+    from ledger import post_opening_balance
+
+    success, _, _ = _rewrite_stores()
+    if not success:
+        return False, "Failed to summarize journal and ledger shards"
+
+    active_accounts = set()
+    for record in iter_records(JOURNAL_DIR):
+        for line in record.get("debits", []) + record.get("credits", []):
+            active_accounts.add(line["account"].lower())
+
+    accounts_data = load_accounts()
+    opened_count = 0
+    for name, account_data in accounts_data.items():
+        if "opening_balance" in account_data:
+            continue
+        opening = 0 if name.lower() in active_accounts else account_data.get("balance", 0)
+        account_data["opening_balance"] = opening
+        account_data.setdefault("opened", dt.datetime.now().strftime("%Y-%m-%d"))
+        if opening:
+            success, message = post_opening_balance(name, opening, account_data["opened"])
+            if not success:
+                return False, message
+            opened_count += 1
+    if not save_accounts(accounts_data):
+        return False, "Failed to save opening balances"
+
+    schema["account_summaries"] = True
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Summarized shards and posted {opened_count} opening balances"
+
+def migrate_search_index():
+    """
+    Build the journal search index for entries recorded before it existed
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("search_index"):
+        return True, "Search index up to date"
+
+    from search import rebuild_search_index
+
+    success, message = rebuild_search_index()
+    if not success:
+        return False, message
+
+    schema["search_index"] = True
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, message
+
+def migrate_chart_of_accounts():
+    """
+    Place accounts created before the chart of accounts under the root group of their type
+    and build the cached group balances
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("chart_of_accounts"):
+        return True, "Chart of accounts up to date"
+
+    from accounts import load_accounts, save_accounts
+    from chart import ROOT_GROUPS, rebuild_rollups
+
+    accounts_data = load_accounts()
+    placed = 0
+    for account_data in accounts_data.values():
+        if "parent" not in account_data and account_data.get("type") in ROOT_GROUPS:
+            account_data["parent"] = ROOT_GROUPS[account_data["type"]][0]
+            placed += 1
+    success, message = rebuild_rollups(accounts_data)
+    if not success:
+        return False, message
+    if placed and not save_accounts(accounts_data):
+        return False, "Failed to save account groups"
+
+    schema["chart_of_accounts"] = True
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Placed {placed} accounts in the chart of accounts"
+
+def migrate_balance_snapshot():
+    """
+    Publish the shared balance snapshot for books saved before it existed
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if BALANCE_SNAPSHOT_FILE.exists() or not ACCOUNTS_FILE.exists():
+        return True, "Balance snapshot up to date"
+
+    from accounts import load_accounts
+    from snapshot import publish_balances
+    if not publish_balances(load_accounts()):
+        return False, "Failed to publish balance snapshot"
+    return True, "Published balance snapshot"
+
+def migrate_posting_stats():
+    """
+    Add the per-account posting counts and sizes to the ledger shard summaries and the archive
+    totals. Shards are only re-read, their files are left as they are.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("posting_stats"):
+        return True, "Posting statistics up to date"
+
+    from ledger import summarize_posting_record, fold_posting_stats
+    from archive import load_archive_manifest, save_archive_manifest, read_archived_month
+    from storage import load_manifest, save_manifest, read_shard
+
+    manifest = load_manifest(LEDGER_DIR)
+    for key, stats in manifest["shards"].items():
+        summary = {}
+        for record in read_shard(LEDGER_DIR, key):
+            summarize_posting_record(summary, record)
+        stats["summary"] = summary
+    if manifest["shards"] and not save_manifest(LEDGER_DIR, manifest):
+        return False, "Failed to save ledger manifest"
+
+    archive_manifest = load_archive_manifest()
+    if archive_manifest["months"]:
+        for totals in archive_manifest["accounts"].values():
+            for field in ("postings", "min", "max"):
+                totals.pop(field, None)
+        for key in sorted(archive_manifest["months"]):
+            for record in read_archived_month(key):
+                if record["entry_type"] in ("Debit", "Credit"):
+                    fold_posting_stats(archive_manifest["accounts"][record["account"]], record["amount"])
+        if not save_archive_manifest(archive_manifest):
+            return False, "Failed to save archive manifest"
+
+    schema["posting_stats"] = True
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, f"Added posting statistics to {len(manifest['shards'])} ledger shards"
+
+def migrate_duplicate_index():
+    """
+    Build the duplicate detection index for entries recorded before it existed, or rebuild
+    one saved in an older bucket format
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    schema = load_schema()
+    if schema.get("duplicate_index") == DUPLICATE_INDEX:
+        return True, "Duplicate index up to date"
+
+    from dedup import rebuild_duplicate_index, INDEX_FORMAT
+
+    success, message = rebuild_duplicate_index()
+    if not success:
+        return False, message
+
+    schema["duplicate_index"] = INDEX_FORMAT
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, message
+
+def migrate_read_versions():
+    """
+    Commit the first read version for books saved before snapshot reads existed
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if HEAD_FILE.exists() or not ACCOUNTS_FILE.exists():
+        return True, "Read versions up to date"
+    if not commit_version():
+        return False, "Failed to commit read version"
+    return True, "Committed first read version"
+
+MIGRATIONS = [
+    migrate_amounts_to_cents,
+    migrate_to_shards,
+    migrate_ledger_index,
+    migrate_hash_chain,
+    migrate_account_summaries,
+    migrate_search_index,
+    migrate_chart_of_accounts,
+    migrate_balance_snapshot,
+    migrate_posting_stats,
+    migrate_duplicate_index,
+    migrate_read_versions,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)  # Recorded in schema.json once every migration has run
+
+def migration_pending():
+    """
+    Whether migrate_data has anything to do. Only reads the schema and checks for files, without
+    the writer lock, so read-only commands never wait for a writer.
+    """
+    if load_schema().get("version") != SCHEMA_VERSION:
+        return True
+    # Deleted or never written alongside the schema (e.g. a restored backup)
+    return ACCOUNTS_FILE.exists() and not (BALANCE_SNAPSHOT_FILE.exists() and HEAD_FILE.exists())
+
+def migrate_data():
+    """
+    Bring all data files up to the current format, running each migration in order.
+    The writer lock is taken only when a migration is pending.
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    if not migration_pending():
+        return True, "Data up to date"
+    return _run_migrations()
+
+@holds_writer_lock
+def _run_migrations():
+    """Run every migration under the writer lock (each re-checks whether it is needed)"""
+    messages = []
+    for migration in MIGRATIONS:
+        success, message = migration()
+        if not success:
+            return False, message
+        messages.append(message)
+    schema = load_schema()
+    schema["version"] = SCHEMA_VERSION
+    if not save_schema(schema):
+        return False, "Failed to save schema"
+    return True, "; ".join(messages)
@@ -0,0 +1,234 @@
+"""
+Open Items Module - Match debits against credits on receivable and payable accounts and age what is left open
+"""
+import hashlib
+from datetime import datetime
+from utils import load_json, save_json_atomic, get_account_by_name, OPEN_ITEMS_DIR, JOURNAL_DIR
+from accounts import load_accounts, save_accounts, DEBIT_NORMAL_TYPES
+from records import JournalEntry
+from storage import load_manifest, read_shard
+from versions import holds_writer_lock
+
+OPEN_ITEM_TYPES = ["Asset", "Liability"]
+# (upper bound in days or None, label); an item falls in the first bucket its age fits
+AGING_BUCKETS = [(30, "0-30"), (60, "31-60"), (90, "61-90"), (None, "90+")]
+
+def _items_path(account_name):
+    name = hashlib.sha1(account_name.encode('utf-8')).hexdigest()[:16]
+    return OPEN_ITEMS_DIR / f"{name}.json"
+
+def load_open_items(account_name):
+    """
+    Load the open items of one account
+
+    Returns:
+        List of {"je_id", "date", "ref", "side", "amount", "open"} in matching order (oldest first).
+        All items are on the same side; "open" is the part of "amount" not yet matched (cents).
+    """
+    return load_json(_items_path(account_name), default={}).get("items", [])
+
+def save_open_items(account_name, items):
+    """Save the open items of one account"""
+    return save_json_atomic(_items_path(account_name), {"account": account_name, "items": items})
+
+def normal_side(account_type):
+    """Side on which an account's items are opened (Debit for receivables, Credit for payables)"""
+    return "Debit" if account_type in DEBIT_NORMAL_TYPES else "Credit"
+
+def apply_line(items, je_id, date, side, amount, ref=None):
+    """
+    Apply one posted line to an account's open items: a line on the same side as the open items
+    opens a new item; a line on the other side settles items, first those with a matching
+    reference, then oldest first (FIFO). Whatever is left over opens an item on its own side.
+
+    Args:
+        items: Open items of the account (updated in place)
+        je_id: Journal entry ID of the line
+        date: Entry date (YYYY-MM-DD)
+        side: "Debit" or "Credit"
+        amount: Line amount in cents
+        ref: Optional reference (e.g. invoice number) the line opens or settles
+
+    Returns:
+        List of (settled item je_id, amount) matches
+    """
+    matches = []
+    remaining = amount
+    if items and items[0]["side"] != side:
+        # Referenced items first, then the rest in FIFO order
+        ordered = ([item for item in items if ref and ref in (item["ref"], item["je_id"])] +
+                   [item for item in items if not (ref and ref in (item["ref"], item["je_id"]))])
+        for item in ordered:
+            if not remaining:
+                break
+            settled = min(item["open"], remaining)
+            item["open"] -= settled
+            remaining -= settled
+            matches.append((item["je_id"], settled))
+        items[:] = [item for item in items if item["open"]]
+    if remaining:
+        items.append({"je_id": je_id, "date": date, "ref": ref or je_id, "side": side,
+                      "amount": amount, "open": remaining})
+    return matches
+
+def tracked_accounts(accounts_data):
+    """Names of the accounts with open-item tracking switched on"""
+    return {name for name, account_data in accounts_data.items() if account_data.get("open_items")}
+
+def update_open_items(journal_entry, accounts_data):
+    """
+    Apply a newly posted journal entry to the open items of the tracked accounts it touches
+
+    Returns:
+        True if saved, False otherwise
+    """
+    by_account = {}
+    for side, lines in (("Debit", journal_entry.debits), ("Credit", journal_entry.credits)):
+        for line in lines:
+            actual_name, account_data = get_account_by_name(line.account, accounts_data)
+            if account_data and account_data.get("open_items"):
+                by_account.setdefault(actual_name, []).append((side, line))
+
+    for name, lines in by_account.items():
+        items = load_open_items(name)
+        for side, line in lines:
+            apply_line(items, journal_entry.je_id, journal_entry.date, side, line.amount, line.ref)
+        if not save_open_items(name, items):
+            return False
+    return True
+
+def _opening_items(account_data):
+    """Open items for an account's opening balance (an item on the opposite side if it is negative)"""
+    items = []
+    opening = account_data.get("opening_balance", 0)
+    if opening:
+        side = normal_side(account_data["type"])
+        if opening < 0:
+            side = "Credit" if side == "Debit" else "Debit"
+        apply_line(items, "OPENING", account_data.get("opened", ""), side, abs(opening))
+    return items
+
+def reset_open_items(accounts_data):
+    """
+    Reset every tracked account to its opening balance item, ahead of re-posting the whole journal
+
+    Returns:
+        True if saved, False otherwise
+    """
+    for name in tracked_accounts(accounts_data):
+        if not save_open_items(name, _opening_items(accounts_data[name])):
+            return False
+    return True
+
+def rebuild_open_items(account_name, accounts_data):
+    """
+    Rebuild one account's open items from its opening balance and the journal.
+    Only journal shards whose summary mentions the account are read.
+
+    Returns:
+        Tuple (success: bool, number of open items)
+    """
+    account_data = accounts_data[account_name]
+    items = _opening_items(account_data)
+    wanted = account_name.lower()
+    for key, stats in sorted(load_manifest(JOURNAL_DIR)["shards"].items()):
+        if not any(name.lower() == wanted for name in stats.get("summary", {})):
+            continue
+        for record in read_shard(JOURNAL_DIR, key):
+            entry = JournalEntry.from_dict(record)
+            for side, lines in (("Debit", entry.debits), ("Credit", entry.credits)):
+                for line in lines:
+                    if line.account.lower() == wanted:
+                        apply_line(items, entry.je_id, entry.date, side, line.amount, line.ref)
+    return save_open_items(account_name, items), len(items)
+
+def match_open_items(account_names, accounts_data, entries):
+    """
+    Match the open items of accounts from their opening balances and a stream of journal entries,
+    without the open-item files (e.g. the entries of a pinned read version, see versions.py)
+
+    Args:
+        account_names: Names of tracked accounts
+        accounts_data: Dictionary of accounts
+        entries: Iterable of JournalEntries in recording order
+
+    Returns:
+        Dictionary {account name: open items}
+    """
+    names = {name.lower(): name for name in account_names}
+    items = {name: _opening_items(accounts_data[name]) for name in account_names}
+    for entry in entries:
+        for side, lines in (("Debit", entry.debits), ("Credit", entry.credits)):
+            for line in lines:
+                name = names.get(line.account.lower())
+                if name:
+                    apply_line(items[name], entry.je_id, entry.date, side, line.amount, line.ref)
+    return items
+
+@holds_writer_lock
+def enable_open_items(account_name):
+    """
+    Switch on open-item tracking for an Asset or Liability account, matching its history so far
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    accounts_data = load_accounts()
+    actual_name, account_data = get_account_by_name(account_name, accounts_data)
+    if not account_data:
+        return False, f"Account '{account_name}' not found"
+    if account_data.get("type") not in OPEN_ITEM_TYPES:
+        return False, "Open items can only be tracked on Asset and Liability accounts"
+    account_data["open_items"] = True
+    if not save_accounts(accounts_data):
+        return False, "Failed to save account"
+    success, count = rebuild_open_items(actual_name, accounts_data)
+    if not success:
+        return False, "Failed to save open items"
+    return True, f"Tracking open items for '{actual_name}' ({count} open)"
+
+def aging_bucket(age_days):
+    """Label of the aging bucket for an age in days"""
+    for limit, label in AGING_BUCKETS:
+        if limit is None or age_days <= limit:
+            return label
+
+def age_open_items(as_of=None, accounts_data=None, open_items=None):
+    """
+    Age the open items of every tracked account from the open-item files alone
+
+    Args:
+        as_of: Aging date (YYYY-MM-DD, default: today); items dated after it are left out
+        accounts_data: Dictionary of accounts (default: loaded)
+        open_items: Dictionary {account name: open items}, e.g. from match_open_items
+                    (default: read from the open-item files)
+
+    Returns:
+        List of {"account", "type", "buckets": {label: cents}, "total", "items"} per tracked account,
+        amounts signed so that items on the account's normal side are positive
+    """
+    if as_of is None:
+        as_of = datetime.now().strftime("%Y-%m-%d")
+    if accounts_data is None:
+        accounts_data = load_accounts()
+    as_of_date = datetime.strptime(as_of, "%Y-%m-%d")
+
+    rows = []
+    for name in sorted(tracked_accounts(accounts_data)):
+        side = normal_side(accounts_data[name]["type"])
+        buckets = {label: 0 for _, label in AGING_BUCKETS}
+        count = 0
+        for item in open_items[name] if open_items is not None else load_open_items(name):
+            if item["date"] > as_of:
+                continue
+            age = (as_of_date - datetime.strptime(item["date"], "%Y-%m-%d")).days
+            buckets[aging_bucket(age)] += item["open"] if item["side"] == side else -item["open"]
+            count += 1
+        rows.append({
+            "account": name,
+            "type": accounts_data[name]["type"],
+            "buckets": buckets,
+            "total": sum(buckets.values()),
+            "items": count
+        })
+    return rows
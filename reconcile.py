@@ -0,0 +1,248 @@
+"""
+Reconciliation Module - Detect and repair drift between accounts, journal and ledger
+"""
+from datetime import datetime
+from utils import JOURNAL_DIR, LEDGER_DIR, format_currency
+from accounts import load_accounts, save_accounts, balance_change
+from chart import check_rollups, rebuild_rollups
+from ledger import (
+    summarize_posting_record, LEDGER_INDEX_FIELD, OPENING_ENTRY_TYPE, OPENING_JE_ID
+)
+from archive import load_archive_manifest, carried_balance, carried_forward_postings
+from records import Posting
+from storage import load_manifest, read_shard, rewrite_shard, shard_key
+from versions import holds_writer_lock
+
+def _account_names(accounts_data):
+    """Map lowercased account names to their stored names (matched as get_account_by_name does)"""
+    names = {}
+    for name in accounts_data:
+        names.setdefault(name.lower(), name)
+    return names
+
+def _fold_summaries(directory, names):
+    """
+    Combine the per-shard account summaries of a store into one summary per account.
+    Reads only the manifest, never the shards themselves.
+
+    Args:
+        directory: Shard directory
+        names: Account names by lowercased name (see _account_names)
+
+    Returns:
+        Tuple ({account: totals}, set of unknown account names)
+    """
+    folded = {}
+    unknown = set()
+    for stats in load_manifest(directory)["shards"].values():
+        for name, totals in stats.get("summary", {}).items():
+            actual_name = names.get(name.lower())
+            if not actual_name:
+                unknown.add(name)
+                continue
+            combined = folded.setdefault(actual_name, {"debit": 0, "credit": 0, "opening": 0, "tail_seq": 0})
+            combined["debit"] += totals.get("debit", 0)
+            combined["credit"] += totals.get("credit", 0)
+            combined["opening"] += totals.get("opening", 0)
+            if totals.get("tail_seq", 0) > combined["tail_seq"]:
+                combined["tail"] = totals["tail"]
+                combined["tail_seq"] = totals["tail_seq"]
+    return folded, unknown
+
+def check_accounts():
+    """
+    Compare stored balances, journal totals and ledger tails for every account in one pass
+
+    Returns:
+        Tuple (accounts_data, results: {account: {...}}, unknown accounts referenced by the journal)
+    """
+    accounts_data = load_accounts()
+    names = _account_names(accounts_data)
+    journal_totals, unknown = _fold_summaries(JOURNAL_DIR, names)
+    ledger_totals, _ = _fold_summaries(LEDGER_DIR, names)
+    # Archived postings count towards the ledger totals; an account without hot postings
+    # ends at its carried-forward balance
+    archive_manifest = load_archive_manifest()
+    for name, totals in archive_manifest["accounts"].items():
+        actual_name = names.get(name.lower())
+        if not actual_name:
+            continue
+        combined = ledger_totals.setdefault(actual_name, {"debit": 0, "credit": 0, "opening": 0, "tail_seq": 0,
+                                                          "tail": carried_balance(actual_name, archive_manifest)})
+        for bucket in ("debit", "credit", "opening"):
+            combined[bucket] += totals[bucket]
+
+    results = {}
+    for name, account_data in accounts_data.items():
+        account_type = account_data.get("type")
+        opening = account_data.get("opening_balance", 0)
+        journal = journal_totals.get(name, {"debit": 0, "credit": 0})
+        ledger = ledger_totals.get(name)
+
+        expected = opening + balance_change(account_type, journal["debit"], journal["credit"])
+        stored = account_data.get("balance", 0)
+        tail = ledger.get("tail") if ledger else None
+
+        ledger_issues = []
+        if ledger is None:
+            if expected:
+                ledger_issues.append("ledger has no postings")
+        else:
+            if (ledger["debit"], ledger["credit"]) != (journal["debit"], journal["credit"]):
+                ledger_issues.append("ledger postings do not match the journal")
+            if ledger["opening"] != opening:
+                ledger_issues.append("opening balance missing from ledger")
+            if tail != expected:
+                ledger_issues.append("ledger running balance is off")
+
+        results[name] = {
+            "type": account_type,
+            "expected": expected,
+            "stored": stored,
+            "ledger_tail": tail,
+            "balance_drift": stored != expected,
+            "ledger_issues": ledger_issues
+        }
+    return accounts_data, results, unknown
+
+def _rebuild_account_postings(names, accounts_data):
+    """
+    Re-derive the ledger postings of the given accounts from the journal and rewrite only the
+    ledger shards that involve them. Postings of other accounts are kept as they are.
+
+    Returns:
+        Tuple (success: bool, number of shards rewritten)
+    """
+    # Opening postings come first in each account's running balance trail; closed periods stay
+    # archived and the trail starts from their carried-forward balances
+    archive_manifest = load_archive_manifest()
+    cutoff = archive_manifest["closed_through"]
+    new_postings = {}
+    balances = {}
+    if cutoff:
+        new_postings[shard_key(cutoff)] = carried_forward_postings(names, archive_manifest)
+    for name in names:
+        if cutoff and (accounts_data[name].get("opened") or "") <= cutoff:
+            balances[name] = carried_balance(name, archive_manifest)
+            continue
+        opening = accounts_data[name].get("opening_balance", 0)
+        balances[name] = opening
+        if opening:
+            date = accounts_data[name].get("opened") or datetime.now().strftime("%Y-%m-%d")
+            new_postings.setdefault(shard_key(date), []).append(
+                Posting(name, date, OPENING_JE_ID, OPENING_ENTRY_TYPE, opening, opening))
+
+    # Only journal shards whose summary mentions one of the accounts are read
+    lowered = {name.lower(): name for name in names}
+    for key, stats in sorted(load_manifest(JOURNAL_DIR)["shards"].items()):
+        if not any(account.lower() in lowered for account in stats.get("summary", {})):
+            continue
+        if cutoff and key < shard_key(cutoff):
+            continue
+        for record in read_shard(JOURNAL_DIR, key):
+            if cutoff and record["date"] <= cutoff:
+                continue
+            for side, entry_type in (("debits", "Debit"), ("credits", "Credit")):
+                for line in record.get(side, []):
+                    name = lowered.get(line["account"].lower())
+                    if not name:
+                        continue
+                    amount = line["amount"]
+                    if entry_type == "Debit":
+                        balances[name] += balance_change(accounts_data[name]["type"], amount, 0)
+                    else:
+                        balances[name] += balance_change(accounts_data[name]["type"], 0, amount)
+                    new_postings.setdefault(key, []).append(
+                        Posting(name, record["date"], record["je_id"], entry_type, amount, balances[name],
+                                currency=line.get("currency"), foreign_amount=line.get("foreign_amount")))
+
+    # Rewrite the ledger shards that held or will hold postings of these accounts, oldest first
+    ledger_shards = load_manifest(LEDGER_DIR)["shards"]
+    keys = set(new_postings)
+    keys.update(key for key, stats in ledger_shards.items()
+                if any(name in stats.get("values", {}) for name in names))
+    for key in sorted(keys):
+        records = [record for record in read_shard(LEDGER_DIR, key) if record["account"] not in names]
+        records.extend(posting.to_dict() for posting in new_postings.get(key, []))
+        if not rewrite_shard(LEDGER_DIR, key, records, index_field=LEDGER_INDEX_FIELD,
+                             summarize=summarize_posting_record):
+            return False, 0
+    return True, len(keys)
+
+@holds_writer_lock
+def reconcile_accounts(repair=False):
+    """
+    Find accounts whose stored balance, journal totals and ledger trail disagree,
+    and optionally repair only those accounts (no full rebuild_ledger)
+
+    Args:
+        repair: Fix drifting accounts instead of only reporting them
+
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    accounts_data, results, unknown = check_accounts()
+    drifting = {name: result for name, result in results.items()
+                if result["balance_drift"] or result["ledger_issues"]}
+    rollup_drift = check_rollups(accounts_data)
+
+    report_data = {
+        "checked": len(results),
+        "drifting": drifting,
+        "rollup_drift": rollup_drift,
+        "unknown_accounts": sorted(unknown),
+        "repaired": []
+    }
+
+    if unknown:
+        unknown_note = f" Journal references unknown accounts: {', '.join(sorted(unknown))}."
+    else:
+        unknown_note = ""
+    if rollup_drift:
+        rollup_note = f" {len(rollup_drift)} group rollups are off."
+    else:
+        rollup_note = ""
+
+    if not drifting and not rollup_drift:
+        return not unknown, report_data, f"All {len(results)} accounts reconcile.{unknown_note}"
+
+    if not repair:
+        return False, report_data, (f"{len(drifting)} of {len(results)} accounts are drifting."
+                                    f"{rollup_note}{unknown_note}")
+
+    ledger_names = [name for name, result in drifting.items() if result["ledger_issues"]]
+    shards_rewritten = 0
+    if ledger_names:
+        success, shards_rewritten = _rebuild_account_postings(ledger_names, accounts_data)
+        if not success:
+            return False, report_data, "Failed to rewrite ledger postings"
+
+    for name, result in drifting.items():
+        accounts_data[name]["balance"] = result["expected"]
+    # Repaired balances move their groups too, so the rollups are re-derived after any repair
+    success, message = rebuild_rollups(accounts_data)
+    if not success:
+        return False, report_data, message
+    if not save_accounts(accounts_data):
+        return False, report_data, "Failed to save repaired balances"
+
+    report_data["repaired"] = sorted(drifting)
+    return True, report_data, (f"Repaired {len(drifting)} of {len(results)} accounts "
+                               f"({shards_rewritten} ledger shards rewritten).{rollup_note}{unknown_note}")
+
+def format_reconciliation_text(report_data):
+    """Format reconciliation results as text"""
+    lines = []
+    lines.append(f"{'Account':<30} {'Expected':>15} {'Stored':>15} {'Ledger Tail':>15}  Issues")
+    lines.append("-" * 100)
+    for name, result in sorted(report_data["drifting"].items()):
+        issues = list(result["ledger_issues"])
+        if result["balance_drift"]:
+            issues.insert(0, "stored balance differs")
+        tail = format_currency(result["ledger_tail"]) if result["ledger_tail"] is not None else "-"
+        lines.append(f"{name:<30} {format_currency(result['expected']):>15} "
+                     f"{format_currency(result['stored']):>15} {tail:>15}  {'; '.join(issues)}")
+    for code, group in sorted(report_data.get("rollup_drift", {}).items()):
+        lines.append(f"{code + ' ' + group['name']:<30} {format_currency(group['expected']):>15} "
+                     f"{format_currency(group['cached']):>15} {'-':>15}  group rollup differs")
+    return "\n".join(lines)
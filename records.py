@@ -0,0 +1,143 @@
+"""
+Record Types Module - Compact in-memory records for journal entries and ledger postings
+"""
+import sys
+
+# Account names, dates and entry types repeat across millions of records, so they are interned
+_intern = sys.intern
+
+class JournalLine:
+    """
+    One debit or credit line of a journal entry (amount in base currency cents).
+    Foreign currency lines also keep their currency and the amount in that currency's cents;
+    'ref' optionally names the open item (e.g. an invoice number) the line creates or settles.
+    """
+    __slots__ = ("account", "amount", "currency", "foreign_amount", "ref")
+
+    def __init__(self, account, amount, currency=None, foreign_amount=None, ref=None):
+        self.account = _intern(account)
+        self.amount = amount
+        self.currency = _intern(currency) if currency else None
+        self.foreign_amount = foreign_amount
+        self.ref = ref or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a line from its JSON layout"""
+        return cls(data.get("account"), data.get("amount", 0), data.get("currency"), data.get("foreign_amount"),
+                   data.get("ref"))
+
+    def to_dict(self):
+        """Convert the line to its JSON layout"""
+        data = {"account": self.account, "amount": self.amount}
+        if self.currency:
+            data["currency"] = self.currency
+            data["foreign_amount"] = self.foreign_amount
+        if self.ref:
+            data["ref"] = self.ref
+        return data
+
+    def __repr__(self):
+        if self.currency:
+            return f"JournalLine({self.account!r}, {self.amount}, {self.currency!r}, {self.foreign_amount})"
+        return f"JournalLine({self.account!r}, {self.amount})"
+
+class JournalEntry:
+    """
+    A balanced journal entry made of debit and credit lines.
+    Entries from automated feeds may carry the feed's idempotency key.
+    """
+    __slots__ = ("je_id", "date", "narration", "debits", "credits", "hash", "idempotency_key")
+
+    def __init__(self, je_id, date, narration, debits, credits, hash=None, idempotency_key=None):
+        self.je_id = je_id
+        self.date = _intern(date)
+        self.narration = narration
+        self.debits = debits
+        self.credits = credits
+        self.hash = hash  # Chain hash, set by storage once the entry is written
+        self.idempotency_key = idempotency_key or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an entry from its JSON layout"""
+        return cls(
+            data.get("je_id"),
+            data.get("date"),
+            data.get("narration", ""),
+            [JournalLine.from_dict(line) for line in data.get("debits", [])],
+            [JournalLine.from_dict(line) for line in data.get("credits", [])],
+            data.get("hash"),
+            data.get("idempotency_key")
+        )
+
+    def to_dict(self):
+        """Convert the entry to its JSON layout"""
+        data = {
+            "je_id": self.je_id,
+            "date": self.date,
+            "narration": self.narration,
+            "debits": [line.to_dict() for line in self.debits],
+            "credits": [line.to_dict() for line in self.credits]
+        }
+        if self.idempotency_key:
+            data["idempotency_key"] = self.idempotency_key
+        if self.hash:
+            data["hash"] = self.hash
+        return data
+
+    def __repr__(self):
+        return f"JournalEntry({self.je_id!r}, {self.date!r}, {self.narration!r})"
+
+class Posting:
+    """A single ledger posting against one account (amounts in base currency cents)"""
+    __slots__ = ("account", "date", "je_id", "entry_type", "amount", "running_balance", "hash",
+                 "currency", "foreign_amount")
+
+    def __init__(self, account, date, je_id, entry_type, amount, running_balance, hash=None,
+                 currency=None, foreign_amount=None):
+        self.account = _intern(account)
+        self.date = _intern(date)
+        self.je_id = je_id
+        self.entry_type = _intern(entry_type)
+        self.amount = amount
+        self.running_balance = running_balance
+        self.hash = hash  # Chain hash, set by storage once the posting is written
+        self.currency = _intern(currency) if currency else None  # Set for foreign currency postings
+        self.foreign_amount = foreign_amount
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a posting from its JSON layout"""
+        return cls(
+            data.get("account"),
+            data.get("date"),
+            data.get("je_id"),
+            data.get("entry_type"),
+            data.get("amount", 0),
+            data.get("running_balance", 0),
+            data.get("hash"),
+            data.get("currency"),
+            data.get("foreign_amount")
+        )
+
+    def to_dict(self):
+        """Convert the posting to its JSON layout"""
+        data = {
+            "account": self.account,
+            "date": self.date,
+            "je_id": self.je_id,
+            "entry_type": self.entry_type,
+            "amount": self.amount,
+            "running_balance": self.running_balance
+        }
+        if self.currency:
+            data["currency"] = self.currency
+            data["foreign_amount"] = self.foreign_amount
+        if self.hash:
+            data["hash"] = self.hash
+        return data
+
+    def __repr__(self):
+        return (f"Posting({self.account!r}, {self.date!r}, {self.je_id!r}, "
+                f"{self.entry_type!r}, {self.amount}, {self.running_balance})")
@@ -1,36 +1,99 @@
 """
 Reports & Analytics Module - Generate accounting reports
 """
-from utils import (
-    load_json, save_json, REPORTS_DIR, format_currency
+from utils import REPORTS_DIR, BASE_CURRENCY, format_currency
+from chart import group_depths
+from versions import (
+    pin_version, iter_version_postings, iter_version_entries, iter_version_account_ledger, SnapshotExpired, PIN_RETRIES
 )
-from accounts import load_accounts
-from ledger import load_ledger_data, get_account_ledger
-from journal import load_journal_entries
+from fx import revalue_postings
+from openitems import age_open_items, match_open_items, tracked_accounts, AGING_BUCKETS
+from journal import get_journal_entries_by_ids
+from search import tokenize_text
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import time
 
-def generate_trial_balance():
+# Narration keywords (matched as word prefixes) for cash flow categories
+FINANCING_KEYWORDS = ["loan", "capital", "equity", "investment"]
+INVESTING_KEYWORDS = ["equipment", "asset", "property", "building"]
+RETAINED_EARNINGS_LABEL = "Retained Earnings (Net Income)"
+
+GENERATED_PREFIX = "Generated: "
+REPORT_WORKERS = 4  # Threads rendering and writing report files in generate_all_reports
+
+def _report_body(text):
+    """Report text without its 'Generated:' timestamp line"""
+    return [line for line in text.split("\n") if not line.startswith(GENERATED_PREFIX)]
+
+def _read_pinned(job, version=None):
     """
-    Generate Trial Balance report
+    Run a report job against a pinned read version (see versions.py). Postings made while it runs
+    neither wait for it nor show up in it; if the ledger is rewritten under it (a rebuild or
+    compaction), the job is run again on a newly pinned version.
+
+    Args:
+        job: Function taking a version and returning (success, report_data, message)
+        version: Version to read (default: the latest)
+
+    Returns:
+        The job's result
+    """
+    for _ in range(PIN_RETRIES):
+        try:
+            return job(version or pin_version())
+        except SnapshotExpired:
+            version = None
+    return False, {}, "The ledger kept being rewritten while the report ran; please run it again"
+
+def save_report(report_file, report_text):
+    """
+    Write a report file unless it already holds the same report.
+    Only the 'Generated:' timestamp is ignored in the comparison, so an unchanged report keeps
+    its file (and modification time) untouched.
+    
+    Args:
+        report_file: Path of the report file
+        report_text: Formatted report
     
     Returns:
-        Tuple (success: bool, report_data: dict, message: str)
+        True if the file was written, False if it was already up to date
+    
+    Raises:
+        IOError if the file cannot be written
+    """
+    if report_file.exists():
+        with open(report_file, 'r', encoding='utf-8') as f:
+            if _report_body(f.read()) == _report_body(report_text):
+                return False
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(report_text)
+    return True
+
+def build_trial_balance(accounts_data):
+    """
+    Compute Trial Balance data from account balances (no file output)
+    
+    Args:
+        accounts_data: Dictionary of accounts
+    
+    Returns:
+        Report data dictionary
     """
-    accounts_data = load_accounts()
     trial_balance = []
-    total_debits = 0.0
-    total_credits = 0.0
+    total_debits = 0
+    total_credits = 0
     
     for account_name, account_data in accounts_data.items():
         account_type = account_data.get("type")
-        balance = account_data.get("balance", 0.0)
+        balance = account_data.get("balance", 0)
 
         if account_type in ["Asset", "Expense"]:
-            debit_balance = balance if balance >= 0 else 0.0
-            credit_balance = abs(balance) if balance < 0 else 0.0
+            debit_balance = balance if balance >= 0 else 0
+            credit_balance = abs(balance) if balance < 0 else 0
         else:  # Liability, Revenue, Owner's Equity
-            debit_balance = abs(balance) if balance < 0 else 0.0
-            credit_balance = balance if balance >= 0 else 0.0
+            debit_balance = abs(balance) if balance < 0 else 0
+            credit_balance = balance if balance >= 0 else 0
         
         trial_balance.append({
             "account": account_name,
@@ -45,20 +108,28 @@ def generate_trial_balance():
     trial_balance.sort(key=lambda x: x["account"])
     
     # Create report data dictionary
-    report_data = {
+    return {
         "trial_balance": trial_balance,
         "total_debits": total_debits,
         "total_credits": total_credits,
-        "is_balanced": abs(total_debits - total_credits) < 0.01
+        "is_balanced": total_debits == total_credits
     }
+
+def generate_trial_balance():
+    """
+    Generate Trial Balance report
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    report_data = build_trial_balance(pin_version()["accounts"])
     
     # Save to file
     report_file = REPORTS_DIR / "trial_balance.txt"
     report_text = format_trial_balance_text(report_data)
     
     try:
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        save_report(report_file, report_text)
         return True, report_data, "Trial Balance generated successfully"
     except IOError as e:
         return False, report_data, f"Failed to save report: {e}"
@@ -69,7 +140,7 @@ def format_trial_balance_text(report_data):
     # Header
     lines.append("=" * 80)
     lines.append("TRIAL BALANCE")
-    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     lines.append("=" * 80)
     
     # Column headers
@@ -96,24 +167,25 @@ def format_trial_balance_text(report_data):
     
     return "\n".join(lines)
 
-def generate_income_statement():
+def build_income_statement(accounts_data):
     """
-    Generate Income Statement (Profit & Loss)
+    Compute Income Statement data from account balances (no file output)
+    
+    Args:
+        accounts_data: Dictionary of accounts
     
     Returns:
-        Tuple (success: bool, report_data: dict, message: str)
+        Report data dictionary
     """
-    accounts_data = load_accounts()
-    
-    total_revenue = 0.0
-    total_expenses = 0.0
+    total_revenue = 0
+    total_expenses = 0
     
     revenue_accounts = []  # Fix: plural
     expense_accounts = []
     
     for account_name, account_info in accounts_data.items():
         account_type = account_info.get("type")
-        balance = account_info.get("balance", 0.0)
+        balance = account_info.get("balance", 0)
         
         if account_type == "Revenue":
             revenue_accounts.append({
@@ -130,21 +202,29 @@ def generate_income_statement():
     
     net_income = total_revenue - total_expenses
     
-    report_data = {
+    return {
         "revenue_accounts": sorted(revenue_accounts, key=lambda x: x["account"]),  # Sort by name
         "expense_accounts": sorted(expense_accounts, key=lambda x: x["account"]),  # Sort by name
         "total_revenue": total_revenue,  # Add this
         "total_expenses": total_expenses,  # Add this
         "net_income": net_income
     }
+
+def generate_income_statement():
+    """
+    Generate Income Statement (Profit & Loss)
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    report_data = build_income_statement(pin_version()["accounts"])
     
     # Save to file
     report_file = REPORTS_DIR / "income_statement.txt"
     report_text = format_income_statement_text(report_data)
     
     try:
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        save_report(report_file, report_text)
         return True, report_data, "Income Statement generated successfully"
     except IOError as e:
         return False, report_data, f"Failed to save report: {e}"
@@ -155,7 +235,7 @@ def format_income_statement_text(report_data):
     # Header
     lines.append("=" * 80)
     lines.append("INCOME STATEMENT")
-    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     lines.append("=" * 80)
     
     # Revenue section
@@ -184,27 +264,28 @@ def format_income_statement_text(report_data):
     
     return "\n".join(lines)
 
-def generate_balance_sheet():
-
+def build_balance_sheet(accounts_data, income_statement=None):
     """
-    Generate Balance Sheet
+    Compute Balance Sheet data from account balances (no file output)
+    
+    Args:
+        accounts_data: Dictionary of accounts
+        income_statement: Income Statement data of the same accounts, if already computed
     
     Returns:
-        Tuple (success: bool, report_data: dict, message: str)
+        Report data dictionary
     """
-    accounts_data = load_accounts()
-    
     assets = []
     liabilities = []
     equity = []
     
-    total_assets = 0.0
-    total_liabilities = 0.0
-    total_equity = 0.0
+    total_assets = 0
+    total_liabilities = 0
+    total_equity = 0
     
     for account_name, account_info in accounts_data.items():
         account_type = account_info.get("type")
-        balance = account_info.get("balance", 0.0)
+        balance = account_info.get("balance", 0)
         
         if account_type == "Asset":
             assets.append({
@@ -226,33 +307,40 @@ def generate_balance_sheet():
             total_equity += balance
     
     # Add retained earnings (net income from income statement)
-    income_success, income_data, _ = generate_income_statement()
-    if income_success and income_data:
-        net_income = income_data.get("net_income", 0.0)
-        if net_income != 0:
-            equity.append({
-                "account": "Retained Earnings (Net Income)",
-                "amount": net_income
-            })
-            total_equity += net_income
+    net_income = (income_statement or build_income_statement(accounts_data))["net_income"]
+    if net_income != 0:
+        equity.append({
+            "account": RETAINED_EARNINGS_LABEL,
+            "amount": net_income
+        })
+        total_equity += net_income
     
-    report_data = {
+    return {
         "assets": sorted(assets, key=lambda x: x["account"]),  # Sort
         "liabilities": sorted(liabilities, key=lambda x: x["account"]),  # Sort
         "equity": sorted(equity, key=lambda x: x["account"]),  # Sort
         "total_assets": total_assets,  # Add totals
         "total_liabilities": total_liabilities,
         "total_equity": total_equity,
-        "is_balanced": abs(total_assets - (total_liabilities + total_equity)) < 0.01  # Check balance
+        "is_balanced": total_assets == total_liabilities + total_equity  # Exact check on cents
     }
+
+def generate_balance_sheet():
+
+    """
+    Generate Balance Sheet
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    report_data = build_balance_sheet(pin_version()["accounts"])
     
     # Save to file
     report_file = REPORTS_DIR / "balance_sheet.txt"
     report_text = format_balance_sheet_text(report_data)
     
     try:
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        save_report(report_file, report_text)
         return True, report_data, "Balance Sheet generated successfully"
     except IOError as e:
         return False, report_data, f"Failed to save report: {e}"
@@ -263,7 +351,7 @@ def format_balance_sheet_text(report_data):
     # Header
     lines.append("=" * 80)
     lines.append("BALANCE SHEET")
-    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     lines.append("=" * 80)
     
     # Assets section
@@ -304,15 +392,24 @@ def format_balance_sheet_text(report_data):
     
     return "\n".join(lines)
 
-def generate_cash_flow():
+def generate_cash_flow(version=None):
     """
     Generate Cash Flow Statement
     
+    Args:
+        version: Pinned read version (default: the latest)
+    
     Returns:
         Tuple (success: bool, report_data: dict, message: str)
     """
-    journal_entries = load_journal_entries()
-    accounts_data = load_accounts()
+    return _read_pinned(_generate_cash_flow, version)
+
+def _has_keyword(words, keywords):
+    """Whether any narration word starts with one of the keywords (as a search prefix query matches)"""
+    return any(word.startswith(keyword) for word in words for keyword in keywords)
+
+def _generate_cash_flow(version):
+    accounts_data = version["accounts"]
     
     # Find Cash account (look for account with "cash" in the name)
     cash_account = None
@@ -325,34 +422,41 @@ def generate_cash_flow():
         return False, {}, "No Cash account found"
     
     # Get cash ledger entries
-    cash_ledger = get_account_ledger(cash_account)
+    cash_ledger = list(iter_version_account_ledger(version, cash_account))
     
     if not cash_ledger:
         return False, {}, "No cash transactions found"
+
+    # Only the journal shards holding the cash postings' entries are read for narrations
+    journal_entries = {entry.je_id: entry for entry in
+                       get_journal_entries_by_ids({posting.je_id for posting in cash_ledger})}
     
     # Categorize transactions
     operating = []
     investing = []
     financing = []
     
-    # Loop through cash ledger entries
+    # Loop through cash ledger entries (opening balances are not cash flows)
     for entry in cash_ledger:
-        je_id = entry.get("je_id")
-        journal_entry = journal_entries.get(je_id, {})
-        narration = journal_entry.get("narration", "").lower()
+        if entry.entry_type not in ("Debit", "Credit"):
+            continue
+        je_id = entry.je_id
+        journal_entry = journal_entries.get(je_id)
+        narration = journal_entry.narration if journal_entry else ""
         
         entry_data = {
-            "date": entry.get("date"),
+            "date": entry.date,
             "je_id": je_id,
-            "narration": journal_entry.get("narration", ""),
-            "amount": entry.get("amount"),
-            "type": entry.get("entry_type")
+            "narration": narration,
+            "amount": entry.amount,
+            "type": entry.entry_type
         }
         
         # Categorize based on keywords in narration
-        if any(keyword in narration for keyword in ["loan", "capital", "equity", "investment"]):
+        words = tokenize_text(narration)
+        if _has_keyword(words, FINANCING_KEYWORDS):
             financing.append(entry_data)
-        elif any(keyword in narration for keyword in ["equipment", "asset", "property", "building"]):
+        elif _has_keyword(words, INVESTING_KEYWORDS):
             investing.append(entry_data)
         else:
             operating.append(entry_data)
@@ -381,8 +485,7 @@ def generate_cash_flow():
     report_text = format_cash_flow_text(report_data)
     
     try:
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        save_report(report_file, report_text)
         return True, report_data, "Cash Flow Statement generated successfully"
     except IOError as e:
         return False, report_data, f"Failed to save report: {e}"
@@ -393,7 +496,7 @@ def format_cash_flow_text(report_data):
     lines = []
     lines.append("=" * 80)
     lines.append("CASH FLOW STATEMENT")
-    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     lines.append(f"Cash Account: {report_data['cash_account']}")
     lines.append("=" * 80)
     
@@ -428,32 +531,26 @@ def format_cash_flow_text(report_data):
     return "\n".join(lines)
 
 
-def generate_ratio_analysis():
+def build_ratio_analysis(income_data, balance_data):
     """
-    Generate Financial Ratio Analysis
+    Compute Financial Ratio data from Income Statement and Balance Sheet data (no file output)
+    
+    Args:
+        income_data: Income Statement data
+        balance_data: Balance Sheet data
     
     Returns:
-        Tuple (success: bool, report_data: dict, message: str)
+        Report data dictionary
     """
-    # Get income statement data
-    income_success, income_data, _ = generate_income_statement()
-    if not income_success:
-        return False, {}, "Failed to generate income statement"
-    
-    # Get balance sheet data
-    balance_success, balance_data, _ = generate_balance_sheet()
-    if not balance_success:
-        return False, {}, "Failed to generate balance sheet"
-    
     # Extract values
-    total_revenue = income_data.get("total_revenue", 0.0)
-    net_income = income_data.get("net_income", 0.0)
-    total_expenses = income_data.get("total_expenses", 0.0)
-    total_assets = balance_data.get("total_assets", 0.0)
-    total_liabilities = balance_data.get("total_liabilities", 0.0)
-    total_equity = balance_data.get("total_equity", 0.0)
-    
-    # Calculate ratios
+    total_revenue = income_data.get("total_revenue", 0)
+    net_income = income_data.get("net_income", 0)
+    total_expenses = income_data.get("total_expenses", 0)
+    total_assets = balance_data.get("total_assets", 0)
+    total_liabilities = balance_data.get("total_liabilities", 0)
+    total_equity = balance_data.get("total_equity", 0)
+    
+    # Calculate ratios (cents cancel out, so ratios are unit-free)
     profit_margin = (net_income / total_revenue * 100) if total_revenue > 0 else 0.0
     debt_ratio = (total_liabilities / total_assets * 100) if total_assets > 0 else 0.0
     current_ratio = 1.0  # Simplified - would need current assets/liabilities breakdown
@@ -464,7 +561,7 @@ def generate_ratio_analysis():
     # Calculate ROE (Return on Equity)
     roe = (net_income / total_equity * 100) if total_equity > 0 else 0.0
     
-    report_data = {
+    return {
         "profit_margin": profit_margin,
         "debt_ratio": debt_ratio,
         "current_ratio": current_ratio,
@@ -476,7 +573,322 @@ def generate_ratio_analysis():
         "total_liabilities": total_liabilities,
         "total_equity": total_equity
     }
+
+
+def generate_ratio_analysis():
+    """
+    Generate Financial Ratio Analysis
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    accounts_data = pin_version()["accounts"]
+    income_data = build_income_statement(accounts_data)
+    balance_data = build_balance_sheet(accounts_data, income_data)
+    return True, build_ratio_analysis(income_data, balance_data), "Ratio Analysis generated successfully"
+
+
+def build_chart_rollup(chart, max_depth=None):
+    """
+    Compute Chart of Accounts rollup data from a chart's cached group balances (no file output)
+    
+    Args:
+        chart: Chart of accounts
+        max_depth: Deepest group level to show (0 = account types only, default: all levels)
     
-    return True, report_data, "Ratio Analysis generated successfully"
+    Returns:
+        Report data dictionary
+    """
+    groups = []
+    for code, depth in group_depths(chart):
+        if max_depth is not None and depth > max_depth:
+            continue
+        group = chart["groups"][code]
+        groups.append({
+            "code": code,
+            "name": group["name"],
+            "type": group["type"],
+            "depth": depth,
+            "balance": group["balance"]
+        })
+    
+    return {
+        "groups": groups,
+        "max_depth": max_depth
+    }
 
-    
\ No newline at end of file
+def generate_chart_rollup(max_depth=None):
+    """
+    Generate Chart of Accounts rollup from the cached group balances.
+    No account balances are summed here, so the cost depends on the number of groups only.
+    
+    Args:
+        max_depth: Deepest group level to show (0 = account types only, default: all levels)
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    report_data = build_chart_rollup(pin_version()["chart"], max_depth)
+    
+    # Save to file
+    report_file = REPORTS_DIR / "chart_rollup.txt"
+    report_text = format_chart_rollup_text(report_data)
+    
+    try:
+        save_report(report_file, report_text)
+        return True, report_data, "Chart of Accounts Rollup generated successfully"
+    except IOError as e:
+        return False, report_data, f"Failed to save report: {e}"
+
+def format_chart_rollup_text(report_data):
+    """Format chart of accounts rollup as text"""
+    lines = []
+    # Header
+    lines.append("=" * 80)
+    lines.append("CHART OF ACCOUNTS ROLLUP")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append("=" * 80)
+    
+    lines.append(f"{'Code':<10} {'Group':<45} {'Balance':>20}")
+    lines.append("-" * 80)
+    for group in report_data["groups"]:
+        name = "  " * group["depth"] + group["name"]
+        lines.append(f"{group['code']:<10} {name:<45} {format_currency(group['balance']):>20}")
+    lines.append("=" * 80)
+    
+    return "\n".join(lines)
+
+
+def generate_fx_revaluation(as_of=None, version=None):
+    """
+    Generate Foreign Currency Revaluation of Asset and Liability balances.
+    All foreign currency postings are revalued in one batch: one pass to total them per
+    account and currency, then one rate lookup per currency.
+    
+    Args:
+        as_of: Revaluation date (YYYY-MM-DD, default: today)
+        version: Pinned read version (default: the latest)
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    if as_of is None:
+        as_of = datetime.now().strftime("%Y-%m-%d")
+    return _read_pinned(lambda pinned: _generate_fx_revaluation(as_of, pinned), version)
+
+def _generate_fx_revaluation(as_of, version):
+    rows, missing = revalue_postings(iter_version_postings(version, end_date=as_of), version["accounts"], as_of)
+    if not rows and not missing:
+        return False, {}, "No foreign currency balances found"
+    
+    report_data = {
+        "as_of": as_of,
+        "base_currency": BASE_CURRENCY,
+        "balances": rows,
+        "missing_rates": sorted(missing),
+        "total_gain_loss": sum(row["gain_loss"] for row in rows)
+    }
+    
+    # Save to file
+    report_file = REPORTS_DIR / "fx_revaluation.txt"
+    report_text = format_fx_revaluation_text(report_data)
+    
+    try:
+        save_report(report_file, report_text)
+    except IOError as e:
+        return False, report_data, f"Failed to save report: {e}"
+    if missing:
+        return True, report_data, f"FX Revaluation generated; no rate as of {as_of} for {', '.join(sorted(missing))}"
+    return True, report_data, "FX Revaluation generated successfully"
+
+def format_fx_revaluation_text(report_data):
+    """Format foreign currency revaluation as text"""
+    lines = []
+    # Header
+    lines.append("=" * 100)
+    lines.append(f"FOREIGN CURRENCY REVALUATION AS OF {report_data['as_of']} ({report_data['base_currency']})")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append("=" * 100)
+    
+    lines.append(f"{'Account':<25} {'Foreign Balance':>18} {'Rate':>10} {'Carrying':>15} {'Revalued':>15} {'Gain/Loss':>14}")
+    lines.append("-" * 100)
+    for row in report_data["balances"]:
+        lines.append(f"{row['account']:<25} {format_currency(row['foreign_balance'], row['currency']):>18} "
+                     f"{row['rate']:>10} {format_currency(row['carrying']):>15} "
+                     f"{format_currency(row['revalued']):>15} {format_currency(row['gain_loss']):>14}")
+    lines.append("-" * 100)
+    lines.append(f"{'Unrealized Gain/Loss':<85} {format_currency(report_data['total_gain_loss']):>14}")
+    if report_data["missing_rates"]:
+        lines.append(f"No rate for: {', '.join(report_data['missing_rates'])}")
+    lines.append("=" * 100)
+    
+    return "\n".join(lines)
+
+
+def generate_aging_report(as_of=None, version=None):
+    """
+    Generate Aged Receivables and Payables from the open items of tracked accounts.
+    Only the open-item files are read, never the ledger. Given a pinned read version, the open
+    items are matched again from its journal instead, so that they agree with its accounts.
+    
+    Args:
+        as_of: Aging date (YYYY-MM-DD, default: today)
+        version: Pinned read version (default: the live open-item files)
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str)
+    """
+    if as_of is None:
+        as_of = datetime.now().strftime("%Y-%m-%d")
+    if version is None:
+        return _generate_aging_report(as_of, age_open_items(as_of))
+    return _read_pinned(lambda pinned: _generate_aging_report(as_of, _age_version_open_items(as_of, pinned)),
+                        version)
+
+def _age_version_open_items(as_of, version):
+    accounts_data = version["accounts"]
+    names = tracked_accounts(accounts_data)
+    open_items = match_open_items(names, accounts_data, iter_version_entries(version)) if names else {}
+    return age_open_items(as_of, accounts_data, open_items)
+
+def _generate_aging_report(as_of, rows):
+    if not rows:
+        return False, {}, "No accounts track open items"
+    
+    receivables = [row for row in rows if row["type"] == "Asset"]
+    payables = [row for row in rows if row["type"] == "Liability"]
+    report_data = {
+        "as_of": as_of,
+        "buckets": [label for _, label in AGING_BUCKETS],
+        "receivables": receivables,
+        "payables": payables,
+        "total_receivables": sum(row["total"] for row in receivables),
+        "total_payables": sum(row["total"] for row in payables)
+    }
+    
+    # Save to file
+    report_file = REPORTS_DIR / "aging.txt"
+    report_text = format_aging_text(report_data)
+    
+    try:
+        save_report(report_file, report_text)
+        return True, report_data, "Aging Report generated successfully"
+    except IOError as e:
+        return False, report_data, f"Failed to save report: {e}"
+
+def format_aging_text(report_data):
+    """Format aged receivables and payables as text"""
+    lines = []
+    # Header
+    lines.append("=" * 100)
+    lines.append(f"AGED RECEIVABLES AND PAYABLES AS OF {report_data['as_of']}")
+    lines.append(f"{GENERATED_PREFIX}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append("=" * 100)
+    
+    header = f"{'Account':<25}" + "".join(f" {label + ' days':>13}" for label in report_data["buckets"]) + f" {'Total':>14}"
+    for title, section, total_key in (("RECEIVABLES", "receivables", "total_receivables"),
+                                      ("PAYABLES", "payables", "total_payables")):
+        lines.append(f"\n{title}")
+        lines.append(header)
+        lines.append("-" * 100)
+        for row in report_data[section]:
+            lines.append(f"{row['account']:<25}" +
+                         "".join(f" {format_currency(row['buckets'][label]):>13}" for label in report_data["buckets"]) +
+                         f" {format_currency(row['total']):>14}")
+        lines.append(f"{'Total ' + title.title():<{25 + 14 * len(report_data['buckets'])}} "
+                     f"{format_currency(report_data[total_key]):>14}")
+    lines.append("=" * 100)
+    
+    return "\n".join(lines)
+
+
+def _write_report(report_data, file_name, formatter, title):
+    """Render computed report data and save it, as its generate_* function would"""
+    try:
+        save_report(REPORTS_DIR / file_name, formatter(report_data))
+        return True, report_data, f"{title} generated successfully"
+    except IOError as e:
+        return False, report_data, f"Failed to save report: {e}"
+
+def _timed(job):
+    """Run a report job and time it"""
+    started = time.perf_counter()
+    success, data, message = job()
+    return success, data, message, time.perf_counter() - started
+
+def generate_all_reports(as_of=None, max_workers=REPORT_WORKERS):
+    """
+    Generate every report in one go (e.g. a month-end pack).
+    One read version is pinned and shared by all reports, so the whole pack shows the same
+    point in time however much is posted while it is written. The income statement
+    is computed once for itself, the balance sheet and the ratios. Each report is then computed,
+    rendered and written in a thread pool.
+    
+    Args:
+        as_of: Date for FX revaluation and aging (YYYY-MM-DD, default: today)
+        max_workers: Thread pool size
+    
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str); report_data holds
+        {"reports": {name: {"success", "skipped", "message", "seconds", "data"}},
+         "version": read version number, "load_seconds": float, "total_seconds": float}
+        A report is skipped when there is nothing to report (e.g. no foreign currency balances).
+    """
+    started = time.perf_counter()
+    version = pin_version()
+    accounts_data = version["accounts"]
+    chart = version["chart"]
+    income_data = build_income_statement(accounts_data)
+    balance_data = build_balance_sheet(accounts_data, income_data)
+    load_seconds = time.perf_counter() - started
+
+    jobs = {
+        "trial_balance": lambda: _write_report(build_trial_balance(accounts_data), "trial_balance.txt",
+                                               format_trial_balance_text, "Trial Balance"),
+        "income_statement": lambda: _write_report(income_data, "income_statement.txt",
+                                                  format_income_statement_text, "Income Statement"),
+        "balance_sheet": lambda: _write_report(balance_data, "balance_sheet.txt",
+                                               format_balance_sheet_text, "Balance Sheet"),
+        "cash_flow": lambda: generate_cash_flow(version),
+        "ratios": lambda: (True, build_ratio_analysis(income_data, balance_data),
+                           "Ratio Analysis generated successfully"),
+        "chart_rollup": lambda: _write_report(build_chart_rollup(chart), "chart_rollup.txt",
+                                              format_chart_rollup_text, "Chart of Accounts Rollup"),
+        "fx_revaluation": lambda: generate_fx_revaluation(as_of, version),
+        "aging": lambda: generate_aging_report(as_of, version),
+    }
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(_timed, job) for name, job in jobs.items()}
+
+    reports = {}
+    for name, future in futures.items():
+        success, data, message, seconds = future.result()
+        # Generators return no data when there is nothing to report, and their data when saving failed
+        reports[name] = {"success": success, "skipped": not success and not data, "message": message,
+                         "seconds": seconds, "data": data}
+    report_data = {"reports": reports, "version": version["version"], "load_seconds": load_seconds,
+                   "total_seconds": time.perf_counter() - started}
+
+    failed = [name for name, result in reports.items() if not result["success"] and not result["skipped"]]
+    skipped = [name for name, result in reports.items() if result["skipped"]]
+    message = (f"Generated {len(reports) - len(failed) - len(skipped)} reports in "
+               f"{report_data['total_seconds'] * 1000:.0f} ms")
+    if skipped:
+        message += f" (nothing to report for {', '.join(skipped)})"
+    if failed:
+        return False, report_data, f"{message}; failed: {', '.join(failed)}"
+    return True, report_data, message
+
+def format_all_reports_text(report_data):
+    """Format the per-report results and timings of generate_all_reports as text"""
+    lines = []
+    lines.append(f"{'Report':<20} {'Status':<10} {'Time (ms)':>10}  Message")
+    lines.append("-" * 80)
+    lines.append(f"{'(pin version)':<20} {'':<10} {report_data['load_seconds'] * 1000:>10.1f}  "
+                 f"Read version {report_data['version']}")
+    for name, result in report_data["reports"].items():
+        status = "skipped" if result["skipped"] else "ok" if result["success"] else "FAILED"
+        lines.append(f"{name:<20} {status:<10} {result['seconds'] * 1000:>10.1f}  {result['message']}")
+    lines.append("-" * 80)
+    lines.append(f"{'Total':<20} {'':<10} {report_data['total_seconds'] * 1000:>10.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,269 @@
+"""
+Journal Search Module - Persistent inverted index over narrations, account names and amounts
+"""
+import json
+import re
+from array import array
+from bisect import bisect_left
+from utils import load_json, save_json_atomic, ensure_dir_real, SEARCH_DIR, JOURNAL_DIR, CENTS_PER_UNIT
+from storage import iter_records
+
+SNAPSHOT_FILE = SEARCH_DIR / "index.json"
+LOG_FILE = SEARCH_DIR / "index.log"
+COMPACT_LOG_BYTES = 4 * 1024 * 1024  # Fold the append log into the snapshot once it grows past this
+
+# Tokens are namespaced by field so narration-only searches stay exact
+FIELD_PREFIXES = {"narration": "n:", "account": "a:", "amount": "$:"}
+DOC_ID_TYPECODE = "I"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize_text(text):
+    """Split text into lowercase word tokens"""
+    return _WORD_PATTERN.findall((text or "").lower())
+
+def amount_tokens(cents):
+    """Search tokens for an amount in cents: '4471.50', and '4471' for whole amounts"""
+    units, fraction = divmod(abs(cents), CENTS_PER_UNIT)
+    tokens = [f"{units}.{fraction:02d}"]
+    if not fraction:
+        tokens.append(str(units))
+    return tokens
+
+def entry_tokens(record):
+    """
+    Build the set of index tokens for a stored journal entry
+
+    Args:
+        record: Journal entry dictionary (JSON layout)
+
+    Returns:
+        Set of namespaced tokens
+    """
+    tokens = {FIELD_PREFIXES["narration"] + word for word in tokenize_text(record.get("narration"))}
+    for line in record.get("debits", []) + record.get("credits", []):
+        tokens.update(FIELD_PREFIXES["account"] + word for word in tokenize_text(line.get("account")))
+        tokens.update(FIELD_PREFIXES["amount"] + token for token in amount_tokens(line.get("amount", 0)))
+        if line.get("currency"):
+            tokens.update(FIELD_PREFIXES["amount"] + token for token in amount_tokens(line["foreign_amount"]))
+    return tokens
+
+class SearchIndex:
+    """In-memory inverted index: token -> packed array of document numbers (one per je_id)"""
+
+    def __init__(self):
+        self.docs = []              # document number -> je_id
+        self.doc_numbers = {}       # je_id -> document number
+        self.postings = {}          # token -> array of document numbers, ascending
+        self.sorted_tokens = []     # all tokens, sorted, for prefix lookups (see token_list)
+        self.tokens_dirty = False   # tokens were added since sorted_tokens was built
+        self.log_position = 0       # bytes of the append log already applied
+        self.snapshot_mtime = None  # modification time of the snapshot this index was loaded from
+
+    def add(self, je_id, tokens):
+        """Add one entry's tokens (ignored if the je_id is already indexed)"""
+        if je_id in self.doc_numbers:
+            return False
+        number = len(self.docs)
+        self.docs.append(je_id)
+        self.doc_numbers[je_id] = number
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = array(DOC_ID_TYPECODE)
+                # Inserting into the sorted list here would make building the index quadratic
+                self.tokens_dirty = True
+            postings.append(number)
+        return True
+
+    def token_list(self):
+        """All tokens, sorted; re-sorted once after any additions, when a prefix query needs it"""
+        if self.tokens_dirty:
+            self.sorted_tokens = sorted(self.postings)
+            self.tokens_dirty = False
+        return self.sorted_tokens
+
+    def expand(self, term, fields, prefix):
+        """Document numbers matching one query term in any of the given fields"""
+        matches = set()
+        sorted_tokens = self.token_list() if prefix else None
+        for field in fields:
+            token = FIELD_PREFIXES[field] + term
+            if not prefix:
+                matches.update(self.postings.get(token, ()))
+                continue
+            position = bisect_left(sorted_tokens, token)
+            while position < len(sorted_tokens) and sorted_tokens[position].startswith(token):
+                matches.update(self.postings[sorted_tokens[position]])
+                position += 1
+        return matches
+
+    def to_dict(self):
+        """Snapshot layout: documents and postings as plain lists"""
+        return {
+            "docs": self.docs,
+            "postings": {token: postings.tolist() for token, postings in self.postings.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an index from its snapshot layout"""
+        index = cls()
+        index.docs = data.get("docs", [])
+        index.doc_numbers = {je_id: number for number, je_id in enumerate(index.docs)}
+        index.postings = {token: array(DOC_ID_TYPECODE, numbers)
+                          for token, numbers in data.get("postings", {}).items()}
+        index.sorted_tokens = sorted(index.postings)
+        return index
+
+_cached_index = None
+
+def _apply_log(index):
+    """Apply entries appended to the log since the index last read it"""
+    if not LOG_FILE.exists():
+        return index
+    if LOG_FILE.stat().st_size < index.log_position:
+        # The log was compacted by another process - reload from the new snapshot
+        return None
+    with open(LOG_FILE, 'rb') as f:
+        f.seek(index.log_position)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Partially written line; pick it up next time
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Error loading {LOG_FILE}: skipping unreadable line")
+            else:
+                index.add(item["je_id"], item["tokens"])
+            index.log_position += len(line)
+    return index
+
+def load_search_index():
+    """
+    Get the search index, loading the snapshot once per process and then
+    applying only the log entries written since the last call
+
+    Returns:
+        SearchIndex
+    """
+    global _cached_index
+    snapshot_mtime = SNAPSHOT_FILE.stat().st_mtime if SNAPSHOT_FILE.exists() else None
+    if _cached_index is not None and _cached_index.snapshot_mtime == snapshot_mtime:
+        _cached_index = _apply_log(_cached_index)
+    else:
+        _cached_index = None
+    if _cached_index is None:
+        index = SearchIndex.from_dict(load_json(SNAPSHOT_FILE, default={}))
+        index.snapshot_mtime = snapshot_mtime
+        _cached_index = _apply_log(index)
+    return _cached_index
+
+def compact_search_index():
+    """
+    Fold the append log into the snapshot and start an empty log
+
+    Returns:
+        True if saved, False otherwise
+    """
+    global _cached_index
+    index = load_search_index()
+    if not save_json_atomic(SNAPSHOT_FILE, index.to_dict()):
+        return False
+    # Replaying the log over the new snapshot is harmless (adds are idempotent), so truncating last is safe
+    open(LOG_FILE, 'wb').close()
+    index.log_position = 0
+    index.snapshot_mtime = SNAPSHOT_FILE.stat().st_mtime
+    _cached_index = index
+    return True
+
+def index_journal_record(record):
+    """
+    Add a newly stored journal entry to the index by appending it to the log
+
+    Args:
+        record: Journal entry dictionary (JSON layout)
+
+    Returns:
+        True if saved, False otherwise
+    """
+    ensure_dir_real()
+    item = {"je_id": record["je_id"], "tokens": sorted(entry_tokens(record))}
+    try:
+        with open(LOG_FILE, 'ab') as f:
+            f.write((json.dumps(item, ensure_ascii=False) + "\n").encode('utf-8'))
+    except IOError as e:
+        print(f"Error saving {LOG_FILE}: {e}")
+        return False
+    if LOG_FILE.stat().st_size > COMPACT_LOG_BYTES:
+        return compact_search_index()
+    return True
+
+def rebuild_search_index():
+    """
+    Rebuild the whole index from the journal shards
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    global _cached_index
+    index = SearchIndex()
+    for record in iter_records(JOURNAL_DIR):
+        index.add(record["je_id"], entry_tokens(record))
+    if not save_json_atomic(SNAPSHOT_FILE, index.to_dict()):
+        return False, "Failed to save search index"
+    open(LOG_FILE, 'wb').close()
+    index.snapshot_mtime = SNAPSHOT_FILE.stat().st_mtime
+    _cached_index = index
+    return True, f"Indexed {len(index.docs)} journal entries"
+
+def parse_query(query):
+    """
+    Parse a query into (term, fields, prefix) tuples.
+    Terms are ANDed; 'term*' is a prefix match; 'narration:', 'account:' or 'amount:'
+    limits a term to one field.
+
+    Returns:
+        List of (term, fields, prefix) tuples
+    """
+    terms = []
+    for part in query.split():
+        fields = list(FIELD_PREFIXES)
+        field, sep, rest = part.partition(":")
+        if sep and field.lower() in FIELD_PREFIXES:
+            fields = [field.lower()]
+            part = rest
+        prefix = part.endswith("*")
+        if fields == ["amount"] or re.fullmatch(r"\d+\.\d+\*?", part):
+            words = [part.rstrip("*")] if part.rstrip("*") else []
+        else:
+            words = tokenize_text(part)
+        terms.extend((word, fields, prefix) for word in words)
+    return terms
+
+def search_journal(query, limit=None):
+    """
+    Find journal entries matching every term of a query
+
+    Args:
+        query: Query string, e.g. "invoice 4471", "rent*", "account:cash amount:500"
+        limit: Maximum number of je_ids to return (default: all)
+
+    Returns:
+        List of matching je_ids in the order they were recorded
+    """
+    terms = parse_query(query)
+    if not terms:
+        return []
+    index = load_search_index()
+    # Intersect the smallest candidate sets first
+    candidate_sets = sorted((index.expand(term, fields, prefix) for term, fields, prefix in terms), key=len)
+    matches = candidate_sets[0]
+    for candidates in candidate_sets[1:]:
+        if not matches:
+            break
+        matches = matches & candidates
+    numbers = sorted(matches)
+    if limit is not None:
+        numbers = numbers[:limit]
+    return [index.docs[number] for number in numbers]
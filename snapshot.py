@@ -0,0 +1,237 @@
+"""
+Balance Snapshot Module - Publish account balances and totals by type to a memory-mapped file
+that any number of reader processes can read without parsing accounts.json.
+
+The writer follows a seqlock protocol: it makes the sequence number odd, updates the snapshot
+in place, then makes it even again. Readers read the sequence number, the values they need and
+the sequence number again, and retry if it was odd or has moved. There is a single writer: the
+process saving accounts.json.
+
+File layout (little-endian):
+    header   magic, seq, layout, retired flag, account count, names size (see _HEADER)
+    totals   one int64 per ACCOUNT_TYPES entry (sum of the balances of that type, cents)
+    balances one int64 per account (cents), in name order
+    types    one byte per account (index into ACCOUNT_TYPES)
+    names    account names, UTF-8, separated by newlines
+"""
+import mmap
+import os
+import struct
+from utils import BALANCE_SNAPSHOT_FILE, ensure_dir_real
+from accounts import ACCOUNT_TYPES
+
+SNAPSHOT_MAGIC = b"SLBAL1\0\0"
+SEQLOCK_RETRIES = 10000  # Reads attempted while a write is in progress before giving up
+MIN_SNAPSHOT_SIZE = mmap.PAGESIZE
+
+_HEADER = struct.Struct("<8sQQIII")
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 8
+_RETIRED = struct.Struct("<I")
+_RETIRED_OFFSET = 24
+_INT = struct.Struct("<q")
+_TOTALS = struct.Struct("<" + "q" * len(ACCOUNT_TYPES))
+_TOTALS_OFFSET = _HEADER.size
+_BALANCES_OFFSET = _TOTALS_OFFSET + _TOTALS.size
+_OTHER_TYPE = 255
+
+# Reader state: the mapping and the name -> slot table of the layout it was built from
+_map = None
+_layout = None
+_slots = {}
+_slots_lower = {}
+
+def _snapshot_size(count, names_size):
+    return _BALANCES_OFFSET + count * (_INT.size + 1) + names_size
+
+def _encode(accounts_data):
+    """Pack the snapshot body: (count, names bytes, totals, balances bytes, types bytes)"""
+    names = sorted(accounts_data)
+    totals = dict.fromkeys(ACCOUNT_TYPES, 0)
+    balances = []
+    types = bytearray()
+    for name in names:
+        account_type = accounts_data[name].get("type")
+        balance = accounts_data[name].get("balance", 0)
+        if account_type in totals:
+            totals[account_type] += balance
+            types.append(ACCOUNT_TYPES.index(account_type))
+        else:
+            types.append(_OTHER_TYPE)
+        balances.append(balance)
+    return (len(names), "\n".join(names).encode('utf-8'),
+            _TOTALS.pack(*(totals[account_type] for account_type in ACCOUNT_TYPES)),
+            struct.pack(f"<{len(balances)}q", *balances), bytes(types))
+
+def _create_snapshot_file(size):
+    """Write a fresh, empty snapshot file of at least size bytes and move it into place"""
+    size = max(MIN_SNAPSHOT_SIZE, -(-size * 2 // mmap.PAGESIZE) * mmap.PAGESIZE)
+    tmp_path = BALANCE_SNAPSHOT_FILE.with_name(BALANCE_SNAPSHOT_FILE.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, 0, 0, 0, 0, 0))
+        f.truncate(size)
+    if BALANCE_SNAPSHOT_FILE.exists():
+        # Readers still mapping the old file see it retired and reopen
+        with open(BALANCE_SNAPSHOT_FILE, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0) as old:
+                _RETIRED.pack_into(old, _RETIRED_OFFSET, 1)
+    os.replace(tmp_path, BALANCE_SNAPSHOT_FILE)
+
+def publish_balances(accounts_data):
+    """
+    Publish the balances of all accounts and the totals by type to the snapshot file
+
+    Args:
+        accounts_data: Dictionary of accounts, as just saved
+
+    Returns:
+        True if published, False otherwise
+    """
+    count, names, totals, balances, types = _encode(accounts_data)
+    size = _snapshot_size(count, len(names))
+    try:
+        ensure_dir_real()
+        if not BALANCE_SNAPSHOT_FILE.exists() or BALANCE_SNAPSHOT_FILE.stat().st_size < size:
+            _create_snapshot_file(size)
+        with open(BALANCE_SNAPSHOT_FILE, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0) as m:
+                magic, seq, layout, retired, old_count, old_names_size = _HEADER.unpack_from(m)
+                if magic != SNAPSHOT_MAGIC:
+                    print(f"Error publishing balances: {BALANCE_SNAPSHOT_FILE} is not a balance snapshot")
+                    return False
+                names_offset = _BALANCES_OFFSET + count * (_INT.size + 1)
+                same_layout = (count == old_count and
+                               m[names_offset:names_offset + old_names_size] == names)
+                # Odd sequence number: write in progress (a crashed write may have left it odd already)
+                seq |= 1
+                _SEQ.pack_into(m, _SEQ_OFFSET, seq)
+                m[_TOTALS_OFFSET:_BALANCES_OFFSET] = totals
+                m[_BALANCES_OFFSET:_BALANCES_OFFSET + len(balances)] = balances
+                if not same_layout:
+                    layout += 1
+                    m[_BALANCES_OFFSET + len(balances):names_offset] = types
+                    m[names_offset:names_offset + len(names)] = names
+                _HEADER.pack_into(m, 0, SNAPSHOT_MAGIC, seq, layout, 0, count, len(names))
+                _SEQ.pack_into(m, _SEQ_OFFSET, seq + 1)
+    except (IOError, OSError, ValueError) as e:
+        print(f"Error publishing balances: {e}")
+        return False
+    return True
+
+def _reader():
+    """Mapping of the snapshot file for reading, opened once per process (None if not published)"""
+    global _map, _layout
+    if _map is None:
+        try:
+            with open(BALANCE_SNAPSHOT_FILE, 'rb') as f:
+                _map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+        if _map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            _map.close()
+            _map = None
+            return None
+        _layout = None
+    return _map
+
+def _reopen():
+    global _map
+    if _map is not None:
+        _map.close()
+        _map = None
+
+def _reset_slots():
+    global _layout
+    _layout = None
+
+def _load_slots(m, layout, count, names_size):
+    """Rebuild the name -> slot table after the set of accounts changed"""
+    global _layout, _slots, _slots_lower
+    names_offset = _BALANCES_OFFSET + count * (_INT.size + 1)
+    names = bytes(m[names_offset:names_offset + names_size]).decode('utf-8').split("\n") if count else []
+    _slots = {name: slot for slot, name in enumerate(names)}
+    _slots_lower = {name.lower(): slot for slot, name in enumerate(names)}
+    _layout = layout
+
+def _consistent_read(read):
+    """
+    Run read(mapping, count) under the seqlock protocol
+
+    Returns:
+        Tuple (version, result of read), or None if there is no snapshot or no consistent read was possible
+    """
+    for _ in range(SEQLOCK_RETRIES):
+        m = _reader()
+        if m is None:
+            return None
+        magic, seq, layout, retired, count, names_size = _HEADER.unpack_from(m)
+        if retired:
+            _reopen()
+            continue
+        if seq & 1:
+            continue
+        try:
+            if layout != _layout:
+                _load_slots(m, layout, count, names_size)
+            result = read(m, count)
+        except (UnicodeDecodeError, struct.error, IndexError, ValueError):
+            result = None
+        if _SEQ.unpack_from(m, _SEQ_OFFSET)[0] == seq and _layout == layout:
+            return seq // 2, result
+        # Slots may have been built from a torn read; rebuild them on the next attempt
+        _reset_slots()
+    return None
+
+def read_balance(account_name):
+    """
+    Read one account's balance from the snapshot (account names match case-insensitively)
+
+    Returns:
+        Balance in cents, or None if there is no snapshot or the account is not in it
+    """
+    def read(m, count):
+        slot = _slots.get(account_name)
+        if slot is None:
+            slot = _slots_lower.get(account_name.lower())
+        if slot is None:
+            return None
+        return _INT.unpack_from(m, _BALANCES_OFFSET + slot * _INT.size)[0]
+
+    result = _consistent_read(read)
+    return result[1] if result else None
+
+def read_totals():
+    """
+    Read the totals by account type from the snapshot
+
+    Returns:
+        Dictionary {account type: balance total in cents}, or None if there is no snapshot
+    """
+    result = _consistent_read(lambda m, count: _TOTALS.unpack_from(m, _TOTALS_OFFSET))
+    return dict(zip(ACCOUNT_TYPES, result[1])) if result else None
+
+def read_snapshot():
+    """
+    Read the whole snapshot in one consistent view
+
+    Returns:
+        Dictionary {"version": int, "balances": {name: cents}, "types": {name: type},
+                    "totals": {type: cents}}, or None if there is no snapshot
+    """
+    def read(m, count):
+        balances = struct.unpack_from(f"<{count}q", m, _BALANCES_OFFSET)
+        types = m[_BALANCES_OFFSET + count * _INT.size:_BALANCES_OFFSET + count * (_INT.size + 1)]
+        return _TOTALS.unpack_from(m, _TOTALS_OFFSET), balances, types
+
+    result = _consistent_read(read)
+    if not result:
+        return None
+    version, (totals, balances, types) = result
+    names = sorted(_slots, key=_slots.get)
+    return {
+        "version": version,
+        "balances": dict(zip(names, balances)),
+        "types": {name: ACCOUNT_TYPES[index] if index != _OTHER_TYPE else None
+                  for name, index in zip(names, types)},
+        "totals": dict(zip(ACCOUNT_TYPES, totals))
+    }
@@ -0,0 +1,456 @@
+"""
+Sharded Storage Module - Month-sharded JSON Lines files for journal entries and ledger postings
+"""
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+from utils import load_json, save_json_atomic, ensure_dir_real
+
+MANIFEST_NAME = "manifest.json"
+SHARD_SUFFIX = ".jsonl"
+INDEX_DIR_NAME = "index"
+INDEX_SUFFIX = ".idx"
+REWRITE_DIR_NAME = "rewrite"  # Work directory of write_sorted_shards
+OLD_INDEX_DIR_NAME = "old-index"
+OFFSET_TYPECODE = "Q"  # Byte offsets are stored as packed unsigned 64-bit integers
+OFFSET_SIZE = array(OFFSET_TYPECODE).itemsize
+WRITE_BATCH_SIZE = 10000  # Records held in memory at once by write_sorted_shards
+SORT_RUN_SIZE = 50000     # Records sorted in memory at once by iter_records_by_date; bigger shards spill to disk
+
+def shard_key(date):
+    """
+    Get the shard key for a date
+
+    Args:
+        date: Date string (YYYY-MM-DD)
+
+    Returns:
+        Month key string (YYYY-MM)
+    """
+    return date[:7]
+
+def shard_path(directory, key):
+    """Path of the shard file for a month key"""
+    return directory / f"{key}{SHARD_SUFFIX}"
+
+def chain_seed(key):
+    """Hash that the first record of a shard is chained to"""
+    return hashlib.sha256(f"smartledger:{key}".encode('utf-8')).hexdigest()
+
+def record_hash(prev_hash, record):
+    """
+    Hash a record chained to the previous record's hash
+
+    Args:
+        prev_hash: Hash of the previous record in the shard (or the shard seed)
+        record: Record dictionary (any existing 'hash' key is ignored)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    body = {name: value for name, value in record.items() if name != "hash"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256((prev_hash + canonical).encode('utf-8')).hexdigest()
+
+def rolling_digest(prev_digest, record_hash_value):
+    """Fold a record hash into the rolling digest of its indexed value (e.g. an account)"""
+    return hashlib.sha256((prev_digest + record_hash_value).encode('utf-8')).hexdigest()
+
+def index_path(directory, key, value):
+    """Path of the position index file for one indexed value (e.g. an account) in a shard"""
+    name = hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+    return directory / INDEX_DIR_NAME / key / f"{name}{INDEX_SUFFIX}"
+
+def load_manifest(directory):
+    """
+    Load the shard manifest of a directory
+
+    Returns:
+        Dictionary {"generation": int, "seq": int,
+                    "shards": {key: {"count": int, "first_date": str, "last_date": str,
+                                     "head": str, "generation": int,
+                                     "values": {indexed value: {"count": int, "digest": str}},
+                                     "summary": {...}}}}
+        "seq" is the last write sequence number handed out, "head" is the hash of the last record of a shard,
+        and "generation" goes up whenever stored records are rewritten rather than appended.
+        "values" is only present for indexed directories and "summary" only for summarized ones.
+    """
+    manifest = load_json(directory / MANIFEST_NAME, default={})
+    manifest.setdefault("shards", {})
+    return manifest
+
+def save_manifest(directory, manifest):
+    """Save the shard manifest of a directory"""
+    return save_json_atomic(directory / MANIFEST_NAME, manifest)
+
+def list_shards(directory, start_date=None, end_date=None):
+    """
+    List shard keys that can hold records in a date range
+
+    Args:
+        directory: Shard directory
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+
+    Returns:
+        Sorted list of month keys, oldest first
+    """
+    keys = sorted(load_manifest(directory)["shards"])
+    if start_date:
+        keys = [key for key in keys if key >= shard_key(start_date)]
+    if end_date:
+        keys = [key for key in keys if key <= shard_key(end_date)]
+    return keys
+
+def read_shard(directory, key):
+    """
+    Read the records of one shard in write order
+
+    Args:
+        directory: Shard directory
+        key: Month key (YYYY-MM)
+
+    Yields:
+        Record dictionaries
+    """
+    path = shard_path(directory, key)
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Error loading {path} line {line_number}: {e}")
+
+def iter_records(directory, start_date=None, end_date=None):
+    """
+    Read records across shards, loading only the shards that overlap the date range
+
+    Args:
+        directory: Shard directory
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+
+    Yields:
+        Record dictionaries, shard by shard
+    """
+    for key in list_shards(directory, start_date, end_date):
+        for record in read_shard(directory, key):
+            date = record.get("date", "")
+            if start_date and date < start_date:
+                continue
+            if end_date and date > end_date:
+                continue
+            yield record
+
+def _update_shard_stats(stats, records):
+    """Fold the counts and date range of new records into a manifest shard entry"""
+    dates = [record.get("date", "") for record in records]
+    first_date, last_date = min(dates), max(dates)
+    stats["count"] = stats.get("count", 0) + len(records)
+    stats["first_date"] = min(stats.get("first_date", first_date), first_date)
+    stats["last_date"] = max(stats.get("last_date", last_date), last_date)
+    return stats
+
+def _write_lines(path, key, records, mode, manifest, index_field=None, summarize=None):
+    """
+    Write records as hash-chained JSON lines to a shard file.
+    Each record gets a 'hash' chained to the shard head, and records written for the first time
+    get the next write sequence number 'seq' (rewritten records keep theirs). The shard's head,
+    per-value counts and rolling digests and summary (via summarize(summary, record)) are
+    advanced as records are written.
+
+    Returns:
+        Dictionary {indexed value: array of byte offsets} (empty without index_field)
+    """
+    stats = manifest["shards"].setdefault(key, {})
+    positions = {}
+    seq = manifest.get("seq", 0)
+    head = stats.get("head") or chain_seed(key)
+    values = stats.setdefault("values", {}) if index_field else None
+    summary = stats.setdefault("summary", {}) if summarize else None
+    with open(path, mode) as f:
+        offset = f.tell()
+        for record in records:
+            if "seq" not in record:
+                seq += 1
+                record["seq"] = seq
+            head = record_hash(head, record)
+            record["hash"] = head
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+            if index_field:
+                value = record[index_field]
+                positions.setdefault(value, array(OFFSET_TYPECODE)).append(offset)
+                value_stats = values.setdefault(value, {"count": 0})
+                value_stats["count"] += 1
+                value_stats["digest"] = rolling_digest(value_stats.get("digest", ""), head)
+            if summarize:
+                summarize(summary, record)
+            f.write(line)
+            offset += len(line)
+    stats["head"] = head
+    manifest["seq"] = seq
+    _update_shard_stats(stats, records)
+    return positions
+
+def _append_positions(directory, key, positions):
+    """Append byte offsets to the per-value index files of a shard"""
+    for value, offsets in positions.items():
+        path = index_path(directory, key, value)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'ab') as f:
+            offsets.tofile(f)
+
+def append_records(directory, key, records, index_field=None, summarize=None):
+    """
+    Append records to a single shard and update its manifest entry
+
+    Args:
+        directory: Shard directory
+        key: Month key (YYYY-MM)
+        records: List of record dictionaries
+        index_field: Optional record field (e.g. 'account') to keep a position index for
+        summarize: Optional function(summary, record) folding a record into the shard summary
+
+    Returns:
+        True if saved, False otherwise
+    """
+    if not records:
+        return True
+    ensure_dir_real()
+    path = shard_path(directory, key)
+    manifest = load_manifest(directory)
+    try:
+        positions = _write_lines(path, key, records, 'ab', manifest, index_field, summarize)
+        _append_positions(directory, key, positions)
+    except IOError as e:
+        print(f"Error saving {path}: {e}")
+        return False
+    return save_manifest(directory, manifest)
+
+def rewrite_shard(directory, key, records, index_field=None, summarize=None):
+    """
+    Replace the records of a single shard, re-chaining and re-indexing it.
+    The new file is written beside the old one and renamed over it.
+
+    Args:
+        directory: Shard directory
+        key: Month key (YYYY-MM)
+        records: List of record dictionaries (an empty list removes the shard)
+        index_field: Optional record field (e.g. 'account') to keep a position index for
+        summarize: Optional function(summary, record) folding a record into the shard summary
+
+    Returns:
+        True if saved, False otherwise
+    """
+    ensure_dir_real()
+    path = shard_path(directory, key)
+    manifest = load_manifest(directory)
+    old_stats = manifest["shards"].pop(key, {})
+    shutil.rmtree(directory / INDEX_DIR_NAME / key, ignore_errors=True)
+
+    if not records:
+        if path.exists():
+            path.unlink()
+        # Dropping a whole shard changes the store's shape, so it counts as a new generation
+        manifest["generation"] = manifest.get("generation", 0) + 1
+        return save_manifest(directory, manifest)
+
+    manifest["shards"][key] = {"generation": old_stats.get("generation", 0) + 1}
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        positions = _write_lines(tmp_path, key, records, 'wb', manifest, index_field, summarize)
+        tmp_path.replace(path)
+        _append_positions(directory, key, positions)
+    except IOError as e:
+        print(f"Error saving {path}: {e}")
+        return False
+    return save_manifest(directory, manifest)
+
+def write_shards(directory, records, index_field=None, summarize=None):
+    """
+    Replace every shard in a directory with the given records
+
+    Args:
+        directory: Shard directory
+        records: Iterable of record dictionaries with a 'date' key (order is kept within a month)
+        index_field: Optional record field (e.g. 'account') to keep a position index for
+        summarize: Optional function(summary, record) folding a record into the shard summary
+
+    Returns:
+        True if saved, False otherwise
+    """
+    by_month = {}
+    for record in records:
+        by_month.setdefault(shard_key(record.get("date", "")), []).append(record)
+    return write_sorted_shards(directory, (record for key in sorted(by_month) for record in by_month[key]),
+                               index_field, summarize)
+
+def write_sorted_shards(directory, records, index_field=None, summarize=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    Replace every shard in a directory with records that arrive in month order, writing them
+    out in batches as they arrive. Only one batch, plus the per-value counts, digests and
+    summaries of the manifest, is held in memory.
+
+    The generation is bumped in the manifest before anything is written, so pinned readers
+    expire at once. The new shards and index are written to a work directory and moved in
+    only when complete: if the rewrite fails, the old shards are left as the manifest describes them.
+
+    Args:
+        directory: Shard directory
+        records: Iterable of record dictionaries with a 'date' key, oldest month first
+        index_field: Optional record field (e.g. 'account') to keep a position index for
+        summarize: Optional function(summary, record) folding a record into the shard summary
+        batch_size: Records written per batch
+
+    Returns:
+        True if saved, False otherwise
+    """
+    ensure_dir_real()
+    old_manifest = load_manifest(directory)
+    generation = old_manifest.get("generation", 0) + 1
+    if not save_manifest(directory, dict(old_manifest, generation=generation)):
+        return False
+    manifest = {"generation": generation, "seq": old_manifest.get("seq", 0), "shards": {}}
+
+    work_dir = directory / REWRITE_DIR_NAME
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir()
+
+    def flush(key, batch):
+        path = shard_path(work_dir, key)
+        try:
+            positions = _write_lines(path, key, batch, 'ab', manifest, index_field, summarize)
+            _append_positions(work_dir, key, positions)
+        except IOError as e:
+            print(f"Error saving {path}: {e}")
+            return False
+        return True
+
+    batch = []
+    batch_key = None
+    for record in records:
+        key = shard_key(record.get("date", ""))
+        if batch and (key != batch_key or len(batch) >= batch_size):
+            if not flush(batch_key, batch):
+                return False
+            batch = []
+        batch_key = key
+        batch.append(record)
+    if batch and not flush(batch_key, batch):
+        return False
+
+    try:
+        for key in manifest["shards"]:
+            os.replace(shard_path(work_dir, key), shard_path(directory, key))
+        if (directory / INDEX_DIR_NAME).exists():
+            os.replace(directory / INDEX_DIR_NAME, work_dir / OLD_INDEX_DIR_NAME)
+        if (work_dir / INDEX_DIR_NAME).exists():
+            os.replace(work_dir / INDEX_DIR_NAME, directory / INDEX_DIR_NAME)
+    except OSError as e:
+        print(f"Error replacing shards in {directory}: {e}")
+        return False
+    if not save_manifest(directory, manifest):
+        return False
+    for key in old_manifest["shards"]:
+        if key not in manifest["shards"]:
+            shard_path(directory, key).unlink(missing_ok=True)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return True
+
+def _record_date(record):
+    return record.get("date", "")
+
+def _spill_run(run, tmp_dir, number):
+    """Write a sorted run of records to a temporary file"""
+    path = Path(tmp_dir) / f"run{number}{SHARD_SUFFIX}"
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in run:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+def _read_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def iter_records_by_date(directory, run_size=SORT_RUN_SIZE):
+    """
+    Read every record in date order (write order among records of the same date) with bounded
+    memory. Shards are read one at a time, oldest first; a shard of more than run_size records
+    is sorted as an external merge sort: sorted runs are spilled to temporary files and merged.
+
+    Args:
+        directory: Shard directory
+        run_size: Records sorted in memory at once
+
+    Yields:
+        Record dictionaries
+    """
+    for key in list_shards(directory):
+        run = []
+        runs = []
+        tmp_dir = None
+        try:
+            for record in read_shard(directory, key):
+                run.append(record)
+                if len(run) >= run_size:
+                    tmp_dir = tmp_dir or tempfile.mkdtemp(prefix="smartledger-sort-")
+                    run.sort(key=_record_date)
+                    runs.append(_spill_run(run, tmp_dir, len(runs)))
+                    run = []
+            run.sort(key=_record_date)
+            # heapq.merge keeps the order of its inputs among equal dates, and runs are in write order
+            yield from heapq.merge(*[_read_run(path) for path in runs], run, key=_record_date)
+        finally:
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def read_positions(directory, key, value, start=0, stop=None):
+    """
+    Read a slice of the position index of one value in a shard, without loading the rest
+
+    Args:
+        directory: Shard directory
+        key: Month key (YYYY-MM)
+        value: Indexed value (e.g. account name)
+        start: Index of the first position to read
+        stop: Index after the last position to read (default: end)
+
+    Returns:
+        Array of byte offsets into the shard file
+    """
+    offsets = array(OFFSET_TYPECODE)
+    path = index_path(directory, key, value)
+    if not path.exists():
+        return offsets
+    total = path.stat().st_size // OFFSET_SIZE
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return offsets
+    with open(path, 'rb') as f:
+        f.seek(start * OFFSET_SIZE)
+        offsets.fromfile(f, stop - start)
+    return offsets
+
+def read_at_positions(directory, key, offsets):
+    """
+    Read records from a shard at the given byte offsets
+
+    Yields:
+        Record dictionaries, in the order of offsets
+    """
+    path = shard_path(directory, key)
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            yield json.loads(f.readline())
@@ -0,0 +1,38 @@
+"""
+Tests for journal entry fingerprints
+"""
+from dedup import entry_fingerprint
+
+def make_record(**changes):
+    record = {
+        "je_id": "JE-20250301-001",
+        "date": "2025-03-01",
+        "narration": "Office rent",
+        "debits": [{"account": "Rent", "amount": 120000}],
+        "credits": [{"account": "Cash", "amount": 100000}, {"account": "Bank", "amount": 20000, "ref": "R1"}],
+    }
+    record.update(changes)
+    return record
+
+def test_fingerprint_ignores_narration_id_case_and_line_order():
+    fingerprint = entry_fingerprint(make_record())
+    assert entry_fingerprint(make_record(je_id="JE-20250302-009", narration="Rent March")) == fingerprint
+    assert entry_fingerprint(make_record(
+        debits=[{"account": " rent ", "amount": 120000}],
+        credits=[{"account": "BANK", "amount": 20000, "ref": "R1"}, {"account": "cash", "amount": 100000}],
+    )) == fingerprint
+
+def test_fingerprint_changes_with_date_amount_currency_and_reference():
+    fingerprint = entry_fingerprint(make_record())
+    assert entry_fingerprint(make_record(date="2025-03-02")) != fingerprint
+    assert entry_fingerprint(make_record(debits=[{"account": "Rent", "amount": 120001}])) != fingerprint
+    assert entry_fingerprint(make_record(
+        debits=[{"account": "Rent", "amount": 120000, "currency": "EUR", "foreign_amount": 110000}])) != fingerprint
+    assert entry_fingerprint(make_record(
+        credits=[{"account": "Cash", "amount": 100000}, {"account": "Bank", "amount": 20000, "ref": "R2"}],
+    )) != fingerprint
+
+def test_fingerprint_keeps_debits_and_credits_apart():
+    record = make_record(debits=[{"account": "Cash", "amount": 500}], credits=[{"account": "Sales", "amount": 500}])
+    swapped = make_record(debits=[{"account": "Sales", "amount": 500}], credits=[{"account": "Cash", "amount": 500}])
+    assert entry_fingerprint(record) != entry_fingerprint(swapped)
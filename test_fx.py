@@ -0,0 +1,77 @@
+"""
+Tests for the FX helpers and the conversion of foreign currency journal lines
+"""
+import json
+from decimal import Decimal
+import pytest
+from fx import allocate_cents
+from journal import build_journal_entry
+
+ACCOUNTS = {
+    "Cash": {"type": "Asset", "balance": 0},
+    "Sales": {"type": "Revenue", "balance": 0},
+    "Fees": {"type": "Revenue", "balance": 0},
+}
+
+@pytest.fixture
+def eur_rate(tmp_path, monkeypatch):
+    """Run in an empty data directory whose rate table holds EUR at 1.005 USD"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "fx_rates.json").write_text(json.dumps({"EUR": {"2025-01-01": "1.005"}}))
+
+def test_allocate_cents_rounds_the_total_half_up():
+    assert allocate_cents([Decimal("50.25"), Decimal("50.25")]) == [51, 50]
+    assert allocate_cents([Decimal("100.5")]) == [101]
+    assert allocate_cents([Decimal("33.4"), Decimal("33.3"), Decimal("33.3")]) == [34, 33, 33]
+
+def test_allocate_cents_keeps_whole_amounts():
+    assert allocate_cents([Decimal(100), Decimal(250)]) == [100, 250]
+    assert allocate_cents([]) == []
+
+def test_entry_balanced_in_its_currency_stays_balanced(eur_rate):
+    success, entry, message = build_journal_entry(
+        "2025-03-01", "EUR sale",
+        [{"account": "Cash", "amount": "1.00", "currency": "EUR"}],
+        [{"account": "Sales", "amount": "0.50", "currency": "EUR"},
+         {"account": "Fees", "amount": "0.50", "currency": "EUR"}],
+        accounts_data=ACCOUNTS)
+    assert success, message
+    assert [line.amount for line in entry.debits] == [101]
+    assert [line.amount for line in entry.credits] == [51, 50]
+    assert [line.foreign_amount for line in entry.credits] == [50, 50]
+
+def test_mixed_currency_entry_must_balance_after_conversion(eur_rate):
+    success, entry, message = build_journal_entry(
+        "2025-03-01", "EUR deposit",
+        [{"account": "Cash", "amount": "100.00", "currency": "EUR"}],
+        [{"account": "Sales", "amount": "100.00"}],
+        accounts_data=ACCOUNTS)
+    assert not success
+    assert entry is None
+    assert message.startswith("Unbalanced entry")
+
+    success, entry, message = build_journal_entry(
+        "2025-03-01", "EUR deposit",
+        [{"account": "Cash", "amount": "100.00", "currency": "EUR"}],
+        [{"account": "Sales", "amount": "100.50"}],
+        accounts_data=ACCOUNTS)
+    assert success, message
+
+def test_unbalanced_single_currency_entry_reports_its_own_currency(eur_rate):
+    success, _, message = build_journal_entry(
+        "2025-03-01", "EUR sale",
+        [{"account": "Cash", "amount": "1.00", "currency": "EUR"}],
+        [{"account": "Sales", "amount": "0.90", "currency": "EUR"}],
+        accounts_data=ACCOUNTS)
+    assert not success
+    assert message == "Unbalanced entry: Debits (€1.00) != Credits (€0.90)"
+
+def test_missing_rate_is_refused(eur_rate):
+    success, _, message = build_journal_entry(
+        "2024-12-31", "Before the first rate",
+        [{"account": "Cash", "amount": "1.00", "currency": "EUR"}],
+        [{"account": "Sales", "amount": "1.00", "currency": "EUR"}],
+        accounts_data=ACCOUNTS)
+    assert not success
+    assert message == "No EUR exchange rate on or before 2024-12-31"
@@ -0,0 +1,33 @@
+"""
+Tests for search query parsing
+"""
+from search import parse_query, FIELD_PREFIXES
+
+ALL_FIELDS = list(FIELD_PREFIXES)
+
+def test_plain_terms_search_every_field():
+    assert parse_query("Rent office-supplies") == [
+        ("rent", ALL_FIELDS, False),
+        ("office", ALL_FIELDS, False),
+        ("supplies", ALL_FIELDS, False),
+    ]
+
+def test_field_prefix_limits_a_term():
+    assert parse_query("account:Bank narration:loan") == [
+        ("bank", ["account"], False),
+        ("loan", ["narration"], False),
+    ]
+    # An unknown field is searched as an ordinary word
+    assert parse_query("vendor:acme") == [("vendor", ALL_FIELDS, False), ("acme", ALL_FIELDS, False)]
+
+def test_star_makes_a_prefix_match():
+    assert parse_query("sup*") == [("sup", ALL_FIELDS, True)]
+    assert parse_query("account:ca*") == [("ca", ["account"], True)]
+
+def test_amounts_stay_whole():
+    assert parse_query("amount:4471.50") == [("4471.50", ["amount"], False)]
+    assert parse_query("12.50*") == [("12.50", ALL_FIELDS, True)]
+
+def test_empty_query():
+    assert parse_query("") == []
+    assert parse_query("amount:") == []
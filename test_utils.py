@@ -0,0 +1,29 @@
+"""
+Tests for the amount helpers
+"""
+from decimal import Decimal
+import pytest
+from utils import to_cents, validate_amount
+
+def test_to_cents_is_exact():
+    assert to_cents(0.1) == 10
+    assert to_cents("19.99") == 1999
+    assert to_cents(Decimal("4471.5")) == 447150
+    assert to_cents(12) == 1200
+
+def test_to_cents_rounds_half_up():
+    assert to_cents("1.005") == 101
+    assert to_cents("1.004") == 100
+
+@pytest.mark.parametrize("amount", ["abc", None, "inf", float("nan")])
+def test_to_cents_rejects_non_numbers(amount):
+    with pytest.raises(ValueError):
+        to_cents(amount)
+
+@pytest.mark.parametrize("amount", ["10.00", 10, 0.01, "4471.5"])
+def test_validate_amount_accepts_positive_cents(amount):
+    assert validate_amount(amount)
+
+@pytest.mark.parametrize("amount", [0, -5, "10.001", "nan", "inf", "abc", None, True])
+def test_validate_amount_rejects(amount):
+    assert not validate_amount(amount)
@@ -1,19 +1,63 @@
 import json
 import os
 import datetime as dt
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from pathlib import Path
 
-#Data directory path
-DATA_DIR = Path("data")
+#Data directory path: the default books live in data/, each other entity in data/entities/<name>/
+BASE_DATA_DIR = Path("data")
+ENTITIES_DIR = BASE_DATA_DIR / "entities"
+ENTITY_ENV_VAR = "SMARTLEDGER_ENTITY"
+
+def entity_data_dir(entity=None):
+    """
+    Data root of an entity
+    Args:
+        entity: Entity name, or None for the default books
+    Returns:
+        Path of the entity's data directory
+    """
+    return ENTITIES_DIR / entity if entity else BASE_DATA_DIR
+
+#The entity is chosen once per process (environment variable), before any data is read
+ENTITY = os.environ.get(ENTITY_ENV_VAR) or None
+DATA_DIR = entity_data_dir(ENTITY)
 ACCOUNTS_FILE = DATA_DIR / "accounts.json"
 JOURNAL_FILE = DATA_DIR / "journal_entries.json"
 LEDGER_FILE = DATA_DIR / "ledger_data.json"
+JOURNAL_DIR = DATA_DIR / "journal"
+LEDGER_DIR = DATA_DIR / "ledger"
+LEDGER_ARCHIVE_DIR = LEDGER_DIR / "archive"
+SEARCH_DIR = DATA_DIR / "search"
+DEDUP_DIR = DATA_DIR / "dedup"
+VERSIONS_DIR = DATA_DIR / "versions"
+EVENTS_DIR = DATA_DIR / "events"
+OPEN_ITEMS_DIR = DATA_DIR / "open_items"
 REPORTS_DIR = DATA_DIR / "reports"
+SCHEMA_FILE = DATA_DIR / "schema.json"
+CHART_FILE = DATA_DIR / "chart.json"
+FX_RATES_FILE = DATA_DIR / "fx_rates.json"
+CHECKPOINT_FILE = DATA_DIR / "integrity_checkpoint.json"
+BALANCE_SNAPSHOT_FILE = DATA_DIR / "balances.snap"
+
+#Amounts are stored and computed as integer minor units (cents)
+CENTS_PER_UNIT = 100
+
+#Balances and reports are kept in the base currency; foreign currency lines are converted at entry
+BASE_CURRENCY = "USD"
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "INR": "₹"}
 
 def ensure_dir_real():
     """Ensure data directory exists"""
-    DATA_DIR.mkdir(exist_ok=True)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
     REPORTS_DIR.mkdir(exist_ok=True)
+    JOURNAL_DIR.mkdir(exist_ok=True)
+    LEDGER_DIR.mkdir(exist_ok=True)
+    SEARCH_DIR.mkdir(exist_ok=True)
+    DEDUP_DIR.mkdir(exist_ok=True)
+    VERSIONS_DIR.mkdir(exist_ok=True)
+    EVENTS_DIR.mkdir(exist_ok=True)
+    OPEN_ITEMS_DIR.mkdir(exist_ok=True)
 
 def load_json(filepath,default=None):
     """
@@ -54,61 +98,122 @@ def save_json(filepath, data):
                 json.dump(backup_data, f, indent=2, ensure_ascii=False)
         except Exception as e:
             print(f"Warning: Could not create backup: {e}")
+    # Written to a temp file and renamed over the target, so readers never load a half-written file
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
         return True
     except IOError as e:
         print(f"Error saving {filepath}: {e}")
         return False
 
+def save_json_atomic(filepath, data):
+    """
+    Save data to JSON file atomically (write a temp file, then rename over the target).
+    Used for small index/manifest files that are rewritten often and need no backup.
+    Args:
+        filepath: Path to JSON file
+        data: Data to save
+    """
+    ensure_dir_real()
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+        return True
+    except IOError as e:
+        print(f"Error saving {filepath}: {e}")
+        return False
+
+def to_cents(amount):
+    """
+    Convert an amount in major units (e.g. dollars) to integer cents
+    Args:
+        amount: Amount as float, int, str or Decimal
+    Returns:
+        Integer number of cents
+    Raises:
+        ValueError: If amount is not a number
+    """
+    try:
+        # str() gives the shortest repr of a float, so 0.1 becomes exactly 10 cents
+        value = Decimal(str(amount)) * CENTS_PER_UNIT
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Invalid amount: {amount}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {amount}")
+    return int(value.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents):
+    """
+    Convert integer cents to a float in major units (for ratios and display only)
+    Args:
+        cents: Integer number of cents
+    Returns:
+        Float amount in major units
+    """
+    return cents / CENTS_PER_UNIT
+
 def validate_amount(amount):
     """
-    Validate that amount is positive
+    Validate that amount is positive and has at most 2 decimal places
     Args:
-        amount: Amount to validate
+        amount: Amount to validate (major units)
     Returns:
         True if valid, False otherwise
     """
     try:
-        amount = float(amount)
-        if amount <= 0:
+        if isinstance(amount, bool):
+            raise TypeError("Amount must be a number")
+        value = Decimal(str(amount))
+        if not value.is_finite() or value <= 0:
             raise ValueError("Amount must be positive")
-        else:
-            return True
-    except (ValueError, TypeError) as e:
+        if value != value.quantize(Decimal("0.01")):
+            raise ValueError("Amount can not have more than 2 decimal places")
+        return True
+    except (ValueError, TypeError, InvalidOperation) as e:
         print(f"Error validating amount: {e}")
         return False
+
 def validate_balanced_entry(debits, credits):
     """
     Validate that total debits equal total credits
     Args:
-        debits: List of debit entries with 'amount' key
-        credits: List of credit entries with 'amount' key
+        debits: List of debit JournalLines (amount in integer cents)
+        credits: List of credit JournalLines (amount in integer cents)
     Returns:
         True if valid, False otherwise and tuple of total debits and total credits
     """
-    sum_debit = sum(debit.get('amount', 0) for debit in debits)
-    sum_credit = sum(credit.get('amount', 0) for credit in credits)
-    is_equal = abs(sum_debit - sum_credit) < 0.01
+    sum_debit = sum(debit.amount for debit in debits)
+    sum_credit = sum(credit.amount for credit in credits)
+    # Integer cents make the comparison exact, no tolerance needed
+    is_equal = sum_debit == sum_credit
     if is_equal:
         return True, sum_debit, sum_credit
     else:
         return False, sum_debit, sum_credit
     
-def format_currency(amount):
+def format_currency(cents, currency=None):
     """
-    Format amount as currency with 2 decimal places
+    Format integer cents as currency with 2 decimal places
     Args:
-        amount: Amount to format
+        cents: Amount in cents to format
+        currency: Currency code (default: BASE_CURRENCY)
     Returns:
-        Formatted string (e.g., "$1,000.00")
+        Formatted string (e.g., "$1,000.00", "€250.00", "CHF 12.50")
     """
+    currency = currency or BASE_CURRENCY
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} ")
     try:
-        amount = float(amount)
-        return f"${amount:,.2f}"
+        cents = int(cents)
     except (ValueError, TypeError):
-        return "$0.00"
+        cents = 0
+    sign = "-" if cents < 0 else ""
+    units, fraction = divmod(abs(cents), CENTS_PER_UNIT)
+    return f"{symbol}{sign}{units:,}.{fraction:02d}"
     
 def account_exists(account_name, accounts_data):
     """
@@ -0,0 +1,299 @@
+"""
+Versions Module - Snapshot-isolated reads of the accounts, the chart, the journal and the ledger.
+
+Every save of the accounts commits a read version: the accounts and the chart are written to
+immutable files under data/versions/ named by their content hash, and HEAD.json records them with
+the last write sequence number ("seq") and generations of the journal and ledger stores at that
+moment. HEAD.json is replaced atomically, so it is the commit point. A posting appends its ledger
+records before the accounts are saved, and readers skip records with a later seq. A reader that
+pins a version therefore sees every posted entry whole or not at all, even while writers go on
+appending; readers take no lock, so they never hold up posting.
+
+Writers hold the writer lock (holds_writer_lock) from their first write to their commit, so
+no process commits a version while another has appended records it has not yet committed.
+
+Only rewrites of stored records (rebuild, compaction, repair) can invalidate a pinned version:
+they bump a generation, and a reader that finds one moved raises SnapshotExpired to be re-pinned.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+from utils import (
+    load_json, save_json_atomic, ensure_dir_real, VERSIONS_DIR, JOURNAL_DIR, LEDGER_DIR, get_account_by_name
+)
+from storage import load_manifest, read_shard, read_positions, read_at_positions
+from records import JournalEntry, Posting
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl: writers are then only serialized within one process
+    fcntl = None
+
+HEAD_FILE = VERSIONS_DIR / "HEAD.json"
+LOCK_FILE = VERSIONS_DIR / "LOCK"  # HEAD.json is replaced on every commit, so it cannot be locked itself
+VERSION_RETENTION = 8  # Superseded files of each kind kept for readers still opening them
+PIN_RETRIES = 5  # Attempts to pin (or read through) a version before giving up
+
+STORES = {"journal": JOURNAL_DIR, "ledger": LEDGER_DIR}
+
+class SnapshotExpired(Exception):
+    """Stored records a pinned version reads were rewritten after it was committed"""
+
+# Writer lock state: threads of this process share one lock file handle, held while depth > 0
+_thread_lock = threading.RLock()
+_lock_depth = 0
+_lock_handle = None
+
+def _acquire_writer_lock():
+    global _lock_depth, _lock_handle
+    _thread_lock.acquire()
+    if _lock_depth == 0:
+        ensure_dir_real()
+        _lock_handle = open(LOCK_FILE, 'a')
+        if fcntl:
+            fcntl.flock(_lock_handle, fcntl.LOCK_EX)
+    _lock_depth += 1
+
+def _release_writer_lock():
+    global _lock_depth, _lock_handle
+    _lock_depth -= 1
+    if _lock_depth == 0:
+        if fcntl:
+            fcntl.flock(_lock_handle, fcntl.LOCK_UN)
+        _lock_handle.close()
+        _lock_handle = None
+    _thread_lock.release()
+
+def holds_writer_lock(function):
+    """
+    Decorator for functions that change the accounts, the chart or the stores: they run holding the
+    writer lock (exclusive across processes, reentrant within a thread), so that their writes
+    and the version they commit are not interleaved with another writer's
+    """
+    @functools.wraps(function)
+    def locked(*args, **kwargs):
+        _acquire_writer_lock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _release_writer_lock()
+    return locked
+
+def _store_state(directory):
+    """Write sequence number and generations of a shard store"""
+    manifest = load_manifest(directory)
+    return {"seq": manifest.get("seq", 0), "generation": manifest.get("generation", 0),
+            "shards": {key: stats.get("generation", 0) for key, stats in manifest["shards"].items()}}
+
+def _write_version_file(kind, data):
+    """
+    Write data to an immutable file named by its content hash, unless it is already there
+
+    Returns:
+        File name, or None if it could not be written
+    """
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    name = f"{kind}-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:20]}.json"
+    path = VERSIONS_DIR / name
+    try:
+        if path.exists():
+            # Mark it as recent again, so pruning keeps it whatever its age
+            os.utime(path)
+            return name
+        tmp_path = path.with_name(name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return name
+    except OSError as e:
+        print(f"Error saving {path}: {e}")
+        return None
+
+def load_head():
+    """
+    Load the latest committed version
+
+    Returns:
+        Dictionary {"version": int, "accounts": file name, "chart": file name,
+                    "journal": {"seq", "generation", "shards": {key: generation}}, "ledger": {...}},
+        or an empty dictionary if no version was committed yet
+    """
+    return load_json(HEAD_FILE, default={})
+
+@holds_writer_lock
+def commit_version(accounts_data=None, chart=None):
+    """
+    Commit a new read version from the current journal and ledger stores.
+    The caller must hold the writer lock across the writes the version covers.
+
+    Args:
+        accounts_data: Accounts as just saved, or None if unchanged since the last version
+        chart: Chart of accounts as just saved, or None if unchanged since the last version
+
+    Returns:
+        True if committed, False otherwise
+    """
+    ensure_dir_real()
+    head = load_head()
+    if accounts_data is None and not head.get("accounts"):
+        from accounts import load_accounts
+        accounts_data = load_accounts()
+    if chart is None and not head.get("chart"):
+        from chart import load_chart
+        chart = load_chart()
+    new_head = {"version": head.get("version", 0) + 1,
+                "accounts": _write_version_file("accounts", accounts_data) if accounts_data is not None
+                else head["accounts"],
+                "chart": _write_version_file("chart", chart) if chart is not None else head["chart"]}
+    if not new_head["accounts"] or not new_head["chart"]:
+        return False
+    for store, directory in STORES.items():
+        new_head[store] = _store_state(directory)
+    if not save_json_atomic(HEAD_FILE, new_head):
+        return False
+    prune_versions(new_head)
+    return True
+
+def prune_versions(head=None):
+    """
+    Delete superseded version files, keeping the files HEAD names and the VERSION_RETENTION
+    most recent others of each kind (a reader may have read HEAD but not yet opened its files)
+
+    Returns:
+        Number of files deleted
+    """
+    if head is None:
+        head = load_head()
+    keep = {head.get("accounts"), head.get("chart")}
+    deleted = 0
+    for kind in ("accounts", "chart"):
+        paths = [path for path in VERSIONS_DIR.glob(f"{kind}-*.json") if path.name not in keep]
+        paths.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in paths[VERSION_RETENTION:]:
+            try:
+                path.unlink()
+                deleted += 1
+            except FileNotFoundError:
+                pass
+    return deleted
+
+def _read_version_file(name):
+    with open(VERSIONS_DIR / name, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def pin_version():
+    """
+    Pin the latest committed version for reading. The accounts and chart are read here, so the
+    returned version stays usable however many versions are committed after it.
+
+    Returns:
+        Dictionary {"version": int, "accounts": accounts data, "chart": chart,
+                    "journal": {"seq", "generation", "shards"}, "ledger": {...}}
+        (version 0, read from the live files, if no version was committed yet)
+    """
+    for _ in range(PIN_RETRIES):
+        head = load_head()
+        if not head:
+            break
+        try:
+            return dict(head, accounts=_read_version_file(head["accounts"]), chart=_read_version_file(head["chart"]))
+        except FileNotFoundError:
+            continue  # Pruned by newer commits between reading HEAD and its files
+    from accounts import load_accounts
+    from chart import load_chart
+    version = {"version": 0, "accounts": load_accounts(), "chart": load_chart()}
+    for store, directory in STORES.items():
+        version[store] = _store_state(directory)
+    return version
+
+def check_version(version, store, key=None):
+    """
+    Make sure stored records a version reads have not been rewritten since it was committed
+
+    Args:
+        version: Pinned version
+        store: 'journal' or 'ledger'
+        key: Shard about to be (or just) read, or None for the store as a whole
+
+    Raises:
+        SnapshotExpired: If the store or the shard has a new generation
+    """
+    pinned = version[store]
+    current = _store_state(STORES[store])
+    if current["generation"] != pinned["generation"] or (
+            key is not None and current["shards"].get(key) != pinned["shards"].get(key)):
+        raise SnapshotExpired(f"{store} records were rewritten after version {version['version']}")
+
+def _pinned_shards(version, store, start_date=None, end_date=None):
+    """Shards of a store that held records when the version was committed, within a date range"""
+    return [key for key in sorted(version[store]["shards"])
+            if (not start_date or key >= start_date[:7]) and (not end_date or key <= end_date[:7])]
+
+def _visible(record, version, store, start_date, end_date):
+    date = record.get("date", "")
+    return (record.get("seq", 0) <= version[store]["seq"] and (not start_date or date >= start_date)
+            and (not end_date or date <= end_date))
+
+def iter_version_records(version, store, start_date=None, end_date=None):
+    """
+    Yield the records of a store as of a pinned version: records appended after it was committed
+    are skipped. The shard generations are checked before and after each shard is read.
+
+    Args:
+        version: Pinned version
+        store: 'journal' or 'ledger'
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+
+    Yields:
+        Record dictionaries, shard by shard
+
+    Raises:
+        SnapshotExpired: If the records were rewritten since the version was committed
+    """
+    for key in _pinned_shards(version, store, start_date, end_date):
+        check_version(version, store, key)
+        records = [record for record in read_shard(STORES[store], key)
+                   if _visible(record, version, store, start_date, end_date)]
+        check_version(version, store, key)
+        yield from records
+
+def iter_version_postings(version, start_date=None, end_date=None):
+    """Yield Postings as of a pinned version (see iter_version_records)"""
+    for record in iter_version_records(version, "ledger", start_date, end_date):
+        yield Posting.from_dict(record)
+
+def iter_version_entries(version, start_date=None, end_date=None):
+    """Yield JournalEntries as of a pinned version (see iter_version_records)"""
+    for record in iter_version_records(version, "journal", start_date, end_date):
+        yield JournalEntry.from_dict(record)
+
+def iter_version_account_ledger(version, account_name, start_date=None, end_date=None):
+    """
+    Yield the postings of one account as of a pinned version, oldest first, reading only its
+    positions in each shard
+
+    Args:
+        version: Pinned version
+        account_name: Account name (matched as get_account_by_name does against the version's accounts)
+        start_date: Optional first date (YYYY-MM-DD)
+        end_date: Optional last date (YYYY-MM-DD)
+
+    Yields:
+        Postings
+
+    Raises:
+        SnapshotExpired: If the ledger was rewritten since the version was committed
+    """
+    actual_name, account_data = get_account_by_name(account_name, version["accounts"])
+    if not account_data:
+        return
+    for key in _pinned_shards(version, "ledger", start_date, end_date):
+        check_version(version, "ledger", key)
+        offsets = read_positions(LEDGER_DIR, key, actual_name)
+        records = [record for record in read_at_positions(LEDGER_DIR, key, offsets)
+                   if _visible(record, version, "ledger", start_date, end_date)]
+        check_version(version, "ledger", key)
+        for record in records:
+            yield Posting.from_dict(record)
@@ -0,0 +1,285 @@
+"""
+Watch Module - Keep report files up to date as the journal and ledger change.
+Each cycle works out which accounts were touched since the last one from the ledger manifest,
+applies their balance deltas to the aggregates kept from the previous cycle and regenerates only
+the reports those accounts affect. Report files are rewritten only when their content changes.
+"""
+import time
+from utils import ACCOUNTS_FILE, CHART_FILE, FX_RATES_FILE, LEDGER_DIR, REPORTS_DIR, ensure_dir_real
+from accounts import load_accounts
+from storage import load_manifest
+import report
+
+WATCH_INTERVAL = 2.0  # Seconds between checks for changes
+
+INCOME_TYPES = ["Revenue", "Expense"]
+MONETARY_TYPES = ["Asset", "Liability"]
+# Aggregate totals kept between cycles
+TOTAL_KEYS = ["debits", "credits", "revenue", "expenses", "assets", "liabilities", "equity"]
+
+def _mtime(path):
+    return path.stat().st_mtime if path.exists() else None
+
+def take_fingerprint():
+    """
+    Capture what the watcher compares between cycles, from manifests and file times only
+
+    Returns:
+        Dictionary {"generation": ledger generation, "digests": {(shard key, account): rolling digest},
+                    "accounts": accounts file mtime, "chart": chart file mtime, "fx": rate file mtime}
+    """
+    manifest = load_manifest(LEDGER_DIR)
+    digests = {}
+    for key, stats in manifest["shards"].items():
+        for account, value_stats in stats.get("values", {}).items():
+            digests[(key, account)] = value_stats.get("digest")
+    return {
+        "generation": manifest.get("generation", 0),
+        "digests": digests,
+        "accounts": _mtime(ACCOUNTS_FILE),
+        "chart": _mtime(CHART_FILE),
+        "fx": _mtime(FX_RATES_FILE)
+    }
+
+def touched_accounts(previous, current):
+    """
+    Accounts whose postings changed between two fingerprints
+
+    Returns:
+        Set of account names, or None when the ledger was rewritten and everything must be recomputed
+    """
+    if previous is None or previous["generation"] != current["generation"]:
+        return None
+    old, new = previous["digests"], current["digests"]
+    return {account for (key, account) in old.keys() | new.keys() if old.get((key, account)) != new.get((key, account))}
+
+def _contributions(account_type, balance):
+    """What one account adds to each aggregate total"""
+    totals = dict.fromkeys(TOTAL_KEYS, 0)
+    if account_type in ["Asset", "Expense"]:
+        totals["debits" if balance >= 0 else "credits"] = abs(balance)
+    else:
+        totals["credits" if balance >= 0 else "debits"] = abs(balance)
+    key = {"Revenue": "revenue", "Expense": "expenses", "Asset": "assets",
+           "Liability": "liabilities", "Owner's Equity": "equity"}.get(account_type)
+    if key:
+        totals[key] += balance
+    return totals
+
+def new_state():
+    """Empty aggregates: no accounts and all totals at zero"""
+    return {"accounts": {}, "totals": dict.fromkeys(TOTAL_KEYS, 0), "fingerprint": None}
+
+def apply_deltas(state, accounts_data, names):
+    """
+    Bring the aggregates up to date for some accounts by taking out their old contribution
+    and adding their new one
+
+    Args:
+        state: Aggregates from new_state(), updated in place
+        accounts_data: Dictionary of accounts
+        names: Account names to refresh (accounts missing from accounts_data are dropped)
+
+    Returns:
+        Set of the account types whose contributions changed
+    """
+    totals = state["totals"]
+    changed_types = set()
+    for name in names:
+        old = state["accounts"].pop(name, None)
+        new = accounts_data.get(name)
+        new = (new.get("type"), new.get("balance", 0)) if new else None
+        if old == new:
+            if new:
+                state["accounts"][name] = new
+            continue
+        for entry, sign in ((old, -1), (new, 1)):
+            if entry:
+                for key, amount in _contributions(*entry).items():
+                    totals[key] += sign * amount
+                changed_types.add(entry[0])
+        if new:
+            state["accounts"][name] = new
+    return changed_types
+
+def _rows(state, types):
+    return sorted(((name, account_type, balance) for name, (account_type, balance) in state["accounts"].items()
+                   if account_type in types))
+
+def trial_balance_data(state):
+    """Trial Balance data (as built by report.build_trial_balance) from the aggregates"""
+    rows = []
+    for name, account_type, balance in _rows(state, ["Asset", "Expense", "Liability", "Revenue", "Owner's Equity"]):
+        totals = _contributions(account_type, balance)
+        rows.append({"account": name, "type": account_type, "debit": totals["debits"], "credit": totals["credits"]})
+    totals = state["totals"]
+    return {
+        "trial_balance": rows,
+        "total_debits": totals["debits"],
+        "total_credits": totals["credits"],
+        "is_balanced": totals["debits"] == totals["credits"]
+    }
+
+def income_statement_data(state):
+    """Income Statement data (as built by report.build_income_statement) from the aggregates"""
+    totals = state["totals"]
+    return {
+        "revenue_accounts": [{"account": name, "amount": balance} for name, _, balance in _rows(state, ["Revenue"])],
+        "expense_accounts": [{"account": name, "amount": balance} for name, _, balance in _rows(state, ["Expense"])],
+        "total_revenue": totals["revenue"],
+        "total_expenses": totals["expenses"],
+        "net_income": totals["revenue"] - totals["expenses"]
+    }
+
+def balance_sheet_data(state):
+    """Balance Sheet data (as built by report.build_balance_sheet) from the aggregates"""
+    totals = state["totals"]
+    equity = [{"account": name, "amount": balance} for name, _, balance in _rows(state, ["Owner's Equity"])]
+    total_equity = totals["equity"]
+    net_income = totals["revenue"] - totals["expenses"]
+    if net_income != 0:
+        equity.append({"account": report.RETAINED_EARNINGS_LABEL, "amount": net_income})
+        equity.sort(key=lambda x: x["account"])
+        total_equity += net_income
+    return {
+        "assets": [{"account": name, "amount": balance} for name, _, balance in _rows(state, ["Asset"])],
+        "liabilities": [{"account": name, "amount": balance} for name, _, balance in _rows(state, ["Liability"])],
+        "equity": equity,
+        "total_assets": totals["assets"],
+        "total_liabilities": totals["liabilities"],
+        "total_equity": total_equity,
+        "is_balanced": totals["assets"] == totals["liabilities"] + total_equity
+    }
+
+# Reports kept from the aggregates: name -> (data builder, text formatter, file name)
+AGGREGATE_REPORTS = {
+    "trial_balance": (trial_balance_data, report.format_trial_balance_text, "trial_balance.txt"),
+    "income_statement": (income_statement_data, report.format_income_statement_text, "income_statement.txt"),
+    "balance_sheet": (balance_sheet_data, report.format_balance_sheet_text, "balance_sheet.txt"),
+}
+
+def affected_reports(changed_types, touched, accounts_data, previous, current):
+    """
+    Work out which reports depend on what changed
+
+    Args:
+        changed_types: Account types whose balances changed
+        touched: Names of the touched accounts
+        accounts_data: Dictionary of accounts
+        previous: Fingerprint of the last cycle (None on the first)
+        current: Fingerprint of this cycle
+
+    Returns:
+        Set of report names (keys of AGGREGATE_REPORTS and 'cashflow', 'chart_rollup', 'aging', 'fx_revaluation')
+    """
+    if previous is None:
+        return set(AGGREGATE_REPORTS) | {"cashflow", "chart_rollup", "aging", "fx_revaluation"}
+    reports = set()
+    if changed_types:
+        reports.update(["trial_balance", "balance_sheet"])
+    if changed_types & set(INCOME_TYPES):
+        reports.add("income_statement")
+    touched_data = [accounts_data[name] for name in touched if name in accounts_data]
+    if any("cash" in name.lower() and accounts_data[name].get("type") == "Asset"
+           for name in touched if name in accounts_data):
+        reports.add("cashflow")
+    if changed_types or current["chart"] != previous["chart"]:
+        reports.add("chart_rollup")
+    if any(account_data.get("open_items") for account_data in touched_data):
+        reports.add("aging")
+    if (current["fx"] != previous["fx"] or
+            any(account_data.get("type") in MONETARY_TYPES for account_data in touched_data)):
+        reports.add("fx_revaluation")
+    return reports
+
+# Reports regenerated through their generator: name -> generator
+GENERATED_REPORTS = {
+    "cashflow": report.generate_cash_flow,
+    "chart_rollup": report.generate_chart_rollup,
+    "aging": report.generate_aging_report,
+    "fx_revaluation": report.generate_fx_revaluation,
+}
+
+def refresh_reports(state):
+    """
+    Run one watch cycle: find the touched accounts, apply their deltas and regenerate the
+    affected reports
+
+    Args:
+        state: Aggregates from new_state(), updated in place
+
+    Returns:
+        Tuple (success: bool, dict {"regenerated": [names], "rewritten": [names]}, message: str)
+    """
+    current = take_fingerprint()
+    previous = state["fingerprint"]
+    result = {"regenerated": [], "rewritten": []}
+    if previous == current:
+        return True, result, "No changes"
+
+    accounts_data = load_accounts()
+    touched = touched_accounts(previous, current)
+    if touched is None:
+        state.update(new_state())
+        touched = set(accounts_data)
+        previous = None
+    elif previous["accounts"] != current["accounts"]:
+        # Accounts created without postings only show up in the accounts file, and a balance
+        # repaired without touching the ledger only in its balances
+        touched |= set(accounts_data) ^ set(state["accounts"])
+        if not touched:
+            touched = set(accounts_data) | set(state["accounts"])
+    changed_types = apply_deltas(state, accounts_data, touched)
+
+    ensure_dir_real()
+    errors = []
+    for name in sorted(affected_reports(changed_types, touched, accounts_data, previous, current)):
+        result["regenerated"].append(name)
+        if name in AGGREGATE_REPORTS:
+            builder, formatter, file_name = AGGREGATE_REPORTS[name]
+            report_file = REPORTS_DIR / file_name
+            try:
+                if report.save_report(report_file, formatter(builder(state))):
+                    result["rewritten"].append(name)
+            except IOError as e:
+                errors.append(f"{name}: {e}")
+            continue
+        report_file = REPORTS_DIR / f"{name}.txt"
+        before = report_file.stat().st_mtime_ns if report_file.exists() else None
+        success, data, message = GENERATED_REPORTS[name]()
+        if not success and data:
+            errors.append(f"{name}: {message}")
+        elif report_file.exists() and report_file.stat().st_mtime_ns != before:
+            result["rewritten"].append(name)
+
+    state["fingerprint"] = current
+    if errors:
+        return False, result, "Failed to refresh: " + "; ".join(errors)
+    return True, result, (f"{len(touched)} accounts touched; regenerated {len(result['regenerated'])} reports, "
+                          f"rewrote {len(result['rewritten'])}")
+
+def watch_reports(interval=WATCH_INTERVAL, cycles=None):
+    """
+    Watch the journal and ledger and keep the report files up to date until interrupted
+
+    Args:
+        interval: Seconds between checks
+        cycles: Number of checks to run (default: until Ctrl+C)
+
+    Returns:
+        Tuple (success: bool, message: str)
+    """
+    state = new_state()
+    count = 0
+    try:
+        while cycles is None or count < cycles:
+            if count:
+                time.sleep(interval)
+            count += 1
+            success, result, message = refresh_reports(state)
+            if result["regenerated"] or not success:
+                rewritten = ", ".join(result["rewritten"]) or "none"
+                print(f"[{time.strftime('%H:%M:%S')}] {message} (rewritten: {rewritten})")
+    except KeyboardInterrupt:
+        pass
+    return True, f"Stopped watching after {count} checks"
@@ -0,0 +1,154 @@
+"""
+What-If Module - Try proposed journal entries on a copy-on-write overlay of the balances, chart
+and ledger, and see the resulting reports without writing anything to disk
+"""
+from collections import ChainMap
+from utils import get_account_by_name
+from accounts import load_accounts, balance_change
+from chart import load_chart, group_path
+from journal import build_journal_entry
+from ledger import iter_account_ledger
+from records import Posting
+import report
+
+WHATIF_JE_PREFIX = "WHATIF"
+
+def new_overlay(accounts_data=None, chart=None):
+    """
+    Start an empty overlay on top of the loaded accounts and chart.
+    Reads fall through to the loaded data; an account or group is copied into the overlay the
+    first time a proposed entry changes it, so the loaded data is never modified.
+
+    Args:
+        accounts_data: Dictionary of accounts (default: loaded)
+        chart: Chart of accounts (default: loaded)
+
+    Returns:
+        Dictionary {"accounts": ChainMap, "chart": {"groups": ChainMap}, "entries": [JournalEntry],
+                    "postings": {account: [Posting]}}
+    """
+    if accounts_data is None:
+        accounts_data = load_accounts()
+    if chart is None:
+        chart = load_chart()
+    return {
+        "accounts": ChainMap({}, accounts_data),
+        "chart": dict(chart, groups=ChainMap({}, chart["groups"])),
+        "entries": [],
+        "postings": {}
+    }
+
+def _own(layer, key):
+    """The overlay's own copy of an entry of a ChainMap, copied from the layer below on first use"""
+    own = layer.maps[0]
+    if key not in own:
+        own[key] = dict(layer[key])
+    return own[key]
+
+def touched_accounts(overlay):
+    """Names of the accounts the overlay has copied (and so changed)"""
+    return sorted(overlay["accounts"].maps[0])
+
+def apply_entry(overlay, date, narration, debits, credits):
+    """
+    Validate a proposed journal entry and apply it to the overlay
+
+    Args:
+        overlay: Overlay from new_overlay()
+        date, narration, debits, credits: As for journal.create_journal_entry
+
+    Returns:
+        Tuple (success: bool, je_id: str or None, message: str)
+    """
+    je_id = f"{WHATIF_JE_PREFIX}-{len(overlay['entries']) + 1:03d}"
+    success, entry, message = build_journal_entry(date, narration, debits, credits, je_id, overlay["accounts"])
+    if not success:
+        return False, None, message
+
+    accounts = overlay["accounts"]
+    for entry_type, lines in (("Debit", entry.debits), ("Credit", entry.credits)):
+        for line in lines:
+            actual_name, account_data = get_account_by_name(line.account, accounts)
+            if entry_type == "Debit":
+                delta = balance_change(account_data.get("type"), line.amount, 0)
+            else:
+                delta = balance_change(account_data.get("type"), 0, line.amount)
+            account_data = _own(accounts, actual_name)
+            account_data["balance"] = account_data.get("balance", 0) + delta
+            for code in group_path(account_data.get("parent"), overlay["chart"]):
+                _own(overlay["chart"]["groups"], code)["balance"] += delta
+            overlay["postings"].setdefault(actual_name, []).append(
+                Posting(actual_name, date, je_id, entry_type, line.amount, account_data["balance"],
+                        currency=line.currency, foreign_amount=line.foreign_amount))
+    overlay["entries"].append(entry)
+    return True, je_id, f"Proposed entry '{je_id}' applied"
+
+def overlay_ledger(overlay, account_name, limit=None):
+    """
+    Postings of an account as they would stand with the proposed entries: the last stored
+    postings followed by the proposed ones
+
+    Args:
+        overlay: Overlay from new_overlay()
+        account_name: Account name
+        limit: Number of stored postings to show before the proposed ones (default: all)
+
+    Returns:
+        List of Postings or None if the account doesn't exist
+    """
+    actual_name, account_data = get_account_by_name(account_name, overlay["accounts"])
+    if not account_data:
+        return None
+    stored = list(iter_account_ledger(actual_name, limit=limit, reverse=limit is not None))
+    if limit is not None:
+        stored.reverse()
+    return stored + overlay["postings"].get(actual_name, [])
+
+def whatif_reports(overlay, max_depth=None):
+    """
+    Compute the reports as they would stand with the proposed entries, from the overlay only
+
+    Args:
+        overlay: Overlay from new_overlay()
+        max_depth: Deepest group level of the chart rollup (default: all levels)
+
+    Returns:
+        Tuple (success: bool, report_data: dict, message: str); report_data holds the
+        'trial_balance', 'income_statement', 'balance_sheet' and 'chart_rollup' data plus
+        the 'touched' accounts with their balances before and after
+    """
+    accounts = overlay["accounts"]
+    base = accounts.maps[1]
+    touched = [{"account": name, "type": accounts[name].get("type"),
+                "before": base[name].get("balance", 0), "after": accounts[name].get("balance", 0)}
+               for name in touched_accounts(overlay)]
+    report_data = {
+        "entries": [entry.to_dict() for entry in overlay["entries"]],
+        "touched": touched,
+        "trial_balance": report.build_trial_balance(accounts),
+        "income_statement": report.build_income_statement(accounts),
+        "balance_sheet": report.build_balance_sheet(accounts),
+        "chart_rollup": report.build_chart_rollup(overlay["chart"], max_depth)
+    }
+    return True, report_data, (f"What-if of {len(overlay['entries'])} proposed entries touching "
+                               f"{len(touched)} accounts (nothing was saved)")
+
+def format_whatif_text(report_data):
+    """Format what-if results as text: the touched accounts, then the full reports"""
+    from utils import format_currency
+    lines = []
+    lines.append("=" * 80)
+    lines.append("WHAT-IF: PROPOSED ENTRIES (NOT SAVED)")
+    lines.append("=" * 80)
+    for entry in report_data["entries"]:
+        lines.append(f"  {entry['je_id']} | {entry['date']} | {entry['narration']}")
+    lines.append(f"\n{'Account':<35} {'Before':>20} {'After':>20}")
+    lines.append("-" * 80)
+    for row in report_data["touched"]:
+        lines.append(f"{row['account']:<35} {format_currency(row['before']):>20} {format_currency(row['after']):>20}")
+    lines.append("")
+    lines.append(report.format_trial_balance_text(report_data["trial_balance"]))
+    lines.append(report.format_income_statement_text(report_data["income_statement"]))
+    lines.append(report.format_balance_sheet_text(report_data["balance_sheet"]))
+    lines.append(report.format_chart_rollup_text(report_data["chart_rollup"]))
+    return "\n".join(lines)